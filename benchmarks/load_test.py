@@ -0,0 +1,323 @@
+"""
+Belastingstest met gelijktijdige gesimuleerde gebruikers
+
+Laat N sessies (zie session_client) tegelijk een realistisch klikpad door de
+app lopen: bestanden uploaden, de pagina Instroomprognose openen,
+Individual_mean aan- en uitzetten, filteren op schooljaar en instelling, en op
+Beschrijving aanmeldingen het schooljaar wisselen. Tussen twee stappen zit een denktijd,
+zoals bij een echte planner.
+
+Per stap worden de duur (p50/p90/p95/p99/max), de doorvoer en het aandeel
+fouten gerapporteerd (een exception of st.error op de pagina, een ontbrekend
+widget of een verbroken verbinding). Het geheugen van de server (het proces
+en al zijn kinderen, zoals de app-processen van serve.py) wordt tijdens de
+test gevolgd; dat werkt alleen op Linux (via /proc).
+
+Zonder --url start de test zelf `src/serve.py` met --workers app-processen.
+Met --data-dir uploadt elke sessie eerst de bestanden uit die map; anders
+gebruikt de test de bestanden die de server al kent.
+
+Gebruik:
+    uv run python benchmarks/load_test.py --sessions 50 --duration 300 --data-dir pad/naar/bestanden
+    uv run python benchmarks/load_test.py --url http://server:8501 --server-pid 1234 --sessions 20
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+
+from serve_throughput import start_server, stop_server
+from session_client import StreamlitSession
+
+STEP_TIMEOUT = 300
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of a process and all its descendants (Linux only)
+
+    Returns:
+        int, or None if /proc isn't available or the process is gone
+    """
+    children = collections.defaultdict(list)
+    rss = {}
+    page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Het tweede veld (naam) kan spaties bevatten; alles na de laatste ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f"/proc/{entry}/statm") as f:
+                rss[int(entry)] = int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+        children[int(fields[1])].append(int(entry))
+    if pid not in rss:
+        return None
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total
+
+
+def data_files(data_dir):
+    """Files to upload, per uploader key (by the naming convention of the pages)"""
+    files = {'uploader_beschrijving': [], 'uploader_prognose': []}
+    for name in sorted(os.listdir(data_dir)):
+        if not name.lower().endswith(('.csv', '.xlsx', '.xls')):
+            continue
+        uploader = 'uploader_beschrijving' if name.startswith('application_enriched') else 'uploader_prognose'
+        files[uploader].append(os.path.join(data_dir, name))
+    return files
+
+
+# Het klikpad; elke stap krijgt de sessie en een eigen random generator
+
+async def step_upload(session, rng, files):
+    await session.rerun('selecteer_bestandslocatie')
+    for uploader, paths in files.items():
+        if paths:
+            await session.upload(paths, key=uploader)
+            await session.rerun('selecteer_bestandslocatie')
+
+
+async def step_open_instroomprognose(session, rng):
+    await session.rerun('instroomprognose')
+
+
+async def step_select_schooljaar(session, rng):
+    options = session.widget_options(key='instroomprognose_filter_schooljaar')
+    session.set_widget(rng.sample(options, min(len(options), 1)), key='instroomprognose_filter_schooljaar')
+    await session.rerun('instroomprognose')
+
+
+async def step_toggle_individual_mean(session, rng):
+    label = 'Toon Individual_mean in grafiek'
+    session.set_widget(not session.widget_value(label=label), label=label)
+    await session.rerun('instroomprognose')
+
+
+async def step_filter_instelling(session, rng):
+    options = session.widget_options(key='instroomprognose_filter_instelling')
+    session.set_widget(rng.sample(options, rng.randint(0, min(len(options), 2))), key='instroomprognose_filter_instelling')
+    await session.rerun('instroomprognose')
+
+
+async def step_clear_filters(session, rng):
+    for key in ('instroomprognose_filter_instelling', 'instroomprognose_filter_schooljaar'):
+        session.set_widget([], key=key)
+    await session.rerun('instroomprognose')
+
+
+async def step_open_beschrijving(session, rng):
+    await session.rerun('beschrijving_aanmeldingen')
+
+
+async def step_beschrijving_schooljaar(session, rng):
+    options = session.widget_options(key='filter_schooljaar')
+    session.set_widget(rng.sample(options, rng.randint(1, len(options))) if options else [], key='filter_schooljaar')
+    await session.rerun('beschrijving_aanmeldingen')
+
+
+SCENARIO = [
+    ('instroomprognose openen', step_open_instroomprognose),
+    ('Individual_mean wisselen', step_toggle_individual_mean),
+    ('schooljaar kiezen', step_select_schooljaar),
+    ('instelling filteren', step_filter_instelling),
+    ('filters wissen', step_clear_filters),
+    ('beschrijving openen', step_open_beschrijving),
+    ('beschrijving schooljaar', step_beschrijving_schooljaar),
+]
+
+
+class LoadTest:
+    """Runs the simulated sessions and collects the measurements
+
+    Args:
+        url: Base URL of the app
+        sessions: Number of concurrent sessions
+        duration: Seconds the sessions keep clicking after their start
+        ramp_up: Seconds over which the sessions are started
+        think_time: Mean pause between two steps in seconds
+        files: Files to upload per uploader key (see data_files), or None
+        server_pid: Process id of the server for the memory samples, or None
+        sample_interval: Seconds between two memory samples
+    """
+
+    def __init__(self, url, sessions, duration, ramp_up=10, think_time=1.0, files=None,
+                 server_pid=None, sample_interval=1.0, seed=0):
+        self.url = url
+        self.sessions = sessions
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.files = files
+        self.server_pid = server_pid
+        self.sample_interval = sample_interval
+        self.seed = seed
+        self.records = []  # dicts: session, step, started, seconds, error
+        self.memory = []  # (seconds since start, bytes)
+        self._started = None
+
+    async def _run_step(self, index, name, step, session, rng, *args):
+        started = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(step(session, rng, *args), STEP_TIMEOUT)
+            if session.errors:
+                error = session.errors[0]
+        except (ConnectionError, LookupError, asyncio.TimeoutError, asyncio.IncompleteReadError, OSError, ValueError) as e:
+            error = f"{type(e).__name__}: {e}"
+        self.records.append({
+            'session': index,
+            'step': name,
+            'started': started - self._started,
+            'seconds': time.perf_counter() - started,
+            'error': error,
+        })
+        return error
+
+    async def _session(self, index):
+        rng = random.Random(self.seed * 100003 + index)
+        await asyncio.sleep(self.ramp_up * index / max(self.sessions, 1))
+        deadline = time.perf_counter() + self.duration
+        session = None
+        step_index = 0
+        while time.perf_counter() < deadline:
+            if session is None:
+                session = StreamlitSession(self.url)
+                error = await self._run_step(index, 'verbinden', lambda s, r: s.connect(), session, rng)
+                if error is not None:
+                    session = None
+                    await asyncio.sleep(1)
+                    continue
+                if self.files:
+                    await self._run_step(index, 'uploaden', step_upload, session, rng, self.files)
+            name, step = SCENARIO[step_index % len(SCENARIO)]
+            error = await self._run_step(index, name, step, session, rng)
+            step_index += 1
+            if error is not None and error.startswith(('ConnectionError', 'IncompleteReadError', 'TimeoutError', 'OSError')):
+                # Verbinding kwijt: opnieuw beginnen met een nieuwe sessie
+                await session.close()
+                session = None
+                step_index = 0
+            await asyncio.sleep(rng.uniform(0, 2 * self.think_time))
+        if session is not None:
+            await session.close()
+
+    async def _sample_memory(self, stop):
+        while not stop.is_set():
+            rss = process_tree_rss(self.server_pid)
+            if rss is not None:
+                self.memory.append((time.perf_counter() - self._started, rss))
+            try:
+                await asyncio.wait_for(stop.wait(), self.sample_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        self._started = time.perf_counter()
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(self._sample_memory(stop)) if self.server_pid else None
+        await asyncio.gather(*(self._session(i) for i in range(self.sessions)))
+        self.elapsed = time.perf_counter() - self._started
+        stop.set()
+        if sampler is not None:
+            await sampler
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def report(test):
+    """Print the summary of a finished load test"""
+    records = test.records
+    errors = [r for r in records if r['error']]
+    print(f"\n{test.sessions} sessies, {test.elapsed:.0f} s, {len(records)} stappen, "
+          f"{len(records) / test.elapsed:.2f} stappen/s, {len(errors) / max(len(records), 1):.1%} fouten")
+
+    print(f"\n{'stap':<26} {'aantal':>6} {'fouten':>6} {'p50':>7} {'p90':>7} {'p95':>7} {'p99':>7} {'max':>7}")
+    by_step = collections.defaultdict(list)
+    for r in records:
+        by_step[r['step']].append(r)
+    for name in ['uploaden'] + [name for name, _ in SCENARIO] + ['verbinden']:
+        rows = by_step.get(name)
+        if not rows:
+            continue
+        seconds = [r['seconds'] for r in rows]
+        print(f"{name:<26} {len(rows):>6} {sum(1 for r in rows if r['error']):>6}"
+              + ''.join(f" {percentile(seconds, q):>6.2f}s" for q in (50, 90, 95, 99, 100)))
+
+    if errors:
+        print("\nMeest voorkomende fouten:")
+        for message, count in collections.Counter(r['error'] for r in errors).most_common(5):
+            print(f"{count:>6}x {message[:150]}")
+
+    if test.memory:
+        peak = max(rss for _, rss in test.memory)
+        print(f"\nGeheugen van de server: begin {test.memory[0][1] / 2**20:.0f} MB, "
+              f"piek {peak / 2**20:.0f} MB, eind {test.memory[-1][1] / 2**20:.0f} MB")
+        # Ongeveer tien punten uit de tijdlijn
+        step = max(1, len(test.memory) // 10)
+        for seconds, rss in test.memory[::step]:
+            print(f"{seconds:>7.0f}s {rss / 2**20:>8.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Belastingstest met gelijktijdige gesimuleerde gebruikers")
+    parser.add_argument('--sessions', type=int, default=10, help="Gelijktijdige sessies")
+    parser.add_argument('--duration', type=float, default=60, help="Seconden dat elke sessie klikt")
+    parser.add_argument('--ramp-up', type=float, default=10, help="Seconden waarover de sessies starten")
+    parser.add_argument('--think-time', type=float, default=1.0, help="Gemiddelde denktijd tussen twee stappen (seconden)")
+    parser.add_argument('--data-dir', help="Map met bestanden die elke sessie eerst uploadt")
+    parser.add_argument('--url', help="URL van een draaiende app (anders start de test src/serve.py)")
+    parser.add_argument('--server-pid', type=int, help="Proces-id van de server bij --url, voor het geheugen")
+    parser.add_argument('--workers', type=int, default=1, help="App-processen van serve.py (zonder --url)")
+    parser.add_argument('--port', type=int, default=8701, help="Poort van serve.py (zonder --url)")
+    parser.add_argument('--base-port', type=int, default=8711, help="Eerste poort van de app-processen (zonder --url)")
+    parser.add_argument('--sample-interval', type=float, default=1.0, help="Seconden tussen twee geheugenmetingen")
+    parser.add_argument('--seed', type=int, default=0, help="Seed van de gesimuleerde keuzes")
+    parser.add_argument('--output', help="Schrijf alle metingen als JSON naar dit bestand")
+    args = parser.parse_args()
+
+    files = data_files(args.data_dir) if args.data_dir else None
+    process = None
+    if args.url:
+        url, server_pid = args.url, args.server_pid
+    else:
+        process = start_server(args.workers, args.port, args.base_port)
+        url, server_pid = f"http://127.0.0.1:{args.port}", process.pid
+    try:
+        test = LoadTest(url, args.sessions, args.duration, args.ramp_up, args.think_time, files,
+                        server_pid, args.sample_interval, args.seed)
+        asyncio.run(test.run())
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    report(test)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'sessions': args.sessions,
+                'elapsed': test.elapsed,
+                'steps': test.records,
+                'memory': [{'seconds': s, 'bytes': b} for s, b in test.memory],
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Doorvoer van serve.py bij een oplopend aantal app-processen
+
+Start voor elk aantal workers `src/serve.py`, opent een aantal gelijktijdige
+gesimuleerde sessies (zie session_client) en laat die een tijd lang pagina's
+herladen. Per aantal workers worden de reruns per seconde, de mediane en p95
+duur van een rerun en de versnelling ten opzichte van de eerste meting
+gerapporteerd.
+
+Draai de app eerst één keer met de bestanden die je wilt meten (of zet ze in
+de bestandslocatie), zodat de pagina's echte data verwerken.
+
+Gebruik:
+    uv run python benchmarks/serve_throughput.py --workers 1 2 4 --sessions 8 --duration 30
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from session_client import StreamlitSession
+
+SERVE_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'serve.py')
+DEFAULT_PAGES = ['instroomprognose', 'beschrijving_aanmeldingen', 'prognose_Inschrijvingen']
+
+
+def start_server(workers, port, base_port, timeout=180):
+    """Start serve.py and wait until the load balancer accepts connections"""
+    process = subprocess.Popen(
+        [sys.executable, SERVE_SCRIPT, '--workers', str(workers), '--host', '127.0.0.1',
+         '--port', str(port), '--base-port', str(base_port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py is gestopt (code {process.returncode})")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise TimeoutError("serve.py start niet")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def run_sessions(url, sessions, duration, pages, warmup_runs=1):
+    """Let sessions rerun pages until duration has passed
+
+    Returns:
+        tuple: (list of rerun durations in seconds, elapsed seconds)
+    """
+    clients = [StreamlitSession(url) for _ in range(sessions)]
+    await asyncio.gather(*(client.connect() for client in clients))
+
+    # Eerste runs per sessie (sessiestate, caches) tellen niet mee
+    for _ in range(warmup_runs):
+        await asyncio.gather(*(client.rerun(pages[0]) for client in clients))
+
+    durations = []
+    deadline = time.perf_counter() + duration
+
+    async def loop(index, client):
+        step = index
+        while time.perf_counter() < deadline:
+            durations.append(await client.rerun(pages[step % len(pages)]))
+            step += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop(i, client) for i, client in enumerate(clients)))
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*(client.close() for client in clients))
+    return durations, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Meet de doorvoer van serve.py per aantal app-processen")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Aantallen app-processen")
+    parser.add_argument('--sessions', type=int, default=8, help="Gelijktijdige sessies")
+    parser.add_argument('--duration', type=float, default=30, help="Meetduur per aantal workers (seconden)")
+    parser.add_argument('--pages', nargs='+', default=DEFAULT_PAGES, help="Pagina's die de sessies afwisselend herladen")
+    parser.add_argument('--port', type=int, default=8701, help="Poort van de load balancer")
+    parser.add_argument('--base-port', type=int, default=8711, help="Eerste poort van de app-processen")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.sessions} sessies, {args.duration:.0f} s per meting")
+    print(f"{'workers':>7} {'reruns':>7} {'reruns/s':>9} {'mediaan':>8} {'p95':>8} {'versnelling':>11}")
+    baseline = None
+    for workers in args.workers:
+        process = start_server(workers, args.port, args.base_port)
+        try:
+            durations, elapsed = asyncio.run(
+                run_sessions(f"http://127.0.0.1:{args.port}", args.sessions, args.duration, args.pages)
+            )
+        finally:
+            stop_server(process)
+        throughput = len(durations) / elapsed
+        baseline = baseline or throughput
+        p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) > 1 else durations[0]
+        print(
+            f"{workers:>7} {len(durations):>7} {throughput:>9.2f} {statistics.median(durations):>7.2f}s"
+            f" {p95:>7.2f}s {throughput / baseline:>10.2f}x",
+            flush=True,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Gesimuleerde browsersessie voor benchmarks
+
+Een minimale websocket-client (alleen de standaardbibliotheek) die het
+protocol van de Streamlit-frontend naspeelt: verbinden met /_stcore/stream,
+een rerun van een pagina vragen en wachten tot het script klaar is. Zo kan een
+benchmark veel gelijktijdige sessies tegen een echte server (of de load
+balancer van serve.py) draaien zonder browser.
+
+Net als de frontend houdt de sessie bij welke widgets de laatste run getoond
+heeft en stuurt ze bij elke rerun hun waarden mee. Een widget wordt gezocht op
+zijn key (of label); uploads gaan via dezelfde upload-URL's als in de browser.
+"""
+import asyncio
+import base64
+import mimetypes
+import os
+import struct
+import time
+import urllib.parse
+
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+OP_CONTINUATION = 0x0
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+XSRF_COOKIE = '_streamlit_xsrf'
+WIDGET_TYPES = ('multiselect', 'selectbox', 'checkbox', 'button', 'file_uploader')
+
+
+class StreamlitSession:
+    """One simulated browser session on a Streamlit server
+
+    Args:
+        url: Base URL of the app (e.g. http://127.0.0.1:8501)
+
+    Attributes:
+        widgets: Widgets shown by the last run, widget id -> (type, proto element)
+        errors: Exceptions and st.error messages shown by the last run
+    """
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.cookies = {}
+        self.session_id = None
+        self.widgets = {}
+        self.errors = []
+        self._widget_states = {}  # widget id -> WidgetState
+        self._reader = None
+        self._writer = None
+        self._request_id = 0
+
+    async def _http_request(self, method, path, body=b'', headers=()):
+        """Plain HTTP request on a new connection; keeps the cookies it sets
+
+        Returns:
+            tuple: (status code, response body)
+        """
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Connection: close",
+            f"Content-Length: {len(body)}",
+            *headers,
+        ]
+        if self.cookies:
+            lines.append("Cookie: " + '; '.join(f"{k}={v}" for k, v in self.cookies.items()))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, response_body = response.partition(b'\r\n\r\n')
+        head = head.decode('latin-1').split('\r\n')
+        for line in head[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'set-cookie':
+                key, _, rest = value.strip().partition('=')
+                self.cookies[key] = rest.split(';', 1)[0]
+        return int(head[0].split()[1]), response_body
+
+    async def connect(self):
+        # Zoals de browser: de pagina, daarna de health check (zet de XSRF-cookie voor uploads)
+        await self._http_request('GET', '/')
+        await self._http_request('GET', '/_stcore/health')
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        headers = [
+            "GET /_stcore/stream HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Origin: http://{self.host}:{self.port}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+            "Sec-WebSocket-Protocol: streamlit",
+        ]
+        if self.cookies:
+            headers.append("Cookie: " + '; '.join(f"{k}={v}" for k, v in self.cookies.items()))
+        self._writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode())
+        await self._writer.drain()
+        status_line = (await self._reader.readuntil(b'\r\n\r\n')).split(b'\r\n', 1)[0].decode('latin-1')
+        if ' 101 ' not in status_line:
+            raise ConnectionError(f"Websocket geweigerd: {status_line}")
+
+    def _send_frame(self, opcode, payload):
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 2 ** 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self._writer.write(header + mask + masked)
+
+    async def _read_message(self):
+        """Read one (possibly fragmented) message; answers pings on the way"""
+        chunks = []
+        while True:
+            first, second = await self._reader.readexactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length, = struct.unpack('!H', await self._reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack('!Q', await self._reader.readexactly(8))
+            payload = await self._reader.readexactly(length)
+            if opcode == OP_PING:
+                self._send_frame(OP_PONG, payload)
+                continue
+            if opcode == OP_CLOSE:
+                raise ConnectionError("Websocket gesloten door de server")
+            if opcode in (OP_BINARY, OP_CONTINUATION):
+                chunks.append(payload)
+                if first & 0x80:
+                    return b''.join(chunks)
+
+    async def _receive(self):
+        forward = ForwardMsg()
+        forward.ParseFromString(await self._read_message())
+        kind = forward.WhichOneof('type')
+        if kind == 'new_session':
+            # Nieuwe run: alleen de widgets van deze run zijn er straks nog
+            self.session_id = forward.new_session.initialize.session_id or self.session_id
+            self.widgets = {}
+            self.errors = []
+        elif kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+            element = forward.delta.new_element
+            element_type = element.WhichOneof('type')
+            if element_type in WIDGET_TYPES:
+                widget = getattr(element, element_type)
+                self.widgets[widget.id] = (element_type, widget)
+            elif element_type == 'exception':
+                self.errors.append(f"{element.exception.type}: {element.exception.message}")
+            elif element_type == 'alert' and element.alert.format == Alert.ERROR:
+                self.errors.append(element.alert.body)
+        return forward
+
+    async def rerun(self, page_name=''):
+        """Run a page like a browser would and wait until the script finished
+
+        Sends the current value of every widget of the last run along.
+        Exceptions and st.error messages of the run end up in `errors`.
+
+        Returns:
+            float: Seconds until the script finished
+        """
+        message = BackMsg()
+        message.rerun_script.page_name = page_name
+        message.rerun_script.query_string = ''
+        for widget_id, state in self._widget_states.items():
+            if widget_id in self.widgets:
+                message.rerun_script.widget_states.widgets.append(state)
+        # Een knop is één keer ingedrukt, niet blijvend
+        self._widget_states = {
+            widget_id: state for widget_id, state in self._widget_states.items()
+            if state.WhichOneof('value') != 'trigger_value'
+        }
+        started = time.perf_counter()
+        self._send_frame(OP_BINARY, message.SerializeToString())
+        await self._writer.drain()
+        while True:
+            forward = await self._receive()
+            # Bij st.rerun() volgt direct een nieuwe run: wachten tot die klaar is
+            if (forward.WhichOneof('type') == 'script_finished'
+                    and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN):
+                return time.perf_counter() - started
+
+    def find_widget(self, key=None, label=None):
+        """Find a widget of the last run by its key (or label)
+
+        Returns:
+            tuple: (widget type, proto element)
+
+        Raises:
+            LookupError: If the last run didn't show such a widget
+        """
+        for widget_id, (widget_type, widget) in self.widgets.items():
+            if (key is not None and widget_id.endswith('-' + key)) or (label is not None and widget.label == label):
+                return widget_type, widget
+        raise LookupError(f"Widget niet gevonden: {key or label}")
+
+    def set_widget(self, value, key=None, label=None):
+        """Set the value of a widget for the next rerun (like a user would)
+
+        Args:
+            value: list of options (multiselect), option (selectbox), bool
+                (checkbox) or True (button: one click)
+        """
+        widget_type, widget = self.find_widget(key, label)
+        state = WidgetState(id=widget.id)
+        if widget_type == 'multiselect':
+            state.string_array_value.data.extend(str(v) for v in value)
+        elif widget_type == 'selectbox':
+            state.string_value = str(value)
+        elif widget_type == 'checkbox':
+            state.bool_value = bool(value)
+        elif widget_type == 'button':
+            state.trigger_value = True
+        else:
+            raise ValueError(f"Widget {widget.id} van type {widget_type} kan niet gezet worden")
+        self._widget_states[widget.id] = state
+
+    def widget_value(self, key=None, label=None):
+        """Value of a widget as the next rerun sends it (the set value, else the default)"""
+        widget_type, widget = self.find_widget(key, label)
+        state = self._widget_states.get(widget.id)
+        if state is None:
+            return widget.default
+        return getattr(state, state.WhichOneof('value'))
+
+    def widget_options(self, key=None, label=None):
+        """Options of a multiselect or selectbox of the last run"""
+        return list(self.find_widget(key, label)[1].options)
+
+    async def upload(self, file_paths, key=None, label=None):
+        """Upload files into a file_uploader, like dropping them in the browser
+
+        Uploads the files over HTTP and sets the widget state; the next rerun
+        hands them to the script.
+        """
+        _, widget = self.find_widget(key, label)
+        self._request_id += 1
+        request_id = str(self._request_id)
+        message = BackMsg()
+        message.file_urls_request.request_id = request_id
+        message.file_urls_request.session_id = self.session_id
+        message.file_urls_request.file_names.extend(os.path.basename(p) for p in file_paths)
+        self._send_frame(OP_BINARY, message.SerializeToString())
+        await self._writer.drain()
+        while True:
+            forward = await self._receive()
+            if forward.WhichOneof('type') == 'file_urls_response' and forward.file_urls_response.response_id == request_id:
+                response = forward.file_urls_response
+                break
+        if response.error_msg:
+            raise ConnectionError(f"Upload geweigerd: {response.error_msg}")
+
+        state = WidgetState(id=widget.id)
+        for file_path, file_urls in zip(file_paths, response.file_urls):
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            name = os.path.basename(file_path)
+            boundary = base64.b16encode(os.urandom(12)).decode()
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            body = (
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{name}\"\r\n"
+                f"Content-Type: {content_type}\r\n\r\n"
+            ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+            status, response_body = await self._http_request('PUT', urllib.parse.urlparse(file_urls.upload_url).path, body, [
+                f"Content-Type: multipart/form-data; boundary={boundary}",
+                f"X-Xsrftoken: {self.cookies.get(XSRF_COOKIE, '')}",
+            ])
+            if status >= 300:
+                raise ConnectionError(f"Upload van {name} mislukt ({status}): {response_body[:200].decode(errors='replace')}")
+            info = state.file_uploader_state_value.uploaded_file_info.add()
+            info.name = name
+            info.size = len(data)
+            info.file_id = file_urls.file_id
+            info.file_urls.CopyFrom(file_urls)
+        self._widget_states[widget.id] = state
+
+    async def close(self):
+        if self._writer is not None:
+            try:
+                self._send_frame(OP_CLOSE, b'')
+                await self._writer.drain()
+            except ConnectionError:
+                pass
+            self._writer.close()
@@ -0,0 +1,194 @@
+"""
+Pagina-aggregaties
+
+De aggregaties die de analysepagina's gebruiken (unieke aanmeldingen per
+week/status, sommen van Individual_ratio, totalen per jaar). De pandas
+implementatie is de referentie en altijd beschikbaar; via `QUERY_BACKEND`
+(zie backend/config.py) kan DuckDB of Polars als engine worden gekozen. Als de
+engine niet beschikbaar is of een query faalt, wordt teruggevallen op pandas;
+een falende query wordt gelogd, zodat een fout in de engine niet onopgemerkt
+blijft.
+
+Binnen de pandas engine gaan groeperingen op kleine domeinen eerst naar de
+dichte numpy kernels (zie dense_kernels); past een kernel niet, dan rekent
+de gewone groupby.
+"""
+import logging
+
+from backend import dense_kernels, duckdb_backend, polars_backend
+from backend.config import DENSE_KERNELS, QUERY_BACKEND
+
+ENGINES = {'duckdb': duckdb_backend, 'polars': polars_backend}
+
+logger = logging.getLogger(__name__)
+
+
+def _log_fallback(engine, aggregation):
+    """Log a failing engine query (with traceback) before falling back to pandas"""
+    logger.warning("%s faalde in %s, terugval op pandas", aggregation, engine.__name__, exc_info=True)
+
+
+def _engine(backend):
+    """Return the backend module the aggregation should run in, or None for pandas"""
+    engine = ENGINES.get((backend or QUERY_BACKEND).lower())
+    if engine is not None and engine.is_available():
+        return engine
+    return None
+
+
+def count_unique_per_group(df, group_cols, id_col, value_name='aantal', backend=None):
+    """Count unique values of id_col per group
+
+    Args:
+        df: pandas.DataFrame
+        group_cols: List of columns to group by
+        id_col: Column with identifiers (e.g. caketenid)
+        value_name: Name of the result column
+        backend: 'pandas', 'duckdb' or 'polars' (default: QUERY_BACKEND)
+
+    Returns:
+        pandas.DataFrame with group_cols + value_name, sorted by group_cols
+    """
+    engine = _engine(backend)
+    if engine is not None:
+        try:
+            return engine.count_unique_per_group(df, group_cols, id_col, value_name)
+        except Exception:
+            _log_fallback(engine, 'count_unique_per_group')
+    if DENSE_KERNELS:
+        result = dense_kernels.count_unique_per_group(df, group_cols, id_col, value_name)
+        if result is not None:
+            return result
+    result = df.groupby(group_cols)[id_col].nunique().reset_index()
+    result.columns = list(result.columns[:-1]) + [value_name]
+    return result
+
+
+def sum_per_group(df, group_cols, value_col, value_name=None, backend=None):
+    """Sum value_col per group
+
+    Args:
+        df: pandas.DataFrame
+        group_cols: List of columns to group by
+        value_col: Column to sum (e.g. aantal, Individual_ratio)
+        value_name: Name of the result column (default: value_col)
+        backend: 'pandas', 'duckdb' or 'polars' (default: QUERY_BACKEND)
+
+    Returns:
+        pandas.DataFrame with group_cols + value_name, sorted by group_cols
+    """
+    value_name = value_name or value_col
+    engine = _engine(backend)
+    if engine is not None:
+        try:
+            return engine.sum_per_group(df, group_cols, value_col, value_name)
+        except Exception:
+            _log_fallback(engine, 'sum_per_group')
+    if DENSE_KERNELS:
+        result = dense_kernels.sum_per_group(df, group_cols, value_col, value_name)
+        if result is not None:
+            return result
+    result = df.groupby(group_cols)[value_col].sum().reset_index()
+    result.columns = list(result.columns[:-1]) + [value_name]
+    return result
+
+
+def sum_column(df, value_col, backend=None):
+    """Sum value_col over all rows
+
+    Args:
+        df: pandas.DataFrame
+        value_col: Column to sum
+        backend: 'pandas', 'duckdb' or 'polars' (default: QUERY_BACKEND)
+
+    Returns:
+        Sum as number (0 for an empty DataFrame)
+    """
+    engine = _engine(backend)
+    if engine is not None:
+        try:
+            return engine.sum_column(df, value_col)
+        except Exception:
+            _log_fallback(engine, 'sum_column')
+    return df[value_col].sum()
+
+
+def cumulative_per_group(df, partition_cols, order_col, value_col, value_name='cumulatief', backend=None):
+    """Running total of value_col in order of order_col within each partition (e.g. per schooljaar and status)
+
+    Args:
+        df: pandas.DataFrame with at most one row per partition and order_col value
+        partition_cols: Columns that each get their own running total
+        order_col: Column to accumulate along (e.g. the week)
+        value_col: Column to accumulate
+        value_name: Name of the result column
+        backend: 'pandas' or 'polars' (default: QUERY_BACKEND; duckdb computes this in pandas)
+
+    Returns:
+        pandas.DataFrame with the columns of df + value_name, sorted by partition_cols and order_col
+    """
+    engine = _engine(backend)
+    if engine is polars_backend and not df.empty:
+        try:
+            return polars_backend.cumulative_per_group(df, partition_cols, order_col, value_col, value_name)
+        except Exception:
+            _log_fallback(polars_backend, 'cumulative_per_group')
+    if DENSE_KERNELS:
+        result = dense_kernels.cumulative_per_group(df, partition_cols, order_col, value_col, value_name)
+        if result is not None:
+            return result
+    result = df.sort_values(list(partition_cols) + [order_col], kind='stable', ignore_index=True)
+    result[value_name] = result.groupby(list(partition_cols), sort=False, dropna=False)[value_col].cumsum()
+    return result
+
+
+def pivot_sum(df, index, columns, values, backend=None):
+    """Wide table of the sum of values per index and columns value (e.g. week x status)
+
+    Args:
+        df: pandas.DataFrame
+        index: Column whose values become the rows
+        columns: Column whose values become the columns
+        values: Column to sum
+        backend: 'pandas' or 'polars' (default: QUERY_BACKEND; duckdb computes this in pandas)
+
+    Returns:
+        pandas.DataFrame with sorted index and columns, 0 where a combination doesn't occur
+    """
+    engine = _engine(backend)
+    if engine is polars_backend and not df.empty:
+        try:
+            return polars_backend.pivot_sum(df, index, columns, values)
+        except Exception:
+            _log_fallback(polars_backend, 'pivot_sum')
+    if DENSE_KERNELS:
+        result = dense_kernels.pivot_sum(df, index, columns, values)
+        if result is not None:
+            return result
+    return df.pivot_table(index=index, columns=columns, values=values, aggfunc='sum', fill_value=0)
+
+
+def cumulative_week_table(df, column_col, week_col, value_col, weeks):
+    """Running total of value_col per week (rows) for each value of column_col (columns)
+
+    Weeks without data carry the total of the week before (0 before the first week).
+
+    Args:
+        df: pandas.DataFrame, only rows with a week in weeks
+        column_col: Column whose values become the columns (e.g. schooljaar)
+        week_col: Week column (e.g. academic_week)
+        value_col: Column to sum
+        weeks: pandas.RangeIndex of the weeks to show (e.g. 1-52)
+
+    Returns:
+        pandas.DataFrame with index weeks and one column per value of column_col
+    """
+    if DENSE_KERNELS:
+        result = dense_kernels.cumulative_week_table(df, column_col, week_col, value_col, weeks)
+        if result is not None:
+            return result
+    weekly = df.groupby([column_col, week_col])[value_col].sum().reset_index()
+    weekly = weekly.sort_values([column_col, week_col], kind='stable')
+    weekly['cumulatief'] = weekly.groupby(column_col, sort=False)[value_col].cumsum()
+    table = weekly.pivot_table(index=week_col, columns=column_col, values='cumulatief', aggfunc='sum')
+    return table.reindex(weeks).ffill().fillna(0)
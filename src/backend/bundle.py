@@ -0,0 +1,231 @@
+"""
+Deelbare bundel met voorbewerkte data
+
+Elke planner die het dashboard opent moest dezelfde ruwe bestanden uploaden en
+opnieuw parsen en aggregeren. Een bundel is één bestand (zip) met alles wat
+daarvoor nodig is, al verwerkt:
+
+- de geparste datasets als Parquet (kolomgewijs, zstd-gecomprimeerd);
+- de weekaggregaten van de prognose store die bij deze bestanden horen;
+- de metadata per bestand (CSV-dialect, kolomprofiel) en een manifest.
+
+Bij het laden komen de datasets, aggregaten en metadata direct in de
+proces-brede caches; er wordt niets ruw geparst. Gecodeerde identifiers
+zijn categorische kolommen (zie identifiers); hun dictionary staat als
+Parquet dictionary bij de dataset en komt ongewijzigd terug.
+"""
+import json
+import os
+import shutil
+import time
+import zipfile
+
+import pandas as pd
+
+from backend.config import BUNDLE_DIR
+from backend.datasets import get_dataset
+from backend.file_metadata import get_all_file_metadata, set_file_metadata
+from backend.prognosis_store import get_prognosis_store
+from backend.storage import compute_file_hash
+
+BUNDLE_VERSION = 2
+BUNDLE_EXTENSION = '.instroom'
+MANIFEST_NAME = 'manifest.json'
+
+
+def _parquet_bytes(df):
+    """Serialise a DataFrame to Parquet, making it storable where needed
+
+    Column names become strings and object columns with mixed types
+    (e.g. numbers and text in one Excel column) are stored as text.
+    """
+    df = df.rename(columns=str)
+    try:
+        return df.to_parquet(index=False, compression='zstd')
+    except Exception:
+        df = df.copy()
+        for position, dtype in enumerate(df.dtypes):
+            if dtype == object:
+                col = df.iloc[:, position]
+                df.isetitem(position, col.where(col.isna(), col.astype(str)))
+        return df.to_parquet(index=False, compression='zstd')
+
+
+def export_bundle(files, destination):
+    """Write the parsed datasets, aggregates and metadata of a set of files to a bundle
+
+    Args:
+        files: List of (file_type, file_name, file_size, file_hash, df) with df the parsed DataFrame
+        destination: Path or writable binary file object
+
+    Returns:
+        dict: The manifest of the bundle
+    """
+    files = [entry for entry in files if entry[4] is not None]
+
+    manifest = {'version': BUNDLE_VERSION, 'created': time.time(), 'files': [], 'partitions': []}
+    written = set()  # members already in the bundle: a file selected under both types is stored once
+    with zipfile.ZipFile(destination, 'w', compression=zipfile.ZIP_STORED) as bundle:
+        for file_type, file_name, file_size, file_hash, df in files:
+            dataset_path = f"datasets/{file_hash}.parquet"
+            if dataset_path not in written:
+                bundle.writestr(dataset_path, _parquet_bytes(df))
+                written.add(dataset_path)
+
+            entry = {
+                'file_type': file_type,
+                'file_name': file_name,
+                'file_size': int(file_size),
+                'file_hash': file_hash,
+                'dataset': dataset_path,
+                'metadata': {},
+            }
+            for key, value in get_all_file_metadata(file_hash).items():
+                if isinstance(value, pd.DataFrame):
+                    member = f"metadata/{file_hash}/{key}.parquet"
+                    if member not in written:
+                        bundle.writestr(member, _parquet_bytes(value))
+                        written.add(member)
+                    entry['metadata'][key] = {'parquet': member}
+                else:
+                    entry['metadata'][key] = {'json': value}
+            manifest['files'].append(entry)
+
+        file_hashes = {entry['file_hash'] for entry in manifest['files']}
+        store = get_prognosis_store()
+        for partition in store.entries(file_hashes):
+            member = f"cubes/jaar={partition['jaar']}/week={partition['week']:02d}/{partition['file_hash']}.parquet"
+            aggregate = store.read_partition(partition['jaar'], partition['week'], partition['file_hash'])
+            bundle.writestr(member, _parquet_bytes(aggregate))
+            manifest['partitions'].append({
+                'jaar': partition['jaar'],
+                'week': partition['week'],
+                'file_hash': partition['file_hash'],
+                'file_name': partition['file_name'],
+                'path': member,
+            })
+
+        bundle.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1), compress_type=zipfile.ZIP_DEFLATED)
+    return manifest
+
+
+class BundleFileHandle:
+    """Handle on a file whose parsed dataset comes from a bundle (there is no raw file)
+
+    Has the file interface of storage.LocalFileHandle, so it can go wherever an
+    uploaded file goes. read_data_file takes the dataset from the bundle; reading
+    the raw bytes raises OSError.
+
+    Args:
+        bundle_path: Path to the bundle on the server
+        entry: File entry of the bundle manifest
+    """
+
+    source = 'bundle'
+
+    def __init__(self, bundle_path, entry):
+        self.bundle_path = bundle_path
+        self.name = entry['file_name']
+        self.size = entry['file_size']
+        self.file_hash = entry['file_hash']
+        self.file_type = entry['file_type']
+        self.entry = entry
+
+    def load_dataset(self):
+        """Read the dataset from the bundle (used when it isn't in the dataset cache)"""
+        with zipfile.ZipFile(self.bundle_path) as bundle:
+            return _read_dataset(bundle, self.entry)
+
+    def _unavailable(self):
+        return OSError(f"{self.name} komt uit een bundel; het ruwe bestand is niet beschikbaar")
+
+    def read(self, size=-1):
+        raise self._unavailable()
+
+    def readline(self):
+        raise self._unavailable()
+
+    def seek(self, offset, whence=0):
+        return 0
+
+    def tell(self):
+        return 0
+
+    def seekable(self):
+        """Return True if the file is seekable"""
+        return True
+
+    def getbuffer(self):
+        raise self._unavailable()
+
+    def close(self):
+        pass
+
+
+def _read_parquet(bundle, member):
+    """Read a Parquet member of the bundle straight from the zip file (members are stored uncompressed)"""
+    with bundle.open(member) as f:
+        return pd.read_parquet(f)
+
+
+def _read_dataset(bundle, entry):
+    return _read_parquet(bundle, entry['dataset'])
+
+
+def import_bundle(source, bundle_name='bundel'):
+    """Load a bundle into the process-wide caches
+
+    The bundle is copied to the bundle directory on the server, so its datasets
+    can be read again when they are no longer cached.
+
+    Args:
+        source: Path or readable binary file object
+        bundle_name: Name of the bundle (for messages)
+
+    Returns:
+        list of BundleFileHandle, one per file in the bundle
+
+    Raises:
+        ValueError: If the file is not a (supported) bundle
+    """
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    tmp_path = os.path.join(BUNDLE_DIR, f".import-{os.getpid()}-{time.time_ns()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as src:
+                shutil.copyfileobj(src, f)
+        else:
+            source.seek(0)
+            shutil.copyfileobj(source, f)
+    bundle_path = os.path.join(BUNDLE_DIR, compute_file_hash(tmp_path) + BUNDLE_EXTENSION)
+    os.replace(tmp_path, bundle_path)
+
+    try:
+        bundle = zipfile.ZipFile(bundle_path)
+    except zipfile.BadZipFile:
+        raise ValueError(f"{bundle_name} is geen bundel")
+    with bundle:
+        try:
+            manifest = json.loads(bundle.read(MANIFEST_NAME))
+        except KeyError:
+            raise ValueError(f"{bundle_name} is geen bundel (manifest ontbreekt)")
+        if manifest.get('version') != BUNDLE_VERSION:
+            raise ValueError(f"{bundle_name} heeft een niet-ondersteunde versie ({manifest.get('version')})")
+
+        handles = []
+        for entry in manifest['files']:
+            handle = BundleFileHandle(bundle_path, entry)
+            get_dataset(entry['file_hash'], entry['file_name'], lambda: _read_dataset(bundle, entry))
+            for key, value in entry['metadata'].items():
+                if 'parquet' in value:
+                    set_file_metadata(entry['file_hash'], key, _read_parquet(bundle, value['parquet']))
+                else:
+                    set_file_metadata(entry['file_hash'], key, value['json'])
+            handles.append(handle)
+
+        store = get_prognosis_store()
+        for partition in manifest['partitions']:
+            if not store.has_partition(partition['jaar'], partition['week'], partition['file_hash']):
+                aggregate = _read_parquet(bundle, partition['path'])
+                store.append(partition['jaar'], partition['week'], partition['file_hash'], partition['file_name'], aggregate)
+    return handles
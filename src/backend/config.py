@@ -0,0 +1,98 @@
+"""
+Backend configuratie
+
+Alle instellingen kunnen via omgevingsvariabelen worden aangepast, zodat de app
+zonder codewijziging anders gedeployed kan worden.
+"""
+import os
+import tempfile
+
+# ---------------------------------------
+# QUERY BACKEND
+# ---------------------------------------
+# Engine voor de aggregaties op de analysepagina's:
+#   'pandas' - standaard, rekent op de ingelezen DataFrames
+#   'duckdb' - voert de aggregaties uit als SQL in een embedded DuckDB database
+#              (valt automatisch terug op pandas als duckdb niet geïnstalleerd is)
+#   'polars' - voert de aggregaties, lopende sommen en pivots uit als lazy Polars
+#              query, multi-threaded (valt terug op pandas zonder polars)
+QUERY_BACKEND = os.environ.get('INSTROOM_QUERY_BACKEND', 'pandas').strip().lower()
+# Met de pandas engine groeperen op kleine domeinen (week, status, schooljaar) via
+# dichte numpy arrays ('1') in plaats van een hash-groupby en pivot_table ('0')
+DENSE_KERNELS = os.environ.get('INSTROOM_DENSE_KERNELS', '1').strip() not in ('0', 'false', 'no')
+
+# ---------------------------------------
+# DISTINCT COUNTS
+# ---------------------------------------
+# Telling van unieke caketenid / bsn_hash:
+#   'exact'       - standaard, exacte nunique()
+#   'approximate' - HyperLogLog sketches (sneller op sectorbrede data, met foutmarge)
+DISTINCT_COUNT_MODE = os.environ.get('INSTROOM_DISTINCT_COUNT_MODE', 'exact').strip().lower()
+# Aantal index-bits van de HyperLogLog sketch (registers = 2^precisie)
+HLL_PRECISION = int(os.environ.get('INSTROOM_HLL_PRECISION', '12'))
+# bsn_hash / caketenid bij het inlezen categorisch opslaan, met een dictionary per
+# bestand ('1'), of als strings laten staan ('0')
+ENCODE_IDENTIFIERS = os.environ.get('INSTROOM_ENCODE_IDENTIFIERS', '1').strip() not in ('0', 'false', 'no')
+
+# ---------------------------------------
+# DATA DIRECTORIES
+# ---------------------------------------
+# Mappen op de server waaruit bestanden direct worden ingelezen (zonder upload),
+# gescheiden door os.pathsep (':' op Linux/macOS, ';' op Windows)
+DATA_DIRECTORIES = [d for d in os.environ.get('INSTROOM_DATA_DIRS', '').split(os.pathsep) if d.strip()]
+# Minimaal aantal seconden tussen twee scans van de data directories
+DATA_DIRECTORY_SCAN_INTERVAL = float(os.environ.get('INSTROOM_DATA_DIR_SCAN_INTERVAL', '5'))
+
+# ---------------------------------------
+# INLEZEN
+# ---------------------------------------
+# Aantal worker threads dat bestanden op de achtergrond inleest
+INGEST_WORKERS = int(os.environ.get('INSTROOM_INGEST_WORKERS', '2'))
+# Bij het starten van de server alle bewaarde bestanden op de achtergrond inlezen (warm-up)
+WARMUP_ON_START = os.environ.get('INSTROOM_WARMUP', '1').strip() not in ('0', 'false', 'no')
+
+# ---------------------------------------
+# RAPPORTAGE
+# ---------------------------------------
+# Aantal processen voor het maken van rapporten per instelling (standaard: aantal cores)
+REPORT_WORKERS = int(os.environ.get('INSTROOM_REPORT_WORKERS', str(os.cpu_count() or 1)))
+
+# ---------------------------------------
+# SERVEREN
+# ---------------------------------------
+# Aantal app-processen dat serve.py achter de load balancer start (standaard: aantal cores)
+SERVE_WORKERS = int(os.environ.get('INSTROOM_SERVE_WORKERS', str(os.cpu_count() or 1)))
+# Nieuw geparste datasets direct in de data plane zetten voor de andere app-processen;
+# serve.py zet dit aan als het meer dan één proces start
+SHARED_DATA_PLANE = os.environ.get('INSTROOM_SHARED_DATA_PLANE', '0').strip() not in ('0', 'false', 'no')
+
+# ---------------------------------------
+# OPSLAG
+# ---------------------------------------
+# Basismap voor persistente opslag van de app (tijdelijke kopieën, store, caches)
+APP_STORAGE_DIR = os.environ.get(
+    'INSTROOM_STORAGE_DIR', os.path.join(tempfile.gettempdir(), 'streamlit_app_files')
+)
+# Bewaarde uploads: per bestandstype een map met de kopieën en een files_metadata.pkl
+UPLOAD_DIR = APP_STORAGE_DIR
+# Append-only opslag van weekaggregaten van de prognose
+PROGNOSIS_STORE_DIR = os.path.join(APP_STORAGE_DIR, 'prognose_store')
+# Geïmporteerde bundels met voorbewerkte data
+BUNDLE_DIR = os.path.join(APP_STORAGE_DIR, 'bundles')
+# Gegenereerde rapporten per instelling
+REPORT_DIR = os.path.join(APP_STORAGE_DIR, 'rapporten')
+# Resultaatcache van de pagina-aggregaten (overleeft een herstart van de server)
+RESULT_CACHE_DIR = os.path.join(APP_STORAGE_DIR, 'result_cache')
+# Maximale grootte van de resultaatcache in MB; de minst recent gebruikte resultaten gaan eerst weg
+RESULT_CACHE_MAX_BYTES = int(float(os.environ.get('INSTROOM_RESULT_CACHE_MB', '256')) * 1024 * 1024)
+# Gedeelde data plane: geparste datasets als Arrow IPC, gelezen via memory maps door alle serverprocessen
+DATA_PLANE_DIR = os.path.join(APP_STORAGE_DIR, 'data_plane')
+# Bestanden in de data plane die zo lang (uren) niet geschreven of gelezen zijn, worden opgeruimd
+DATA_PLANE_MAX_AGE = float(os.environ.get('INSTROOM_DATA_PLANE_MAX_AGE_HOURS', '24')) * 3600
+
+# ---------------------------------------
+# GEHEUGEN
+# ---------------------------------------
+# Budget in MB voor de proces-brede datasets en aggregaten (0 = onbeperkt); daarboven worden
+# de minst recent gebruikte naar schijf uitgeplaatst of uit het geheugen verwijderd
+MEMORY_BUDGET_BYTES = int(float(os.environ.get('INSTROOM_MEMORY_BUDGET_MB', '1024')) * 1024 * 1024)
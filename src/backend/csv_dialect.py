@@ -0,0 +1,144 @@
+"""
+CSV dialect detectie
+
+Eén keer per bestand wordt op een sample van het begin bepaald hoe de CSV
+gelezen moet worden: encoding, scheidingsteken, quote-teken, de regel met de
+kolomnamen en of er een decimale komma wordt gebruikt. Het resultaat is een
+klein dict dat bij de bestandsmetadata wordt bewaard (zie file_metadata), zodat
+elke volgende lezing direct met de snelle C-parser van pandas kan.
+"""
+import csv
+import re
+from collections import Counter
+
+SAMPLE_SIZE = 64 * 1024  # 64 KB
+MAX_SAMPLE_LINES = 50
+SEPARATOR_CANDIDATES = [';', ',', '\t', '|']
+FALLBACK_ENCODING = 'iso-8859-1'
+
+_DECIMAL_COMMA = re.compile(r'^-?\d+,\d+$')
+_DECIMAL_POINT = re.compile(r'^-?\d+\.\d+$')
+
+
+def _decode_sample(sample):
+    """Decode a sample as UTF-8 (with or without BOM), falling back to ISO-8859-1
+
+    Returns:
+        tuple: (text, encoding)
+    """
+    encoding = 'utf-8-sig' if sample.startswith(b'\xef\xbb\xbf') else 'utf-8'
+    try:
+        return sample.decode(encoding), encoding
+    except UnicodeDecodeError as e:
+        # Een multibyte teken dat door het afkappen van de sample half is, is geen fout
+        if e.reason == 'unexpected end of data' and e.start >= len(sample) - 3:
+            return sample[:e.start].decode(encoding), encoding
+    return sample.decode(FALLBACK_ENCODING), FALLBACK_ENCODING
+
+
+def _field_counts(lines, separator, quotechar):
+    return [len(row) for row in csv.reader(lines, delimiter=separator, quotechar=quotechar)]
+
+
+def _detect_separator(lines, quotechar):
+    """Pick the candidate that splits the lines into the most, consistent fields"""
+    best, best_score = None, (0, 0)
+    for separator in SEPARATOR_CANDIDATES:
+        counts = _field_counts(lines, separator, quotechar)
+        if not counts:
+            continue
+        fields, frequency = Counter(counts).most_common(1)[0]
+        if fields < 2:
+            continue
+        score = (frequency / len(counts), fields)
+        if score > best_score:
+            best, best_score = separator, score
+    if best is not None:
+        return best
+    # Terugval: tel op de eerste regel
+    first_line = lines[0] if lines else ''
+    if ';' in first_line and first_line.count(';') > first_line.count(','):
+        return ';'
+    return ','
+
+
+def _is_preamble(fields, expected):
+    """True if a line with this many fields is clearly not part of a table with expected fields"""
+    return fields < expected and fields <= max(1, expected // 2)
+
+
+def sniff_csv_dialect(sample, truncated=False):
+    """Detect the dialect of a CSV from a sample of its first bytes
+
+    Args:
+        sample: Bytes from the start of the file
+        truncated: True if the sample doesn't contain the whole file
+
+    Returns:
+        dict with encoding, separator, quotechar, header_row and decimal
+    """
+    text, encoding = _decode_sample(sample)
+    lines = text.splitlines()
+    if truncated and len(lines) > 1:
+        lines = lines[:-1]  # laatste regel is mogelijk afgekapt
+    lines = lines[:MAX_SAMPLE_LINES]
+
+    quotechar = '"'
+    if text.count("'") > text.count('"') and re.search(r"(^|[;,\t|])'", text, re.MULTILINE):
+        quotechar = "'"
+
+    separator = _detect_separator([line for line in lines if line.strip()], quotechar)
+
+    # Kolomnamen staan op de eerste regel; alleen lege regels en regels met duidelijk
+    # minder velden dan de tabel (een titel of toelichting boven de tabel) gaan ervoor.
+    # Een kopregel met een scheidingsteken aan het eind, of met een veld minder dan
+    # de datarijen, blijft zo de kopregel.
+    counts = _field_counts(lines, separator, quotechar)
+    header_row = 0
+    non_empty = [c for line, c in zip(lines, counts) if line.strip()]
+    if non_empty:
+        expected = Counter(non_empty).most_common(1)[0][0]
+        header_row = next(
+            (i for i, (line, c) in enumerate(zip(lines, counts)) if line.strip() and not _is_preamble(c, expected)), 0
+        )
+
+    decimal = '.'
+    if separator != ',':
+        values = [
+            value.strip()
+            for row in csv.reader(lines[header_row + 1:], delimiter=separator, quotechar=quotechar)
+            for value in row
+        ]
+        if any(_DECIMAL_COMMA.match(v) for v in values) and not any(_DECIMAL_POINT.match(v) for v in values):
+            decimal = ','
+
+    return {
+        'encoding': encoding,
+        'separator': separator,
+        'quotechar': quotechar,
+        'header_row': header_row,
+        'decimal': decimal,
+    }
+
+
+def detect_csv_dialect(file_obj):
+    """Detect the dialect of a CSV file object (reads one sample, restores the position)"""
+    file_obj.seek(0)
+    sample = file_obj.read(SAMPLE_SIZE + 1)
+    file_obj.seek(0)
+    truncated = len(sample) > SAMPLE_SIZE
+    return sniff_csv_dialect(sample[:SAMPLE_SIZE], truncated=truncated)
+
+
+def read_csv_kwargs(dialect):
+    """Translate a detected dialect into pandas.read_csv keyword arguments"""
+    return {
+        'sep': dialect['separator'],
+        'encoding': dialect['encoding'],
+        'quotechar': dialect['quotechar'],
+        'skiprows': dialect['header_row'] or None,
+        'decimal': dialect['decimal'],
+        # Nooit de eerste kolom als index, ook niet als datarijen op een scheidingsteken eindigen
+        'index_col': False,
+        'engine': 'c',
+    }
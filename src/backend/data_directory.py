@@ -0,0 +1,177 @@
+"""
+Ingest vanuit data directories op de server
+
+Als alternatief voor uploaden via de browser kunnen één of meer mappen op de
+server worden geconfigureerd (INSTROOM_DATA_DIRS). Bestanden met een bekende
+naam worden daar direct gelezen, zonder upload en zonder tijdelijke kopie:
+  - predictions_mbo_<jaar>_week<##>.xlsx      -> Instroomprognose
+  - inschrijvingen_summary_*                   -> Instroomprognose
+  - application(s)_enriched_with_context_*     -> Beschrijving aanmeldingen
+
+Bij elke scan (hooguit eens per DATA_DIRECTORY_SCAN_INTERVAL seconden) wordt
+alleen opnieuw gehasht als mtime of grootte veranderd is. Het manifest met
+mtime, grootte en hash wordt bewaard, zodat ook na een herstart alleen nieuwe
+of gewijzigde bestanden als zodanig herkend worden.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+from backend.config import APP_STORAGE_DIR, DATA_DIRECTORIES, DATA_DIRECTORY_SCAN_INTERVAL
+from backend.datasets import drop_dataset
+from backend.file_metadata import drop_file_metadata
+from backend.storage import LocalFileHandle, compute_file_hash
+
+FILE_PATTERNS = {
+    'prognose': [
+        re.compile(r'^predictions_mbo_\d+_week\d+\.xlsx$', re.IGNORECASE),
+        re.compile(r'^inschrijvingen_summary.*\.(csv|xlsx|xls)$', re.IGNORECASE),
+    ],
+    'beschrijving': [
+        re.compile(r'^applications?_enriched_with_context.*\.(csv|xlsx|xls)$', re.IGNORECASE),
+    ],
+}
+
+MANIFEST_PATH = os.path.join(APP_STORAGE_DIR, 'data_directory_manifest.json')
+
+
+def classify_file(file_name):
+    """Return the file type ('beschrijving' or 'prognose') for a file name, or None"""
+    for file_type, patterns in FILE_PATTERNS.items():
+        if any(pattern.match(file_name) for pattern in patterns):
+            return file_type
+    return None
+
+
+class DataDirectoryWatcher:
+    """Keeps track of the recognised files in the configured data directories
+
+    Args:
+        directories: List of directories to watch
+        scan_interval: Minimum number of seconds between two scans
+        manifest_path: Where the manifest (mtime, size, hash per file) is stored
+    """
+
+    def __init__(self, directories, scan_interval=DATA_DIRECTORY_SCAN_INTERVAL, manifest_path=MANIFEST_PATH):
+        self.directories = [d for d in directories if d]
+        self.scan_interval = scan_interval
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._last_scan = 0.0
+        self._entries = {}  # file_path -> metadata dict
+        self._manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError:
+            pass
+
+    def scan(self, force=False):
+        """Scan the directories and (re)hash only new or changed files
+
+        Returns:
+            list: Metadata dicts of all recognised files
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._last_scan < self.scan_interval:
+                return list(self._entries.values())
+
+            entries = {}
+            manifest_changed = False
+            for directory in self.directories:
+                if not os.path.isdir(directory):
+                    continue
+                for file_name in sorted(os.listdir(directory)):
+                    file_type = classify_file(file_name)
+                    if file_type is None:
+                        continue
+                    file_path = os.path.abspath(os.path.join(directory, file_name))
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+
+                    known = self._manifest.get(file_path)
+                    if known and known['mtime'] == stat.st_mtime and known['size'] == stat.st_size:
+                        file_hash = known['hash']
+                        status = 'ongewijzigd'
+                    else:
+                        try:
+                            file_hash = compute_file_hash(file_path)
+                        except OSError:
+                            continue
+                        if known is None:
+                            status = 'nieuw'
+                        elif known['hash'] != file_hash:
+                            status = 'gewijzigd'
+                            drop_dataset(known['hash'], file_name)
+                            drop_file_metadata(known['hash'])
+                        else:
+                            status = 'ongewijzigd'
+                        self._manifest[file_path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': file_hash}
+                        manifest_changed = True
+
+                    entries[file_path] = {
+                        'file_name': file_name,
+                        'file_size': stat.st_size,
+                        'file_path': file_path,
+                        'file_hash': file_hash,
+                        'file_type': file_type,
+                        'source': 'data_directory',
+                        'status': status,
+                    }
+
+            # Bestanden die verdwenen zijn uit het manifest halen
+            for file_path in [p for p in self._manifest if p not in entries]:
+                if any(os.path.dirname(file_path) == os.path.abspath(d) for d in self.directories):
+                    del self._manifest[file_path]
+                    manifest_changed = True
+
+            if manifest_changed:
+                self._save_manifest()
+            self._entries = entries
+            self._last_scan = time.monotonic()
+            return list(entries.values())
+
+    def get_files(self, file_type=None):
+        """Return (LocalFileHandle, file_name, file_size) tuples for the recognised files
+
+        Args:
+            file_type: 'beschrijving', 'prognose', or None (all types)
+        """
+        files = []
+        for meta in self.scan():
+            if file_type is None or meta['file_type'] == file_type:
+                handle = LocalFileHandle(
+                    meta['file_path'], meta['file_name'], meta['file_size'],
+                    file_hash=meta['file_hash'], source='data_directory'
+                )
+                files.append((handle, meta['file_name'], meta['file_size']))
+        return files
+
+
+_WATCHER = None
+_WATCHER_LOCK = threading.Lock()
+
+
+def get_watcher():
+    """Return the process-wide watcher for the configured data directories"""
+    global _WATCHER
+    with _WATCHER_LOCK:
+        if _WATCHER is None:
+            _WATCHER = DataDirectoryWatcher(DATA_DIRECTORIES)
+        return _WATCHER
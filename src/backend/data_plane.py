@@ -0,0 +1,169 @@
+"""
+Gedeelde data plane van de serverprocessen
+
+Elke geparste dataset wordt één keer als ongecomprimeerd Arrow IPC bestand in
+DATA_PLANE_DIR gezet. Een serverproces (zie serve.py) dat een dataset nodig
+heeft die het zelf nog niet in het geheugen heeft, leest hem via een
+read-only memory map in plaats van het ruwe bestand opnieuw te parsen. De
+bytes staan dan één keer in de page cache van het besturingssysteem, gedeeld
+door alle processen; numerieke kolommen zonder lege waarden gebruiken de map
+direct, zonder kopie per proces.
+
+De bestandsnaam bevat de content hash, de extensie (de parser hangt ervan af)
+en de codeversie, zodat een deploy met andere inleesregels nooit oude datasets
+gebruikt. Een andere versie die dezelfde opslag gebruikt (bijvoorbeeld tijdens
+een wissel van deploy) houdt zijn bestanden; opgeruimd wordt alleen wat
+DATA_PLANE_MAX_AGE lang niet geschreven of gelezen is. Het geheugenbudget (zie
+memory) gebruikt dezelfde bestanden om datasets uit te plaatsen.
+
+Gecodeerde identifiers (zie identifiers) zijn categorische kolommen met een
+eigen dictionary per dataset; die gaat als Arrow dictionary mee in hetzelfde
+bestand.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:  # Windows: geen lock tussen processen, hooguit dubbel parsen
+    fcntl = None
+
+from backend.config import DATA_PLANE_DIR, DATA_PLANE_MAX_AGE
+from backend.result_cache import compute_code_version
+
+_CODE_VERSION = None
+_LOCK = threading.Lock()
+
+
+def _code_version():
+    global _CODE_VERSION
+    with _LOCK:
+        if _CODE_VERSION is None:
+            _CODE_VERSION = compute_code_version()
+            os.makedirs(DATA_PLANE_DIR, exist_ok=True)
+            _remove_stale()
+        return _CODE_VERSION
+
+
+def _remove_stale():
+    """Remove files (of any code version) that haven't been written or read for DATA_PLANE_MAX_AGE"""
+    cutoff = time.time() - DATA_PLANE_MAX_AGE
+    for name in os.listdir(DATA_PLANE_DIR):
+        path = os.path.join(DATA_PLANE_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _touch(path):
+    """Mark a file as in use, so _remove_stale keeps it"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def dataset_path(key):
+    """Path of a dataset in the data plane
+
+    Args:
+        key: Dataset key (file_hash, extension), see datasets.dataset_key
+    """
+    return os.path.join(DATA_PLANE_DIR, f"{key[0]}.{key[1]}.{_code_version()}.arrow")
+
+
+def can_share(df):
+    """True if the DataFrame survives an Arrow round trip unchanged
+
+    Column names must be strings and object columns must hold only strings;
+    other objects (e.g. numbers and text mixed in one Excel column) would come
+    back with another type, so such datasets stay private to their process.
+    """
+    for position, dtype in enumerate(df.dtypes):
+        if not isinstance(df.columns[position], str):
+            return False
+        if dtype == object and pd.api.types.infer_dtype(df.iloc[:, position], skipna=True) not in ('string', 'empty'):
+            return False
+    return True
+
+
+def _write_table(path, table):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write(key, df):
+    """Put a parsed dataset in the data plane (no-op if it's already there)
+
+    Returns:
+        bool: True if the dataset is in the data plane
+    """
+    path = dataset_path(key)
+    if os.path.exists(path):
+        _touch(path)
+        return True
+    if not can_share(df):
+        return False
+    try:
+        _write_table(path, pa.Table.from_pandas(df))
+    except Exception:
+        return False
+    return True
+
+
+def read(key):
+    """Read a dataset from the data plane through a read-only memory map
+
+    Returns:
+        pandas.DataFrame, or None if it's not in the data plane
+    """
+    path = dataset_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        _touch(path)
+        return table.to_pandas(split_blocks=True)
+    except Exception:
+        return None
+
+
+@contextmanager
+def exclusive(key):
+    """Lock a dataset across server processes, so only one of them parses it
+
+    The other processes wait and then read it from the data plane.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(dataset_path(key) + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def remove(key):
+    """Remove a dataset from the data plane (e.g. after its file changed)"""
+    path = dataset_path(key)
+    for file_path in (path, path + '.lock'):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
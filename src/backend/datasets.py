@@ -0,0 +1,104 @@
+"""
+Geparste datasets per bestandsinhoud
+
+Proces-brede cache van ingelezen DataFrames, met de content hash van het
+bestand als sleutel. Een bestand dat niet veranderd is, wordt zo maar één keer
+geparst, ongeacht hoeveel sessies of pagina's het gebruiken. De DataFrames
+worden gedeeld: gebruikers van de cache moeten ze niet in-place aanpassen.
+
+Draaien er meerdere serverprocessen (serve.py, SHARED_DATA_PLANE), dan wordt
+een nieuw geparste dataset ook in de gedeelde data plane gezet (zie
+data_plane): de andere processen lezen hem daar via een memory map in plaats
+van opnieuw te parsen. Met één proces schrijft alleen het geheugenbudget (zie
+memory) naar de data plane: een dataset die lang niet gebruikt is wordt uit het
+geheugen gehaald en bij het volgende gebruik weer uit de data plane gelezen.
+De warm-up van serve.py zet alle datasets die hij heeft ingelezen in de data
+plane (spill_datasets), zodat ook een enkel app-proces ze niet opnieuw parst.
+"""
+import threading
+
+from backend import data_plane
+from backend.config import SHARED_DATA_PLANE
+from backend.memory import DROPPED, SPILLED, estimate_bytes, get_memory_governor
+
+_DATASETS = {}  # (file_hash, file_name extension) -> DataFrame
+_LOCK = threading.Lock()
+
+
+def dataset_key(file_hash, file_name):
+    """Build the cache key for a file (the parser depends on the extension)"""
+    return (file_hash, file_name.lower().rsplit('.', 1)[-1])
+
+
+def _release(key):
+    """Remove a dataset from memory (called by the governor); it stays readable from the data plane"""
+    with _LOCK:
+        df = _DATASETS.pop(key, None)
+    if df is None:
+        return None
+    return SPILLED if data_plane.write(key, df) else DROPPED
+
+
+def get_dataset(file_hash, file_name, loader):
+    """Return the parsed DataFrame of a file, parsing it with loader() on a miss
+
+    Args:
+        file_hash: Content hash of the file
+        file_name: File name
+        loader: Callable returning the parsed DataFrame (or None)
+
+    Returns:
+        pandas.DataFrame or None
+    """
+    key = dataset_key(file_hash, file_name)
+    governor = get_memory_governor()
+    with _LOCK:
+        df = _DATASETS.get(key)
+    if df is not None:
+        governor.touch(('dataset',) + key)
+        return df
+
+    df = data_plane.read(key)
+    if df is None and not SHARED_DATA_PLANE:
+        df = loader()
+    elif df is None:
+        with data_plane.exclusive(key):
+            # Intussen door een ander serverproces geparst?
+            df = data_plane.read(key)
+            if df is None:
+                df = loader()
+                if df is not None:
+                    data_plane.write(key, df)
+    if df is not None:
+        with _LOCK:
+            added = key not in _DATASETS
+            df = _DATASETS.setdefault(key, df)
+        if added:
+            governor.track(('dataset',) + key, 'dataset', file_name, estimate_bytes(df), lambda: _release(key))
+    return df
+
+
+def spill_datasets():
+    """Move all datasets from memory to the data plane (e.g. after the warm-up in serve.py)
+
+    Returns:
+        int: Number of datasets that are readable from the data plane
+    """
+    with _LOCK:
+        keys = list(_DATASETS)
+    governor = get_memory_governor()
+    spilled = 0
+    for key in keys:
+        governor.forget(('dataset',) + key)
+        if _release(key) is SPILLED:
+            spilled += 1
+    return spilled
+
+
+def drop_dataset(file_hash, file_name):
+    """Remove a dataset from the cache (e.g. after the file changed)"""
+    key = dataset_key(file_hash, file_name)
+    with _LOCK:
+        _DATASETS.pop(key, None)
+    data_plane.remove(key)
+    get_memory_governor().forget(('dataset',) + key)
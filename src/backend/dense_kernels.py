@@ -0,0 +1,222 @@
+"""
+Dense aggregatiekernels voor kleine sleuteldomeinen
+
+Weken (1-53), statussen (een stuk of zeven) en schooljaren (een stuk of tien)
+hebben maar een handvol waarden. In plaats van per grafiek een hash-groupby
+en pivot_table te draaien, krijgt elke sleutelkolom genummerde waarden
+(factorize, gesorteerd) en worden die samengevoegd tot één dichte index in
+een (jaar x week x status) array. Optellen is dan np.bincount, een
+cumulatieve reeks np.cumsum langs de weekas en pivoteren een reshape.
+
+De uitkomsten zijn gelijk aan die van de pandas groupby: gesorteerde groepen,
+rijen met een ontbrekende sleutel tellen niet mee. Past een aggregatie niet
+(te groot domein, geen numerieke waarden, sleutels die niet te sorteren
+zijn), dan geeft de kernel None en rekent de aanroeper met pandas.
+"""
+import numpy as np
+import pandas as pd
+
+# Maximaal aantal cellen van de dichte array (product van het aantal waarden per sleutel)
+MAX_CELLS = 1 << 22
+# Tot hier telt bincount (in float64) gehele getallen exact op
+EXACT_FLOAT_INTEGER = 2 ** 53
+
+
+class DenseKeys:
+    """Key columns of a DataFrame as one dense composite index
+
+    Attributes:
+        levels: Sorted unique values per key column (pandas.Index)
+        shape: Number of values per key column
+        size: Number of cells (product of shape)
+        valid: Bool mask of the rows without a missing key
+        all_valid: True if no row misses a key
+        index: Cell of each valid row (int64)
+    """
+
+    def __init__(self, names, levels, codes):
+        self.names = list(names)
+        self.levels = levels
+        self.shape = tuple(len(level) for level in levels)
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+        self.valid = codes[0] >= 0
+        index = codes[0]
+        for col_codes, length in zip(codes[1:], self.shape[1:]):
+            self.valid &= col_codes >= 0
+            index = index * length + col_codes
+        self.all_valid = bool(self.valid.all())
+        self.index = self.select(index)
+
+    def select(self, values):
+        """The values of the valid rows"""
+        return values if self.all_valid else values[self.valid]
+
+    def occupied(self):
+        """Number of valid rows per cell"""
+        return np.bincount(self.index, minlength=self.size)
+
+    def key_frame(self, cells):
+        """DataFrame with the key values of the given cells, one column per key"""
+        positions = np.unravel_index(cells, self.shape)
+        return pd.DataFrame({
+            name: level.take(position) for name, level, position in zip(self.names, self.levels, positions)
+        })
+
+
+def encode_keys(df, cols, max_cells=MAX_CELLS):
+    """Number the values of the key columns and combine them to a dense index
+
+    Returns:
+        DenseKeys, or None if no row has all keys, the domain is larger than max_cells
+        or a column can't be sorted
+    """
+    if df.empty:
+        return None
+    levels, codes = [], []
+    size = 1
+    for col in cols:
+        try:
+            col_codes, uniques = pd.factorize(df[col], sort=True)
+        except TypeError:
+            return None
+        size *= len(uniques)
+        if size == 0 or size > max_cells:
+            return None
+        levels.append(pd.Index(uniques))
+        codes.append(col_codes.astype(np.int64, copy=False))
+    return DenseKeys(cols, levels, codes)
+
+
+def _numeric_values(series, keys):
+    """Values of the rows with all keys as float64 (NaN counts as 0, like sum()), or None if they don't fit"""
+    if not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)):
+        return None
+    values = keys.select(series.to_numpy(dtype=np.float64, na_value=np.nan))
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        if len(values) and max(-values.min(), values.max()) * len(values) >= EXACT_FLOAT_INTEGER:
+            return None
+        if not series.hasnans:
+            return values
+    # Kopie: values kan een (alleen-lezen) view op de kolom zijn
+    return np.nan_to_num(values, nan=0.0)
+
+
+def _result_dtype(series):
+    """dtype of a pandas sum of the series"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return np.int64
+    return np.float64
+
+
+def sum_per_group(df, group_cols, value_col, value_name):
+    """Sum of value_col per group, equivalent to groupby().sum() (None if the kernel doesn't fit)"""
+    keys = encode_keys(df, group_cols)
+    if keys is None:
+        return None
+    values = _numeric_values(df[value_col], keys)
+    if values is None:
+        return None
+    sums = np.bincount(keys.index, weights=values, minlength=keys.size)
+    cells = np.flatnonzero(keys.occupied())
+    result = keys.key_frame(cells)
+    result[value_name] = sums[cells].astype(_result_dtype(df[value_col]))
+    return result
+
+
+def count_unique_per_group(df, group_cols, id_col, value_name):
+    """Number of unique id_col values per group, equivalent to groupby().nunique() (None if the kernel doesn't fit)"""
+    keys = encode_keys(df, group_cols)
+    if keys is None:
+        return None
+    ids, uniques = pd.factorize(df[id_col])
+    ids = keys.select(ids).astype(np.int64, copy=False)
+    num_ids = max(len(uniques), 1)
+    known = ids >= 0  # NaN telt niet mee
+    # Unieke (cel, id) paren: pd.unique (hash) is hier veel sneller dan np.unique (sorteren)
+    pairs = pd.unique(keys.index[known] * num_ids + ids[known])
+    counts = np.bincount(pairs // num_ids, minlength=keys.size)
+    # Groepen met alleen lege id's staan in de uitkomst met 0, net als bij nunique
+    cells = np.flatnonzero(keys.occupied())
+    result = keys.key_frame(cells)
+    result[value_name] = counts[cells].astype(np.int64)
+    return result
+
+
+def cumulative_per_group(df, partition_cols, order_col, value_col, value_name):
+    """Running total along order_col per partition, as np.cumsum along the order axis
+
+    Only for data with one row per partition and order value and no missing keys
+    (e.g. the result of a groupby); otherwise None.
+
+    Returns:
+        pandas.DataFrame with the columns of df + value_name, sorted by partition_cols and order_col
+    """
+    keys = encode_keys(df, list(partition_cols) + [order_col])
+    if keys is None or not keys.all_valid:
+        return None
+    values = _numeric_values(df[value_col], keys)
+    if values is None or keys.occupied().max(initial=0) > 1:
+        return None
+    totals = np.bincount(keys.index, weights=values, minlength=keys.size)
+    running = np.cumsum(totals.reshape(-1, keys.shape[-1]), axis=1).ravel()
+    order = np.argsort(keys.index, kind='stable')
+    result = df.iloc[order].reset_index(drop=True)
+    result[value_name] = running[keys.index[order]].astype(_result_dtype(df[value_col]))
+    return result
+
+
+def pivot_sum(df, index, columns, values):
+    """Sum of values as (index x columns) table by reshaping the dense array
+
+    Equivalent to pivot_table(aggfunc='sum', fill_value=0) for data without
+    missing keys or values; otherwise None.
+    """
+    keys = encode_keys(df, [index, columns])
+    if keys is None or not keys.all_valid or df[values].isna().any():
+        return None
+    weights = _numeric_values(df[values], keys)
+    if weights is None:
+        return None
+    table = np.bincount(keys.index, weights=weights, minlength=keys.size).reshape(keys.shape)
+    return pd.DataFrame(
+        table.astype(_result_dtype(df[values])),
+        index=keys.levels[0].rename(index),
+        columns=keys.levels[1].rename(columns),
+    )
+
+
+def cumulative_week_table(df, column_col, week_col, value_col, weeks):
+    """Running total per week (rows) for each value of column_col (columns)
+
+    The weekly sums go into a (column x week) array; np.cumsum along the week
+    axis also carries the total through weeks without data.
+
+    Args:
+        df: pandas.DataFrame
+        column_col: Column whose values become the columns (e.g. schooljaar)
+        week_col: Integer week column; every week must be in weeks
+        value_col: Column to sum
+        weeks: pandas.RangeIndex of the weeks to show
+
+    Returns:
+        pandas.DataFrame (float64) with index weeks, or None if the kernel doesn't fit
+    """
+    keys = encode_keys(df, [column_col])
+    if keys is None:
+        return None
+    week_values = keys.select(pd.to_numeric(df[week_col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan))
+    positions = week_values - weeks.start
+    if (np.isnan(positions).any() or (positions != np.round(positions)).any()
+            or (positions < 0).any() or (positions >= len(weeks)).any() or weeks.step != 1):
+        return None
+    values = _numeric_values(df[value_col], keys)
+    if values is None:
+        return None
+    cells = keys.index * len(weeks) + positions.astype(np.int64)
+    totals = np.bincount(cells, weights=values, minlength=keys.size * len(weeks)).reshape(keys.size, len(weeks))
+    present = keys.occupied() > 0
+    table = np.cumsum(totals[present], axis=1).T
+    # Zoals pivot_table: alleen gehele getallen blijven int64 als er geen (jaar, week) ontbreekt
+    if _result_dtype(df[value_col]) is np.int64 and np.bincount(cells, minlength=keys.size * len(weeks)).all():
+        table = table.astype(np.int64)
+    return pd.DataFrame(table, index=weeks, columns=keys.levels[0][present].rename(column_col))
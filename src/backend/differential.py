@@ -0,0 +1,769 @@
+"""
+Differentiële controle van de geoptimaliseerde aggregaties
+
+Genereert willekeurige datasets met de lastige gevallen uit de praktijk (lege
+id's, statussen in wisselende schrijfwijze, weken buiten 1-53, schooljaren
+als 2024, 2024.0 en '2023-2024', ontbrekende kolommen, meerdere bestanden per
+week) en een willekeurige filterstand, en vergelijkt elke geoptimaliseerde
+route met de referentie (zie reference):
+
+- tellingen (unieke aanmeldingen en studenten) moeten exact gelijk zijn;
+- sommen van kommagetallen mogen alleen op afronding verschillen, want een
+  andere optelvolgorde geeft andere laatste bits;
+- benaderende routes (HyperLogLog) moeten binnen de foutmarge blijven.
+
+Een nieuwe engine of kernel registreert zijn route met @check; het script
+src/differential_check.py draait alle routes.
+"""
+import io
+import math
+import shutil
+import tempfile
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from backend import aggregations, data_plane, dense_kernels, reference, reports
+from backend.csv_dialect import sniff_csv_dialect
+from backend.enrolled_index import EnrolledIndex, build_enrolled_sketch, sketch_weekly_unique
+from backend.hll import build_sketch, estimate_per_group, relative_error
+from backend.identifiers import concat_encoded, encode_identifiers
+from backend.loading import read_csv
+from backend.prognosis_store import (
+    PrognosisStore, apply_selection, snapshot_total, summarise_prediction, weekly_prediction_totals
+)
+from backend.union_dataset import UnionDataset
+from backend.weeks import get_best_week_for_oct1
+
+SUM_TOLERANCE = 1e-9  # relatief, voor sommen van kommagetallen
+HLL_PRECISION = 12
+HLL_SIGMAS = 5  # benaderd mag hooguit zoveel standaardfouten afwijken
+
+STATUSES = ['Offered', 'Received', 'Submitted', 'Created', 'Rejected', 'Withdrawn', 'Enrolled', 'ENROLLED', ' enrolled ']
+INSTELLINGEN = ['25LP', '25PG', '01OE', '30AB']
+LEERWEGEN = ['BOL', 'BBL']
+OPLEIDINGEN = [25180, 25181, 25190]
+PROGNOSE_JAAR = 2025
+
+CHECKS = {}
+
+
+def check(name):
+    """Register an optimised path: a function (case) -> list of differences, or None if it can't run here"""
+    def register(function):
+        CHECKS[name] = function
+        return function
+    return register
+
+
+# Gegenereerde data
+
+def _with_missing(rng, values, share):
+    """Object array of values with a share of them replaced by None"""
+    values = np.asarray(values, dtype=object)
+    values[rng.random(len(values)) < share] = None
+    return values
+
+
+def generate_applications(rng, rows):
+    """Random application_enriched_with_context data"""
+    students = max(rows // 4, 1)
+    weeks = rng.integers(1, 54, rows).astype(float)
+    weeks[rng.random(rows) < 0.03] = rng.choice([0, 54, 60], 1)[0]
+    weeks[rng.random(rows) < 0.03] = np.nan
+    if rng.random() < 0.5:
+        # Soms een schone integer kolom
+        weeks = np.nan_to_num(weeks, nan=1).astype(int)
+
+    jaar_style = rng.integers(0, 3)
+    if jaar_style == 0:
+        jaren = rng.choice([2023, 2024, 2025], rows)
+    elif jaar_style == 1:
+        jaren = rng.choice(['2023-2024', '2024-2025', '2022-2023'], rows)
+    else:
+        jaren = _with_missing(rng, rng.choice(['2024', '2023-2024', '2025.0', 'onbekend', '2024'], rows), 0.05)
+
+    return pd.DataFrame({
+        'caketenid': _with_missing(rng, [f"k{i}" for i in rng.integers(0, max(rows // 2, 1), rows)], 0.02),
+        'bsn_hash': _with_missing(rng, [f"b{i:032d}" for i in rng.integers(0, students, rows)], 0.02),
+        'status': rng.choice(STATUSES, rows),
+        'week_of_year': weeks,
+        'academic_week': rng.integers(1, 53, rows),
+        'schooljaar': rng.choice(['2023-2024', '2024-2025'], rows),
+        'schooljaar_afgeleid': jaren,
+        'instellingserkenningscode': _with_missing(rng, rng.choice(INSTELLINGEN, rows), 0.02),
+        'leertrajectmbo': rng.choice(LEERWEGEN, rows),
+        'opleidingcode': np.where(rng.random(rows) < 0.05, np.nan, rng.choice(OPLEIDINGEN, rows).astype(float)),
+    })
+
+
+def generate_prediction(rng, rows, with_ratio=True, with_mean=True):
+    """Random predictions_mbo workbook of one week"""
+    df = pd.DataFrame({
+        'instellingserkenningscode': _with_missing(rng, rng.choice(INSTELLINGEN, rows), 0.02),
+        'leertraject': rng.choice(LEERWEGEN, rows),
+        'opleidingscode': rng.choice(OPLEIDINGEN, rows),
+        'schooljaar': PROGNOSE_JAAR,
+        'Aantal_studenten': rng.integers(0, 3, rows),
+    })
+    if with_ratio:
+        ratio = rng.random(rows) * 3
+        ratio[rng.random(rows) < 0.05] = np.nan
+        df['Individual_ratio'] = ratio
+    if with_mean:
+        df['Individual_mean'] = rng.random(rows) * 3
+    return df
+
+
+def generate_history(rng, rows):
+    """Random inschrijvingen_summary data"""
+    return pd.DataFrame({
+        'schooljaar_berekend': rng.choice([2021, 2022, 2023, 2024], rows),
+        'instellingserkenningscode': rng.choice(INSTELLINGEN, rows),
+        'leertraject': rng.choice(LEERWEGEN, rows),
+        'opleidingscode': rng.choice(OPLEIDINGEN, rows),
+        'aantal': rng.integers(1, 30, rows),
+    })
+
+
+def generate_enrolments(rng, rows):
+    """Random data of Prognose inschrijvingen (aantal per jaar and week)"""
+    academic_weeks = rng.integers(0, 54, rows).astype(float)
+    academic_weeks[rng.random(rows) < 0.03] = np.nan
+    if rng.random() < 0.1:
+        academic_weeks[rng.random(rows) < 0.02] = 2.5
+    aantal = rng.integers(0, 20, rows)
+    df = pd.DataFrame({
+        'schooljaar': rng.choice(['2022-2023', '2023-2024', '2024-2025'] if rng.random() < 0.5 else [2022, 2023, 2024], rows),
+        'academic_week': academic_weeks,
+        'week_of_year': np.where(rng.random(rows) < 0.03, np.nan, (academic_weeks + 34) % 52 + 1),
+        'aantal': np.where(rng.random(rows) < 0.03, np.nan, aantal) if rng.random() < 0.3 else aantal,
+    })
+    if rng.random() < 0.2:
+        df = df.drop(columns='week_of_year')
+    return df
+
+
+def _pick(rng, options, include_unknown=True):
+    """Random selection like a user makes: nothing, a few options, sometimes a stale value"""
+    options = list(options)
+    if not options or rng.random() < 0.3:
+        return []
+    selected = [options[i] for i in rng.choice(len(options), rng.integers(1, min(len(options), 3) + 1), replace=False)]
+    if include_unknown and rng.random() < 0.1:
+        selected.append('XXXX')
+    return selected
+
+
+def _string_options(df, col):
+    """Filter options of Instroomprognose (get_filter_options)"""
+    return sorted(df[col].dropna().astype(str).unique().tolist())
+
+
+class Case:
+    """One random dataset plus filter state
+
+    Args:
+        rng: numpy.random.Generator
+        rows: Number of application rows (the other tables scale with it)
+    """
+
+    def __init__(self, rng, rows):
+        self.rng = rng
+        self.applications = generate_applications(rng, rows)
+        # Beschrijving aanmeldingen: filters op de waarden zelf
+        self.beschrijving_filters = {
+            col: _pick(rng, sorted(self.applications[col].dropna().unique().tolist()), include_unknown=False)
+            for col in ['instellingserkenningscode', 'leertrajectmbo', 'schooljaar']
+        }
+        self.week_col = '_academic_week' if rng.random() < 0.5 else '_week'
+
+        # Instroomprognose: filters op stringwaarde, per dimensie
+        self.target_jaar = int(rng.choice([2023, 2024, 2025]))
+        self.enrolled_filters = {
+            col: _pick(rng, _string_options(self.applications, col))
+            for col in ['instellingserkenningscode', 'leertrajectmbo', 'opleidingcode']
+        }
+
+        weeks = sorted(rng.choice(np.arange(30, 46), rng.integers(1, 5), replace=False).tolist())
+        with_ratio = rng.random() < 0.8
+        self.week_frames = []
+        for week in weeks:
+            for _ in range(1 if rng.random() < 0.85 else 2):
+                self.week_frames.append((week, generate_prediction(
+                    rng, max(rows // 4, 1), with_ratio=with_ratio or rng.random() < 0.5, with_mean=rng.random() < 0.8
+                )))
+        self.history = generate_history(rng, max(rows // 4, 1))
+        self.enrolments = generate_enrolments(rng, max(rows // 2, 1))
+        frames = [df for _, df in self.week_frames] + [self.history]
+        self.selection = {
+            'instelling': _pick(rng, sorted({v for df in frames for v in _string_options(df, 'instellingserkenningscode')})),
+            'schooljaar': _pick(rng, [str(PROGNOSE_JAAR)] + _string_options(self.history, 'schooljaar_berekend')),
+            'leerweg': _pick(rng, LEERWEGEN),
+            'opleiding': _pick(rng, [str(v) for v in OPLEIDINGEN]),
+        }
+
+    def beschrijving_chart_frame(self, df=None):
+        """Application rows after the filters, with the week columns of the page"""
+        df = reference.filter_on_values(self.applications if df is None else df, self.beschrijving_filters).copy()
+        df['_week'] = df['week_of_year']
+        df['_academic_week'] = df['academic_week']
+        return df
+
+    @property
+    def grouping_cols(self):
+        return ['schooljaar', self.week_col, 'status']
+
+    @property
+    def history_filters(self):
+        return {
+            'instellingserkenningscode': self.selection['instelling'],
+            'schooljaar_berekend': self.selection['schooljaar'],
+            'leertraject': self.selection['leerweg'],
+            'opleidingscode': self.selection['opleiding'],
+        }
+
+
+# Vergelijken
+
+def _key(value):
+    """Comparable form of a group key or value (2024, 2024.0 and numpy scalars compare equal)"""
+    if isinstance(value, tuple):
+        return tuple(_key(v) for v in value)
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NA:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def frame_to_dict(df, key_cols, value_col):
+    """Result DataFrame as dict (group key tuple) -> value"""
+    keys = zip(*(df[col].tolist() for col in key_cols))
+    return {_key(tuple(k)): _key(v) for k, v in zip(keys, df[value_col].tolist())}
+
+
+def compare(expected, actual, tolerance=None):
+    """Differences between two dicts of results
+
+    Args:
+        expected: Reference result
+        actual: Result of the optimised path
+        tolerance: None for exact equality, or callable (expected value) -> allowed difference
+
+    Returns:
+        list of str
+    """
+    expected = {_key(k): _key(v) for k, v in expected.items()}
+    actual = {_key(k): _key(v) for k, v in actual.items()}
+    differences = []
+    for key in sorted(set(expected) | set(actual), key=repr):
+        if key not in actual:
+            differences.append(f"{key!r}: ontbreekt (referentie {expected[key]!r})")
+        elif key not in expected:
+            differences.append(f"{key!r}: extra groep met {actual[key]!r}")
+        elif tolerance is None:
+            if expected[key] != actual[key]:
+                differences.append(f"{key!r}: {actual[key]!r} in plaats van {expected[key]!r}")
+        elif abs(actual[key] - expected[key]) > tolerance(expected[key]):
+            differences.append(f"{key!r}: {actual[key]!r} in plaats van {expected[key]!r}")
+    return differences
+
+
+def sum_tolerance(value):
+    return SUM_TOLERANCE * max(abs(value), 1)
+
+
+def hll_tolerance(value):
+    return HLL_SIGMAS * relative_error(HLL_PRECISION) * value + 2
+
+
+def _available(backend):
+    """True if the optional engine is installed"""
+    return aggregations.ENGINES[backend].is_available()
+
+
+# Beschrijving aanmeldingen: unieke caketenid per schooljaar/week/status
+
+def _reference_aanmeldingen(case, df=None):
+    chart = case.beschrijving_chart_frame(df)
+    return frame_to_dict(reference.count_aanmeldingen(chart, case.grouping_cols, 'caketenid'), case.grouping_cols, 'aantal_aanmeldingen')
+
+
+def _count_aanmeldingen(case, df=None, backend='pandas'):
+    chart = case.beschrijving_chart_frame(df)
+    result = aggregations.count_unique_per_group(chart, case.grouping_cols, 'caketenid', 'aantal_aanmeldingen', backend=backend)
+    return frame_to_dict(result, case.grouping_cols, 'aantal_aanmeldingen')
+
+
+@check('aanmeldingen per week/status: pandas')
+def check_aanmeldingen_pandas(case):
+    return compare(_reference_aanmeldingen(case), _count_aanmeldingen(case))
+
+
+@check('aanmeldingen per week/status: duckdb')
+def check_aanmeldingen_duckdb(case):
+    if not _available('duckdb'):
+        return None
+    return compare(_reference_aanmeldingen(case), _count_aanmeldingen(case, backend='duckdb'))
+
+
+@check('aanmeldingen per week/status: polars')
+def check_aanmeldingen_polars(case):
+    if not _available('polars'):
+        return None
+    return compare(_reference_aanmeldingen(case), _count_aanmeldingen(case, backend='polars'))
+
+
+@check('aanmeldingen per week/status: gecodeerde identifiers')
+def check_aanmeldingen_encoded(case):
+    encoded = encode_identifiers(case.applications.copy())
+    return compare(_reference_aanmeldingen(case), _count_aanmeldingen(case, encoded))
+
+
+@check('aanmeldingen per week/status: union van bestanden')
+def check_aanmeldingen_union(case):
+    # Bestanden zoals een gebruiker ze kiest: per schooljaar, met overlap in caketenid
+    files = [group for _, group in case.applications.groupby('schooljaar', sort=False)]
+    case.rng.shuffle(files)
+    union = UnionDataset(id_candidates=['caketenid'])
+    for i, df in enumerate(files):
+        union.add_dataframe(f"bestand_{i}.csv", encode_identifiers(df.reset_index(drop=True)))
+    expected = _reference_aanmeldingen(case, reference.union_files(files, 'caketenid'))
+    return compare(expected, _count_aanmeldingen(case, union.to_pandas()))
+
+
+@check('aanmeldingen per week/status: data plane')
+def check_aanmeldingen_data_plane(case):
+    encoded = encode_identifiers(case.applications.copy())
+    key = (uuid.uuid4().hex, 'csv')
+    try:
+        if not data_plane.write(key, encoded):
+            return None
+        shared = data_plane.read(key)
+    finally:
+        data_plane.remove(key)
+    return compare(_reference_aanmeldingen(case), _count_aanmeldingen(case, shared))
+
+
+@check('aanmeldingen per week/status: HyperLogLog (benaderd)')
+def check_aanmeldingen_hll(case):
+    chart = case.beschrijving_chart_frame(case.applications)
+    dims = ['schooljaar', 'instellingserkenningscode', 'leertrajectmbo', 'status', '_academic_week', '_week']
+    # De sketch wordt op alle rijen opgebouwd en daarna gefilterd, zoals op de pagina
+    source = case.applications.assign(_week=case.applications['week_of_year'], _academic_week=case.applications['academic_week'])
+    sketch = reference.filter_on_values(build_sketch(source, 'caketenid', dims, HLL_PRECISION), case.beschrijving_filters)
+    result = estimate_per_group(sketch, case.grouping_cols, 'aantal_aanmeldingen', HLL_PRECISION)
+    expected = frame_to_dict(reference.count_aanmeldingen(chart, case.grouping_cols, 'caketenid'), case.grouping_cols, 'aantal_aanmeldingen')
+    # Groepen zonder caketenid telt nunique als 0, de sketch kent ze niet
+    expected = {k: v for k, v in expected.items() if v}
+    return compare(expected, frame_to_dict(result, case.grouping_cols, 'aantal_aanmeldingen'), hll_tolerance)
+
+
+# Beschrijving aanmeldingen: cumulatief per schooljaar/status en de week x status tabel
+
+def _chart_data(case):
+    chart = case.beschrijving_chart_frame()
+    return reference.count_aanmeldingen(chart, case.grouping_cols, 'caketenid')
+
+
+def _dtype_differences(expected, actual):
+    """Differences in column names or dtypes between two result DataFrames"""
+    expected_dtypes = expected.dtypes.astype(str).to_dict()
+    actual_dtypes = actual.dtypes.astype(str).to_dict()
+    if expected_dtypes != actual_dtypes:
+        return [f"kolommen {actual_dtypes} in plaats van {expected_dtypes}"]
+    return []
+
+
+@check('aanmeldingen per week/status: dense kernel')
+def check_aanmeldingen_dense(case):
+    chart = case.beschrijving_chart_frame()
+    expected = reference.count_aanmeldingen(chart, case.grouping_cols, 'caketenid')
+    actual = dense_kernels.count_unique_per_group(chart, case.grouping_cols, 'caketenid', 'aantal_aanmeldingen')
+    if actual is None:
+        return None
+    return _dtype_differences(expected, actual) + compare(
+        frame_to_dict(expected, case.grouping_cols, 'aantal_aanmeldingen'),
+        frame_to_dict(actual, case.grouping_cols, 'aantal_aanmeldingen'),
+    )
+
+
+def _check_cumulative(case, cumulative_function):
+    chart_data = _chart_data(case)
+    expected = reference.cumulative_aanmeldingen(chart_data, 'schooljaar', 'status')
+    actual = cumulative_function(chart_data, ['schooljaar', 'status'], case.week_col, 'aantal_aanmeldingen', 'cumulatief')
+    if actual is None:
+        return None
+    differences = compare(
+        frame_to_dict(expected, case.grouping_cols, 'cumulatief'), frame_to_dict(actual, case.grouping_cols, 'cumulatief')
+    )
+    return _dtype_differences(expected, actual) + differences
+
+
+@check('cumulatief per schooljaar/status: pandas')
+def check_cumulative_pandas(case):
+    return _check_cumulative(case, partial(aggregations.cumulative_per_group, backend='pandas'))
+
+
+@check('cumulatief per schooljaar/status: polars')
+def check_cumulative_polars(case):
+    if not _available('polars'):
+        return None
+    return _check_cumulative(case, partial(aggregations.cumulative_per_group, backend='polars'))
+
+
+@check('cumulatief per schooljaar/status: dense kernel')
+def check_cumulative_dense(case):
+    return _check_cumulative(case, dense_kernels.cumulative_per_group)
+
+
+def _check_pivot(case, pivot_function):
+    data = reference.cumulative_aanmeldingen(_chart_data(case), 'schooljaar', 'status')
+    data['week_label'] = [f"Week {int(week)}" for week in data[case.week_col]]
+    differences = []
+    for schooljaar in data['schooljaar'].unique():
+        jaar_data = data[data['schooljaar'] == schooljaar]
+        expected = reference.pivot_cumulative(jaar_data, 'status')
+        actual = pivot_function(jaar_data, 'week_label', 'status', 'cumulatief')
+        if actual is None:
+            return None
+        for name, exp, act in [
+            ('weken', expected.index.tolist(), actual.index.tolist()),
+            ('statussen', expected.columns.tolist(), actual.columns.tolist()),
+            ('namen', [expected.index.name, expected.columns.name], [actual.index.name, actual.columns.name]),
+            ('dtypes', expected.dtypes.astype(str).tolist(), actual.dtypes.astype(str).tolist()),
+        ]:
+            if exp != act:
+                differences.append(f"{schooljaar}: {name} {act!r} in plaats van {exp!r}")
+        if not differences:
+            differences += [
+                f"{schooljaar}: {d}" for d in compare(expected.stack().to_dict(), actual.stack().to_dict())
+            ]
+    return differences
+
+
+@check('week x status tabel: pandas')
+def check_pivot_pandas(case):
+    return _check_pivot(case, partial(aggregations.pivot_sum, backend='pandas'))
+
+
+@check('week x status tabel: polars')
+def check_pivot_polars(case):
+    if not _available('polars'):
+        return None
+    return _check_pivot(case, partial(aggregations.pivot_sum, backend='polars'))
+
+
+@check('week x status tabel: dense kernel')
+def check_pivot_dense(case):
+    return _check_pivot(case, dense_kernels.pivot_sum)
+
+
+@check('rapport per instelling: cumulatieve statusgrafiek')
+def check_report_applications(case):
+    applications = case.applications[['caketenid', 'status', 'schooljaar', 'week_of_year']].set_axis(
+        ['caketenid', 'status', 'schooljaar', 'week'], axis=1
+    )
+    actual = reports._applications_chart_data(applications)
+    chart = applications[applications['week'].notna() & applications['caketenid'].notna()].rename(columns={'week': '_week'})
+    expected = reference.cumulative_aanmeldingen(
+        reference.count_aanmeldingen(chart, ['schooljaar', '_week', 'status'], 'caketenid'), 'schooljaar', 'status'
+    )
+    keys = ['schooljaar', 'status']
+    differences = compare(
+        frame_to_dict(expected, keys + ['_week'], 'cumulatief'), frame_to_dict(actual, keys + ['week'], 'cumulatief')
+    )
+    for schooljaar, jaar_data in actual.groupby('schooljaar'):
+        pivot = reports.pivot_sum(jaar_data, 'week', 'status', 'cumulatief')
+        expected_pivot = jaar_data.pivot_table(index='week', columns='status', values='cumulatief', aggfunc='sum', fill_value=0)
+        differences += [f"{schooljaar}: {d}" for d in compare(expected_pivot.stack().to_dict(), pivot.stack().to_dict())]
+    return differences
+
+
+# Prognose inschrijvingen: cumulatief per jaar over week 1-52
+
+def _check_cumulative_per_year(case, table_function):
+    df = case.enrolments
+    week_col = 'week_of_year' if 'week_of_year' in df.columns else None
+    expected = reference.cumulative_per_year(df, 'schooljaar', 'academic_week', week_col, 'aantal')
+    rows = df[(df['academic_week'] >= 1) & (df['academic_week'] <= 52)]
+    if week_col:
+        rows = rows[rows[week_col].notna()]
+    actual = table_function(rows, 'schooljaar', 'academic_week', 'aantal', pd.RangeIndex(start=1, stop=53, step=1))
+    if expected is None or actual is None:
+        return None if actual is None else [f"tabel met {len(actual.columns)} jaren in plaats van geen"]
+    differences = []
+    for name, exp, act in [
+        ('jaren', expected.columns.tolist(), actual.columns.tolist()),
+        ('weken', expected.index.tolist(), actual.index.tolist()),
+        ('dtypes', expected.dtypes.astype(str).tolist(), actual.dtypes.astype(str).tolist()),
+    ]:
+        if exp != act:
+            differences.append(f"{name} {act!r} in plaats van {exp!r}")
+    return differences or compare(expected.stack().to_dict(), actual.stack().to_dict(), sum_tolerance)
+
+
+@check('cumulatief per jaar (prognose inschrijvingen): pandas')
+def check_cumulative_per_year_pandas(case):
+    return _check_cumulative_per_year(case, aggregations.cumulative_week_table)
+
+
+@check('cumulatief per jaar (prognose inschrijvingen): dense kernel')
+def check_cumulative_per_year_dense(case):
+    return _check_cumulative_per_year(case, dense_kernels.cumulative_week_table)
+
+
+# Instroomprognose: unieke ingeschreven studenten per week
+
+ENROLLED_COLUMNS = ('bsn_hash', 'week_of_year', 'schooljaar_afgeleid', 'status')
+ENROLLED_DIMS = ('instellingserkenningscode', 'leertrajectmbo', 'opleidingcode')
+
+
+def _reference_ingeschreven(case):
+    return reference.weekly_ingeschreven(case.applications, case.target_jaar, *ENROLLED_COLUMNS, case.enrolled_filters)
+
+
+@check('ingeschreven per week: index')
+def check_ingeschreven_index(case):
+    index = EnrolledIndex(case.applications, *ENROLLED_COLUMNS, ENROLLED_DIMS)
+    return compare(_reference_ingeschreven(case), index.weekly_unique(case.target_jaar, case.enrolled_filters))
+
+
+@check('ingeschreven per week: index op gecodeerde identifiers')
+def check_ingeschreven_index_encoded(case):
+    # Per bestand gecodeerd (elk een eigen dictionary) en samengevoegd, zoals op de pagina
+    files = [encode_identifiers(group.copy()) for _, group in case.applications.groupby('schooljaar', sort=False)]
+    encoded = concat_encoded(files)
+    index = EnrolledIndex(encoded, *ENROLLED_COLUMNS, ENROLLED_DIMS)
+    return compare(_reference_ingeschreven(case), index.weekly_unique(case.target_jaar, case.enrolled_filters))
+
+
+@check('ingeschreven per week: HyperLogLog (benaderd)')
+def check_ingeschreven_hll(case):
+    sketch = build_enrolled_sketch(case.applications, *ENROLLED_COLUMNS, ENROLLED_DIMS, HLL_PRECISION)
+    actual = sketch_weekly_unique(sketch, case.target_jaar, 'schooljaar_afgeleid', HLL_PRECISION, case.enrolled_filters)
+    expected = {k: v for k, v in _reference_ingeschreven(case).items() if v}
+    return compare(expected, actual, hll_tolerance)
+
+
+# Instroomprognose: Individual_ratio per week, prognose op 1 oktober en historie
+
+def _store_facts(case, root, frames):
+    """Put workbooks in a fresh prognosis store, like the page does, and load the selected facts"""
+    store = PrognosisStore(root)
+    keys = []
+    for i, (week, df) in enumerate(frames):
+        file_hash = f"{week}-{i}"
+        store.append(PROGNOSE_JAAR, week, file_hash, f"predictions_mbo_{PROGNOSE_JAAR}_week{week}.xlsx", summarise_prediction(df))
+        keys.append((PROGNOSE_JAAR, week, file_hash))
+    return apply_selection(store.load(keys), case.selection)
+
+
+def _with_store(case, frames, function):
+    root = tempfile.mkdtemp(prefix='differential_store_')
+    try:
+        return function(_store_facts(case, root, frames))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+@check('prognose per week: prognose store')
+def check_prognose_weekly_store(case):
+    expected_ratio, expected_mean = reference.weekly_prediction_totals(case.week_frames, case.selection)
+    actual_ratio, actual_mean = _with_store(case, case.week_frames, weekly_prediction_totals)
+    return (
+        [f"ratio {d}" for d in compare(expected_ratio, actual_ratio, sum_tolerance)]
+        + [f"mean {d}" for d in compare(expected_mean, actual_mean, sum_tolerance)]
+    )
+
+
+def _oct1_frame(case):
+    """First workbook of the week of 1 October (or the nearest week before it)"""
+    best_week = get_best_week_for_oct1(sorted({week for week, _ in case.week_frames}), PROGNOSE_JAAR)
+    return next((week, df) for week, df in case.week_frames if week == best_week)
+
+
+@check('prognose 1 oktober: prognose store')
+def check_prognose_oct1_store(case):
+    week, df = _oct1_frame(case)
+    _, expected = reference.prediction_total(df, case.selection)
+    _, actual = _with_store(case, [(week, df)], snapshot_total)
+    return compare({'totaal': expected}, {'totaal': actual}, sum_tolerance)
+
+
+def _check_prognose_oct1_sum_column(case, backend):
+    _, df = _oct1_frame(case)
+    r_col, expected = reference.prediction_total(df, case.selection)
+    if r_col is None:
+        return []
+    filtered = reference.filter_on_string_values(df, reference._prediction_filters(df, case.selection))
+    return compare({'totaal': expected}, {'totaal': aggregations.sum_column(filtered, r_col, backend=backend)}, sum_tolerance)
+
+
+@check('prognose 1 oktober: sum_column pandas')
+def check_prognose_oct1_pandas(case):
+    return _check_prognose_oct1_sum_column(case, 'pandas')
+
+
+@check('prognose 1 oktober: sum_column duckdb')
+def check_prognose_oct1_duckdb(case):
+    if not _available('duckdb'):
+        return None
+    return _check_prognose_oct1_sum_column(case, 'duckdb')
+
+
+@check('prognose 1 oktober: sum_column polars')
+def check_prognose_oct1_polars(case):
+    if not _available('polars'):
+        return None
+    return _check_prognose_oct1_sum_column(case, 'polars')
+
+
+def _check_history(case, backend):
+    expected = reference.history_per_schooljaar(case.history, case.history_filters, 'schooljaar_berekend', 'aantal')
+    filtered = reference.filter_on_string_values(case.history, case.history_filters)
+    actual = {}
+    if not filtered.empty:
+        result = aggregations.sum_per_group(filtered, ['schooljaar_berekend'], 'aantal', backend=backend)
+        actual = dict(zip(result['schooljaar_berekend'], result['aantal']))
+    return compare(expected, actual)
+
+
+@check('historie per schooljaar: pandas')
+def check_history_pandas(case):
+    return _check_history(case, 'pandas')
+
+
+@check('historie per schooljaar: duckdb')
+def check_history_duckdb(case):
+    if not _available('duckdb'):
+        return None
+    return _check_history(case, 'duckdb')
+
+
+@check('duckdb: gedeelde connectie per thread')
+def check_duckdb_threads(case):
+    # Meerdere sessies (threads) met elk een eigen filterstand, elk meerdere aggregaties op één connectie
+    if not _available('duckdb'):
+        return None
+    frames = [case.history] + [
+        reference.filter_on_string_values(case.history, {'leertraject': [leerweg]}) for leerweg in LEERWEGEN
+    ]
+
+    def aggregate(df):
+        return [
+            aggregations.sum_per_group(df, ['schooljaar_berekend'], 'aantal', backend='duckdb'),
+            aggregations.sum_column(df, 'aantal', backend='duckdb'),
+        ]
+
+    with ThreadPoolExecutor(max_workers=len(frames)) as pool:
+        results = list(pool.map(aggregate, frames * 2))
+    differences = []
+    for df, (per_year, total) in zip(frames * 2, results):
+        expected = df.groupby('schooljaar_berekend')['aantal'].sum()
+        differences += compare(expected.to_dict(), dict(zip(per_year['schooljaar_berekend'], per_year['aantal'])))
+        differences += compare({'totaal': df['aantal'].sum()}, {'totaal': total})
+    return differences
+
+
+@check('historie per schooljaar: polars')
+def check_history_polars(case):
+    if not _available('polars'):
+        return None
+    return _check_history(case, 'polars')
+
+
+@check('historie per schooljaar: dense kernel')
+def check_history_dense(case):
+    filtered = reference.filter_on_string_values(case.history, case.history_filters)
+    expected = filtered.groupby(['schooljaar_berekend', 'leertraject'])['aantal'].sum().reset_index()
+    actual = dense_kernels.sum_per_group(filtered, ['schooljaar_berekend', 'leertraject'], 'aantal', 'aantal')
+    if actual is None:
+        return None
+    keys = ['schooljaar_berekend', 'leertraject']
+    return _dtype_differences(expected, actual) + compare(frame_to_dict(expected, keys, 'aantal'), frame_to_dict(actual, keys, 'aantal'))
+
+
+# Inlezen: CSV dialect van exports met een titel, een scheidingsteken aan het eind of een decimale komma
+
+def _write_csv(df, separator, decimal, trailing):
+    """CSV text of df; trailing: None, 'header' (separator after the header) or 'rows' (after every data row)"""
+    text = df.to_csv(sep=separator, decimal=decimal, index=False, lineterminator='\n')
+    header, *rows = text.rstrip('\n').split('\n')
+    if trailing == 'header':
+        header += separator
+    elif trailing == 'rows':
+        rows = [row + separator for row in rows]
+    return '\n'.join([header] + rows) + '\n'
+
+
+@check('csv dialect: kopregel, scheidingsteken en decimale komma')
+def check_csv_dialect(case):
+    df = case.applications[['caketenid', 'status', 'week_of_year', 'instellingserkenningscode']].copy()
+    df['ratio'] = case.rng.random(len(df)).round(3)
+    rng = case.rng
+    separator = str(rng.choice([';', ',', '\t', '|']))
+    decimal = ',' if separator != ',' and rng.random() < 0.5 else '.'
+    trailing = rng.choice([None, 'header', 'rows'])
+    preamble = ''.join(rng.choice(['Rapport aanmeldingen\n', 'Peildatum: 1 oktober\n', '\n'], rng.integers(0, 3)))
+    text = preamble + _write_csv(df, separator, decimal, trailing)
+
+    expected = pd.read_csv(io.StringIO(df.to_csv(index=False)))
+    actual = read_csv(io.BytesIO(text.encode('utf-8')), sniff_csv_dialect(text.encode('utf-8')[:64 * 1024], len(text) > 64 * 1024))
+    if actual is None:
+        return ["geen rijen ingelezen"]
+    # Een scheidingsteken aan het eind geeft een lege extra kolom
+    actual = actual.loc[:, [col for col in actual.columns if not str(col).startswith('Unnamed:')]]
+    if list(actual.columns) != list(expected.columns):
+        return [f"kolommen {list(actual.columns)} in plaats van {list(expected.columns)}"]
+    differences = []
+    for col in expected.columns:
+        if not expected[col].equals(actual[col]) and not (
+            expected[col].isna().equals(actual[col].isna())
+            and (expected[col].dropna().astype(str) == actual[col].dropna().astype(str)).all()
+        ):
+            differences.append(f"kolom {col!r} wijkt af ({separator!r}, decimaal {decimal!r}, {trailing})")
+    return differences
+
+
+def run(iterations, seed=0, rows=2000, names=None, first_iteration=0):
+    """Run the registered checks on random cases
+
+    Args:
+        iterations: Number of random cases
+        seed: Seed; case i is generated from (seed, i), so a failure can be replayed
+        rows: Number of application rows per case
+        names: Only run the checks whose name contains one of these strings
+        first_iteration: Number of the first case
+
+    Returns:
+        dict check name -> dict (runs, skipped, failures: list of (iteration, differences))
+    """
+    selected = {
+        name: function for name, function in CHECKS.items()
+        if not names or any(part.lower() in name.lower() for part in names)
+    }
+    results = {name: {'runs': 0, 'skipped': 0, 'failures': []} for name in selected}
+    for iteration in range(first_iteration, first_iteration + iterations):
+        # Elke case met een eigen, herhaalbare generator; de grootte varieert mee
+        rng = np.random.default_rng([seed, iteration])
+        case = Case(rng, int(rng.integers(1, rows + 1)))
+        for name, function in selected.items():
+            try:
+                differences = function(case)
+            except Exception:
+                differences = [traceback.format_exc(limit=-3).strip()]
+            if differences is None:
+                results[name]['skipped'] += 1
+                continue
+            results[name]['runs'] += 1
+            if differences:
+                results[name]['failures'].append((iteration, differences))
+    return results
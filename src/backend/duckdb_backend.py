@@ -0,0 +1,89 @@
+"""
+DuckDB query backend
+
+Voert de pagina-aggregaties uit als SQL in een embedded DuckDB database.
+Elke thread (Streamlit sessie) houdt één connectie open, zodat er niet per
+aggregatie een database wordt opgezet. De query leest het ingelezen DataFrame
+(de kolomvorm van de upload) direct via een replacement scan: DuckDB scant
+de numpy/Arrow buffers zonder kopie en zonder een registratie die het frame
+na de query in leven houdt. DuckDB voert de aggregatie multi-threaded en
+vectorised uit.
+
+DuckDB is een optionele dependency: installeer met `uv sync --extra duckdb`.
+"""
+import threading
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+_LOCAL = threading.local()
+
+
+def is_available():
+    """Return True if the duckdb package can be used"""
+    return duckdb is not None
+
+
+def quote_identifier(name):
+    """Quote a column or table name for use in SQL"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def connect():
+    """Return the DuckDB connection of the current thread, opening it on first use
+
+    A connection per thread keeps concurrent Streamlit sessions (threads) from
+    sharing a connection object, without paying for a new database per query.
+    """
+    if duckdb is None:
+        raise ImportError("duckdb is niet geïnstalleerd")
+    con = getattr(_LOCAL, 'con', None)
+    if con is None:
+        con = _LOCAL.con = duckdb.connect(database=':memory:')
+    return con
+
+
+def _restore_dtypes(result, df, columns):
+    """Cast group columns back to the dtypes of the source DataFrame"""
+    for col in columns:
+        try:
+            result[col] = result[col].astype(df[col].dtype)
+        except (ValueError, TypeError):
+            pass
+    return result
+
+
+def count_unique_per_group(df, group_cols, id_col, value_name):
+    """COUNT(DISTINCT id_col) per group, equivalent to groupby().nunique()"""
+    source = df  # DuckDB leest het frame via deze naam in de query
+    groups = ', '.join(quote_identifier(c) for c in group_cols)
+    not_null = ' AND '.join(f"{quote_identifier(c)} IS NOT NULL" for c in group_cols)
+    query = (
+        f"SELECT {groups}, COUNT(DISTINCT {quote_identifier(id_col)}) AS {quote_identifier(value_name)} "
+        f"FROM source WHERE {not_null} GROUP BY {groups} ORDER BY {groups}"
+    )
+    result = connect().execute(query).df()
+    result[value_name] = result[value_name].astype('int64')
+    return _restore_dtypes(result, df, group_cols)
+
+
+def sum_per_group(df, group_cols, value_col, value_name):
+    """SUM(value_col) per group, equivalent to groupby().sum()"""
+    source = df  # DuckDB leest het frame via deze naam in de query
+    groups = ', '.join(quote_identifier(c) for c in group_cols)
+    not_null = ' AND '.join(f"{quote_identifier(c)} IS NOT NULL" for c in group_cols)
+    query = (
+        f"SELECT {groups}, COALESCE(SUM({quote_identifier(value_col)}), 0) AS {quote_identifier(value_name)} "
+        f"FROM source WHERE {not_null} GROUP BY {groups} ORDER BY {groups}"
+    )
+    result = connect().execute(query).df()
+    return _restore_dtypes(result, df, group_cols)
+
+
+def sum_column(df, value_col):
+    """SUM(value_col) over the whole DataFrame, equivalent to Series.sum()"""
+    source = df  # DuckDB leest het frame via deze naam in de query
+    query = f"SELECT COALESCE(SUM({quote_identifier(value_col)}), 0) FROM source"
+    return connect().execute(query).fetchone()[0]
@@ -0,0 +1,151 @@
+"""
+Index van ingeschreven studenten per jaar en week
+
+Voor "unieke ingeschreven studenten per week" werd bij elke aanroep het hele
+application-bestand gekopieerd, de status genormaliseerd, het jaar per rij
+vergeleken en de week omgezet. Deze index doet dat één keer: alleen rijen met
+status ENROLLED, bsn_hash als integer id, week en schooljaar als integer, en
+gesorteerd op (jaar, week). Een vraag voor jaar Y met filters F is dan een
+slice plus een telling van gesorteerde unieke (week, id) paren.
+
+Voor de benaderende telling (DISTINCT_COUNT_MODE = 'approximate') staat
+hieronder dezelfde vraag op een HyperLogLog sketch van de ENROLLED rijen.
+"""
+import numpy as np
+import pandas as pd
+
+from backend.hll import build_sketch, estimate_per_group
+
+
+def matching_years(value):
+    """Return the target years a schooljaar value matches
+
+    2024 -> (2024,), '2023-2024' -> (2023, 2024); the same rules as the
+    per-row comparison on the Instroomprognose page.
+    """
+    if pd.isna(value):
+        return ()
+    s = str(value).strip()
+    if '-' in s:
+        try:
+            return tuple(dict.fromkeys((int(s.split('-')[0]), int(s.split('-')[-1]))))
+        except (ValueError, IndexError):
+            pass
+    try:
+        return (int(float(value)),)
+    except (ValueError, TypeError):
+        return ()
+
+
+class EnrolledIndex:
+    """ENROLLED rows as sorted integer arrays, one row per (matching year, application row)
+
+    Args:
+        df: Application DataFrame
+        bsn_col: Student id column (bsn_hash)
+        week_col: Week column
+        jaar_col: Schooljaar column
+        status_col: Status column
+        dim_cols: Filter columns (compared on their string value)
+    """
+
+    def __init__(self, df, bsn_col, week_col, jaar_col, status_col, dim_cols=()):
+        df = df.loc[df[status_col].astype(str).str.upper().str.strip() == 'ENROLLED']
+        weeks = pd.to_numeric(df[week_col], errors='coerce')
+        df = df.loc[weeks.notna() & (weeks >= 1) & (weeks <= 53)]
+        weeks = weeks.loc[df.index].astype(int).to_numpy()
+
+        # Jaar: per unieke waarde bepalen bij welke jaren de rij hoort (2023-2024 -> beide)
+        jaar_codes, jaar_values = pd.factorize(df[jaar_col])
+        rows, years = [], []
+        for code, value in enumerate(jaar_values):
+            value_rows = np.flatnonzero(jaar_codes == code)
+            for year in matching_years(value):
+                rows.append(value_rows)
+                years.append(np.full(len(value_rows), year))
+        rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+        years = np.concatenate(years) if years else np.array([], dtype=np.int64)
+
+        student_ids, students = pd.factorize(df[bsn_col])  # NaN -> -1, telt niet mee
+        self.num_students = max(len(students), 1)
+
+        order = np.lexsort((weeks[rows], years))
+        rows = rows[order]
+        self.years = years[order].astype(np.int32)
+        self.weeks = weeks[rows].astype(np.int16)
+        self.student_ids = student_ids[rows].astype(np.int64)
+        self.dims = {
+            col: pd.Categorical(df[col].astype(str).to_numpy()[rows])
+            for col in dim_cols
+        }
+
+    def weekly_unique(self, target_jaar, selections=None):
+        """Count unique students per week for a year under the selected filters
+
+        Args:
+            target_jaar: Year (matches 2024 and '2023-2024' / '2024-2025')
+            selections: Dict filter column -> selected values (empty = no filter)
+
+        Returns:
+            dict week -> number of unique students
+        """
+        lo, hi = np.searchsorted(self.years, [target_jaar, target_jaar + 1])
+        weeks = self.weeks[lo:hi]
+        student_ids = self.student_ids[lo:hi]
+        mask = np.ones(hi - lo, dtype=bool)
+        for col, selected in (selections or {}).items():
+            if selected and col in self.dims:
+                categorical = self.dims[col]
+                selected_codes = np.flatnonzero(categorical.categories.isin(selected))
+                mask &= np.isin(categorical.codes[lo:hi], selected_codes)
+        weeks = weeks[mask]
+        student_ids = student_ids[mask]
+        if len(weeks) == 0:
+            return {}
+
+        result = dict.fromkeys(np.unique(weeks).tolist(), 0)
+        known = student_ids >= 0
+        pairs = np.unique(weeks[known].astype(np.int64) * self.num_students + student_ids[known])
+        counted_weeks, counts = np.unique(pairs // self.num_students, return_counts=True)
+        result.update(zip(counted_weeks.tolist(), counts.tolist()))
+        return result
+
+
+def build_enrolled_sketch(df_app, bsn_col, week_col, jaar_col, status_col, dim_cols, precision):
+    """HyperLogLog sketch of bsn_hash (ENROLLED rows only) per schooljaar, filter dimension and week
+
+    Returns:
+        Sketch DataFrame (see hll.build_sketch) with jaar_col, dim_cols and '_week'
+    """
+    df = df_app[df_app[status_col].astype(str).str.upper().str.strip() == 'ENROLLED'].copy()
+    df['_week'] = pd.to_numeric(df[week_col], errors='coerce')
+    df = df[df['_week'].notna() & (df['_week'] >= 1) & (df['_week'] <= 53)]
+    df['_week'] = df['_week'].astype(int)
+    # Filters vergelijken op stringwaarde
+    for col in dim_cols:
+        df[col] = df[col].astype(str)
+    return build_sketch(df, bsn_col, [jaar_col, *dim_cols, '_week'], precision)
+
+
+def sketch_weekly_unique(sketch, target_jaar, jaar_col, precision, selections=None):
+    """Estimate unique students per week for a year from an enrolled sketch
+
+    Args:
+        sketch: Sketch from build_enrolled_sketch
+        target_jaar: Year (matches 2024 and '2023-2024' / '2024-2025')
+        jaar_col: Schooljaar column of the sketch
+        precision: Precision the sketch was built with
+        selections: Dict filter column -> selected values (empty = no filter)
+
+    Returns:
+        dict week -> estimated number of unique students
+    """
+    jaar_matches = {v: target_jaar in matching_years(v) for v in sketch[jaar_col].unique()}
+    sketch = sketch[sketch[jaar_col].map(jaar_matches).fillna(False).astype(bool)]
+    for col, selected in (selections or {}).items():
+        if selected and col in sketch.columns:
+            sketch = sketch[sketch[col].isin(selected)]
+    if sketch.empty:
+        return {}
+    estimate = estimate_per_group(sketch, ['_week'], 'aantal', precision)
+    return dict(zip(estimate['_week'].astype(int), estimate['aantal']))
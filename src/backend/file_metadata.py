@@ -0,0 +1,51 @@
+"""
+Metadata per bestandsinhoud
+
+Proces-brede opslag van afgeleide gegevens van een bestand (zoals het
+CSV-dialect), met de content hash als sleutel. Zo wordt zo'n gegeven één keer
+per bestand bepaald en daarna door alle lezers hergebruikt.
+"""
+import threading
+
+_METADATA = {}  # file_hash -> dict
+_LOCK = threading.Lock()
+
+
+def get_file_metadata(file_hash, key, compute):
+    """Return a metadata value of a file, computing it with compute() on a miss
+
+    Args:
+        file_hash: Content hash of the file
+        key: Name of the metadata value (e.g. 'csv_dialect')
+        compute: Callable returning the value
+
+    Returns:
+        The (cached) value; None results are not cached
+    """
+    with _LOCK:
+        entry = _METADATA.get(file_hash)
+        if entry is not None and key in entry:
+            return entry[key]
+    value = compute()
+    if value is None:
+        return None  # mislukt (bijv. onleesbaar bestand): niet bewaren, later opnieuw proberen
+    with _LOCK:
+        return _METADATA.setdefault(file_hash, {}).setdefault(key, value)
+
+
+def set_file_metadata(file_hash, key, value):
+    """Store a metadata value of a file that was determined elsewhere (e.g. read from a bundle)"""
+    with _LOCK:
+        _METADATA.setdefault(file_hash, {})[key] = value
+
+
+def get_all_file_metadata(file_hash):
+    """Return a copy of all known metadata values of a file"""
+    with _LOCK:
+        return dict(_METADATA.get(file_hash, {}))
+
+
+def drop_file_metadata(file_hash):
+    """Remove all metadata of a file (e.g. after the file changed)"""
+    with _LOCK:
+        _METADATA.pop(file_hash, None)
@@ -0,0 +1,139 @@
+"""
+HyperLogLog sketches voor benaderende distinct counts
+
+Voor grote (sectorbrede) bestanden is `nunique()` op caketenid of bsn_hash de
+duurste stap van de aggregatie. Een sketch wordt één keer per dataset
+opgebouwd op het niveau van alle filterdimensies (schooljaar, week, status,
+instelling, ...). Elke filtercombinatie wordt daarna beantwoord door de
+sketches van de geselecteerde groepen samen te voegen (maximum per register),
+zonder de ruwe rijen opnieuw te bekijken.
+
+De sketch wordt sparse opgeslagen als DataFrame met per groep alleen de
+registers die een waarde hebben (kolommen `_register` en `_rho`).
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_PRECISION = 12  # 2^12 = 4096 registers, standaardfout ~1.6%
+
+REGISTER_COL = '_register'
+RHO_COL = '_rho'
+
+
+def relative_error(precision=DEFAULT_PRECISION):
+    """Return the relative standard error of an HLL estimate (1.04 / sqrt(m))"""
+    return 1.04 / np.sqrt(2 ** precision)
+
+
+def _bit_length(values):
+    """Exact bit length of an uint64 array (vectorised)"""
+    values = values.copy()
+    length = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= (np.uint64(1) << np.uint64(shift))
+        length[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+def hash_values(series):
+    """Hash a Series of identifiers to uint64 (NaN values must be removed first)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Gecodeerde identifiers (zie identifiers): elke unieke waarde één keer hashen
+        return hash_values(pd.Series(series.cat.categories))[series.cat.codes.to_numpy()]
+    return pd.util.hash_pandas_object(series.astype(str), index=False).to_numpy(dtype=np.uint64)
+
+
+def _registers(hashes, precision):
+    """Split hashes into register index and rho (position of the first 1-bit)"""
+    value_bits = 64 - precision
+    registers = (hashes >> np.uint64(value_bits)).astype(np.int32)
+    remainder = hashes & np.uint64((1 << value_bits) - 1)
+    rho = (value_bits - _bit_length(remainder) + 1).astype(np.uint8)
+    return registers, rho
+
+
+def _estimate(inverse_sum, zeros, m):
+    """HLL estimate from the sum of 2^-rho over the filled registers and the number of empty registers"""
+    inverse_sum = inverse_sum + zeros  # registers zonder waarde tellen mee als 2^0
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / inverse_sum
+    # Small-range correctie (linear counting)
+    small = (estimate <= 2.5 * m) & (zeros > 0)
+    estimate[small] = m * np.log(m / zeros[small])
+    return np.rint(estimate).astype('int64')
+
+
+def estimate_distinct(series, precision=DEFAULT_PRECISION):
+    """Estimate the number of distinct non-null values of a Series (dense registers)"""
+    m = 2 ** precision
+    registers, rho = _registers(hash_values(series.dropna()), precision)
+    dense = np.zeros(m, dtype=np.uint8)
+    np.maximum.at(dense, registers, rho)
+    filled = dense[dense > 0]
+    inverse_sum = np.array([np.exp2(-filled.astype(np.float64)).sum()])
+    zeros = np.array([m - len(filled)])
+    return int(_estimate(inverse_sum, zeros, m)[0])
+
+
+def build_sketch(df, id_col, dim_cols, precision=DEFAULT_PRECISION):
+    """Build a sparse HLL sketch of id_col per combination of dim_cols
+
+    Args:
+        df: pandas.DataFrame
+        id_col: Column with identifiers (e.g. caketenid, bsn_hash)
+        dim_cols: Columns that define a sketch group (filter dimensions)
+        precision: Number of index bits (registers = 2^precision)
+
+    Returns:
+        pandas.DataFrame with dim_cols + ['_register', '_rho']
+    """
+    dim_cols = list(dim_cols)
+    data = df.loc[df[id_col].notna(), dim_cols + [id_col]]
+    registers, rho = _registers(hash_values(data[id_col]), precision)
+
+    sketch = data[dim_cols].copy()
+    sketch[REGISTER_COL] = registers
+    sketch[RHO_COL] = rho
+    return (
+        sketch.groupby(dim_cols + [REGISTER_COL], dropna=False, observed=True)[RHO_COL]
+        .max()
+        .reset_index()
+    )
+
+
+def merge_sketches(sketches, dim_cols):
+    """Merge sketches (e.g. of several files) into one sketch"""
+    combined = pd.concat(sketches, ignore_index=True)
+    return (
+        combined.groupby(list(dim_cols) + [REGISTER_COL], dropna=False, observed=True)[RHO_COL]
+        .max()
+        .reset_index()
+    )
+
+
+def estimate_per_group(sketch, group_cols, value_name='aantal', precision=DEFAULT_PRECISION):
+    """Estimate the distinct count per group by merging the sketches in that group
+
+    Args:
+        sketch: Sketch DataFrame (already filtered on the selected dimensions)
+        group_cols: Columns to report on (subset of the sketch dimensions)
+        value_name: Name of the result column
+        precision: Precision the sketch was built with
+
+    Returns:
+        pandas.DataFrame with group_cols + value_name, sorted by group_cols
+    """
+    group_cols = list(group_cols)
+    m = 2 ** precision
+    merged = sketch.groupby(group_cols + [REGISTER_COL], observed=True)[RHO_COL].max().reset_index()
+    merged['_inverse'] = np.exp2(-merged[RHO_COL].astype(np.float64))
+    per_group = merged.groupby(group_cols, observed=True).agg(
+        _inverse_sum=('_inverse', 'sum'),
+        _filled=(RHO_COL, 'size'),
+    ).reset_index()
+
+    zeros = m - per_group['_filled'].to_numpy()
+    result = per_group[group_cols].copy()
+    result[value_name] = _estimate(per_group['_inverse_sum'].to_numpy(), zeros, m)
+    return result
@@ -0,0 +1,79 @@
+"""
+Dictionary encoding van identifiers
+
+bsn_hash en caketenid zijn lange strings die als Python-objecten in
+object-kolommen staan; elke nunique, isin en groupby daarop is traag en kost
+veel geheugen. Bij het inlezen worden ze vervangen door een categorische
+kolom: compacte integer codes plus de lijst met unieke waarden van dat ene
+bestand. De dictionary hoort zo bij de dataset zelf. Hij telt mee in het
+geheugenbudget (zie memory), verdwijnt met de dataset en wordt mee opgeslagen
+in de data plane (Arrow dictionary) en in een bundel (Parquet), zonder
+vertaling van id's tussen processen.
+
+Codes van verschillende bestanden betekenen niet hetzelfde; vergelijken gaat
+altijd op de waarde. Gebruik concat_encoded() om bestanden samen te voegen,
+zodat de kolommen categorisch blijven.
+"""
+import pandas as pd
+
+IDENTIFIER_COLUMNS = [
+    'caketenid', 'caketen_id', 'caketen', 'ketenid', 'keten_id',
+    'bsnhash', 'bsn_hash', 'bsn hash',
+]
+
+
+def encode_identifier(values):
+    """Encode a Series of identifiers as categorical
+
+    Values are compared on their string value; missing values stay missing.
+
+    Returns:
+        pandas.Series with a categorical dtype (integer codes, string categories)
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.where(values.isna(), values.astype(str))
+    return values.astype('category')
+
+
+def encode_identifiers(df):
+    """Replace the identifier columns of a DataFrame by categorical columns (in place)
+
+    Args:
+        df: pandas.DataFrame (or None)
+
+    Returns:
+        The same DataFrame
+    """
+    if df is None:
+        return df
+    identifier_names = set(IDENTIFIER_COLUMNS)
+    for position, col in enumerate(df.columns):
+        if str(col).lower() in identifier_names:
+            df.isetitem(position, encode_identifier(df.iloc[:, position]))
+    return df
+
+
+def concat_encoded(frames):
+    """pd.concat(frames, ignore_index=True) that keeps encoded identifiers categorical
+
+    pd.concat turns categoricals with different categories into object
+    columns, i.e. back into one string per row. The categories are unified
+    first, so only the codes are concatenated.
+    """
+    frames = list(frames)
+    dtypes = {}
+    for col in frames[0].columns:
+        if all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames):
+            categories = frames[0][col].cat.categories
+            for df in frames[1:]:
+                categories = categories.append(df[col].cat.categories.difference(categories))
+            dtypes[col] = pd.CategoricalDtype(categories)
+    aligned = []
+    for df in frames:
+        recode = [col for col, dtype in dtypes.items() if df[col].dtype != dtype]
+        if recode:
+            df = df.copy(deep=False)
+            for col in recode:
+                df[col] = df[col].cat.set_categories(dtypes[col].categories)
+        aligned.append(df)
+    return pd.concat(aligned, ignore_index=True)
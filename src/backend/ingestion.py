@@ -0,0 +1,134 @@
+"""
+Inlezen op de achtergrond
+
+Het verwerken van een bestand (dialect bepalen, parsen, identifiers coderen,
+kolomprofiel) gebeurt in een pool van worker threads, zodat de pagina niet
+bevriest tijdens een grote upload. Per bestand (content hash) wordt de status
+bijgehouden: queued -> parsing -> ready of failed, met de voortgang over de
+stappen. Pagina's die een dataset nodig hebben wachten alleen op dat ene
+bestand (wait) en lezen het daarna uit de gedeelde caches.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.config import INGEST_WORKERS
+
+QUEUED = 'queued'
+PARSING = 'parsing'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class IngestionJob:
+    """Status of the ingestion of one file
+
+    Args:
+        file_hash: Content hash of the file
+        file_name: File name
+        steps: List of (label, callable) executed in order; a step that
+            returns False marks the job as failed
+    """
+
+    def __init__(self, file_hash, file_name, steps):
+        self.file_hash = file_hash
+        self.file_name = file_name
+        self.steps = steps
+        self.status = QUEUED
+        self.step_label = None
+        self.completed_steps = 0
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self.future = None
+        self.thread_id = None
+
+    @property
+    def progress(self):
+        """Fraction of the steps that is done (0.0 - 1.0)"""
+        return self.completed_steps / len(self.steps) if self.steps else 1.0
+
+    def run(self):
+        self.thread_id = threading.get_ident()
+        self.status = PARSING
+        try:
+            for label, step in self.steps:
+                self.step_label = label
+                if step() is False:
+                    raise ValueError(f"{label} mislukt")
+                self.completed_steps += 1
+            self.status = READY
+        except Exception as e:
+            self.error = str(e)
+            self.status = FAILED
+        finally:
+            self.step_label = None
+            self.finished = time.time()
+
+
+class IngestionManager:
+    """Worker pool that ingests files in the background, at most once per content hash
+
+    Args:
+        max_workers: Number of worker threads
+    """
+
+    def __init__(self, max_workers=INGEST_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self._jobs = {}  # file_hash -> IngestionJob
+        self._lock = threading.Lock()
+
+    def submit(self, file_hash, file_name, steps):
+        """Queue the ingestion of a file (no-op if it's already queued, running or done)
+
+        Returns:
+            IngestionJob
+        """
+        with self._lock:
+            job = self._jobs.get(file_hash)
+            if job is not None and job.status != FAILED:
+                return job
+            job = IngestionJob(file_hash, file_name, steps)
+            self._jobs[file_hash] = job
+            job.future = self._executor.submit(job.run)
+            return job
+
+    def get_job(self, file_hash):
+        """Return the job of a file, or None if it was never submitted"""
+        with self._lock:
+            return self._jobs.get(file_hash)
+
+    def wait(self, file_hash, timeout=None):
+        """Block until the ingestion of a file is finished (returns immediately if not submitted)
+
+        Returns:
+            IngestionJob or None
+        """
+        job = self.get_job(file_hash)
+        # Een stap van de job zelf (bijv. het profiel dat de dataset leest) wacht niet op zichzelf
+        if job is not None and job.future is not None and job.thread_id != threading.get_ident():
+            job.future.result(timeout=timeout)
+        return job
+
+    def pending(self):
+        """Number of jobs that are queued or running"""
+        with self._lock:
+            return sum(job.status in (QUEUED, PARSING) for job in self._jobs.values())
+
+    def forget(self, file_hash):
+        """Drop the status of a file (e.g. after it was removed)"""
+        with self._lock:
+            self._jobs.pop(file_hash, None)
+
+
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_ingestion_manager():
+    """Return the process-wide ingestion manager"""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = IngestionManager()
+        return _MANAGER
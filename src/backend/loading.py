@@ -0,0 +1,158 @@
+"""
+Inlezen van bestanden
+
+Dialect bepalen, parsen (met gecodeerde identifiers) en het kolomprofiel van
+één bestand, los van Streamlit. De pagina's gebruiken deze functies via
+selecteer_bestandslocatie (die fouten als melding toont); de worker pool van
+ingestion en de warm-up bij het starten van de server roepen ze direct aan.
+Resultaten komen in de proces-brede caches (datasets, file_metadata) met de
+content hash van het bestand als sleutel.
+"""
+import csv
+import os
+
+import pandas as pd
+
+from backend.config import ENCODE_IDENTIFIERS
+from backend.csv_dialect import detect_csv_dialect, read_csv_kwargs
+from backend.datasets import get_dataset
+from backend.file_metadata import get_file_metadata
+from backend.identifiers import encode_identifiers
+from backend.ingestion import get_ingestion_manager
+from backend.profiling import profile_dataframe
+from backend.storage import LocalFileHandle, compute_buffer_hash, compute_file_hash
+
+
+def get_file_hash(file_obj):
+    """Get the content hash of a file, computed once per file object
+
+    Args:
+        file_obj: File-like object (UploadedFile, LocalFileHandle or BundleFileHandle)
+
+    Returns:
+        str: Hex digest of the file content
+    """
+    file_hash = getattr(file_obj, 'file_hash', None)
+    if file_hash:
+        return file_hash
+    file_path = getattr(file_obj, 'file_path', None)
+    if file_path and os.path.exists(file_path):
+        file_hash = compute_file_hash(file_path)
+    else:
+        file_hash = compute_buffer_hash(file_obj.getbuffer())
+    try:
+        file_obj.file_hash = file_hash
+    except AttributeError:
+        pass
+    return file_hash
+
+
+def get_read_source(file_obj):
+    """Return the path of a file that lives on the server, otherwise the file object itself"""
+    file_path = getattr(file_obj, 'file_path', None)
+    if file_path and os.path.exists(file_path):
+        return file_path
+    return file_obj
+
+
+def get_csv_dialect(file_obj):
+    """Get the CSV dialect of a file, detected once per file content (see backend.csv_dialect)"""
+    return get_file_metadata(get_file_hash(file_obj), 'csv_dialect', lambda: detect_csv_dialect(file_obj))
+
+
+def read_excel(file_obj):
+    """Read an Excel file (XLSX or XLS), directly from disk if the file lives on the server"""
+    file_obj.seek(0)
+    return pd.read_excel(get_read_source(file_obj), engine='openpyxl')
+
+
+def read_csv(file_obj, dialect):
+    """Read a CSV file with the given dialect
+
+    Uses the C parser of pandas; falls back to the csv module with the same dialect.
+
+    Returns:
+        pandas.DataFrame or None (no rows)
+    """
+    try:
+        file_obj.seek(0)
+        return pd.read_csv(get_read_source(file_obj), **read_csv_kwargs(dialect))
+    except Exception:
+        file_obj.seek(0)
+        content = file_obj.read().decode(dialect['encoding'], errors='replace')
+        lines = content.splitlines()[dialect['header_row']:]
+        rows = [row for row in csv.reader(lines, delimiter=dialect['separator'], quotechar=dialect['quotechar']) if row]
+        if rows:
+            return pd.DataFrame(rows[1:], columns=rows[0])
+    return None
+
+
+def load_dataset(file_obj, file_name):
+    """Return the parsed DataFrame of a file (CSV or XLSX), parsed once per file content
+
+    bsn_hash / caketenid become categorical columns (integer codes plus the
+    file's own dictionary of values). If the file is being ingested in the background, this waits
+    for it instead of parsing it twice.
+
+    Args:
+        file_obj: File-like object
+        file_name: File name
+
+    Returns:
+        pandas.DataFrame, or None for an unsupported file type
+
+    Raises:
+        Exception: If the file can't be read
+    """
+    if file_name.endswith('.xlsx') or file_name.endswith('.xls'):
+        reader = read_excel
+    elif file_name.endswith('.csv'):
+        reader = lambda f: read_csv(f, get_csv_dialect(f))
+    else:
+        return None
+
+    def load():
+        df = reader(file_obj)
+        return encode_identifiers(df) if ENCODE_IDENTIFIERS else df
+
+    # Bestanden uit een bundel zijn al geparst; de dataset komt uit de bundel
+    if getattr(file_obj, 'source', None) == 'bundle':
+        return get_dataset(file_obj.file_hash, file_name, file_obj.load_dataset)
+
+    file_hash = getattr(file_obj, 'file_hash', None)
+    if file_hash:
+        get_ingestion_manager().wait(file_hash)
+        return get_dataset(file_hash, file_name, load)
+    return load()
+
+
+def get_column_profile(file_obj, file_name):
+    """Return the column profile of a file, computed once per file content (see backend.profiling)"""
+    def build_profile():
+        df = load_dataset(file_obj, file_name)
+        return profile_dataframe(df) if df is not None else None
+
+    return get_file_metadata(get_file_hash(file_obj), 'column_profile', build_profile)
+
+
+def submit_ingestion(file_path, file_name, file_hash=None, source='temp'):
+    """Queue the background ingestion (dialect, parsing, column profile) of a file on the server's disk
+
+    Args:
+        file_path: Path to the file
+        file_name: File name
+        file_hash: Content hash, if already known
+        source: Where the file comes from ('temp' or 'data_directory')
+
+    Returns:
+        IngestionJob
+    """
+    # De worker leest via een eigen handle, los van het file-object van een sessie
+    handle = LocalFileHandle(file_path, file_name, file_hash=file_hash, source=source)
+    file_hash = get_file_hash(handle)
+    steps = []
+    if file_name.lower().endswith('.csv'):
+        steps.append(('Dialect bepalen', lambda: get_csv_dialect(handle)))
+    steps.append(('Inlezen', lambda: load_dataset(handle, file_name) is not None))
+    steps.append(('Kolomprofiel', lambda: get_column_profile(handle, file_name) is not None))
+    return get_ingestion_manager().submit(file_hash, file_name, steps)
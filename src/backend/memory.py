@@ -0,0 +1,164 @@
+"""
+Geheugenbudget voor de proces-brede caches
+
+De geparste datasets en de aggregaten van de prognose store blijven in het
+geheugen van het serverproces staan, voor alle sessies samen. Zonder grens
+groeit dat met elk bestand dat ooit gebruikt is. De governor houdt per item
+de geschatte grootte en het laatste gebruik bij. Komt het totaal boven het
+budget (INSTROOM_MEMORY_BUDGET_MB), dan geeft hij de minst recent gebruikte
+items vrij via hun eigenaar:
+
+- een dataset wordt naar de data plane op schijf uitgeplaatst (zie
+  data_plane) en bij het volgende gebruik daaruit weer ingelezen (of opnieuw
+  geparst als dat niet kan);
+- een aggregaat van de prognose store wordt bij gebruik opnieuw uit de
+  partities op schijf opgebouwd.
+
+Een vrijgegeven DataFrame is pas echt weg als geen sessie er nog naar
+verwijst; het budget begrenst dus wat de caches zelf vasthouden.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from backend.config import MEMORY_BUDGET_BYTES
+
+SPILLED = 'uitgeplaatst'
+DROPPED = 'verwijderd'
+
+
+def estimate_bytes(df):
+    """Estimated memory use of a DataFrame, including the Python strings of object columns"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class MemoryGovernor:
+    """Keeps the tracked items within a memory budget, least recently used first out
+
+    Args:
+        budget_bytes: Budget in bytes (0 or less = unbounded)
+    """
+
+    def __init__(self, budget_bytes=MEMORY_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> dict (kind, label, bytes, last_used, release)
+        self._released = {}  # key -> dict (kind, label, bytes, released, state)
+        self._total = 0
+        self.releases = 0
+        self.reloads = 0
+
+    def track(self, key, kind, label, nbytes, release):
+        """Register an item that is now held in memory
+
+        Args:
+            key: Unique key of the item
+            kind: Kind of item, for the diagnostics (e.g. 'dataset')
+            label: Readable name, for the diagnostics
+            nbytes: Estimated size in bytes
+            release: Callable that removes the item from its owner's cache and
+                returns SPILLED or DROPPED (None if it was already gone)
+        """
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total -= previous['bytes']
+            if self._released.pop(key, None) is not None:
+                self.reloads += 1
+            self._entries[key] = {
+                'kind': kind,
+                'label': label,
+                'bytes': nbytes,
+                'last_used': time.time(),
+                'release': release,
+            }
+            self._total += nbytes
+        self._enforce(keep=key)
+
+    def touch(self, key):
+        """Mark an item as used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['last_used'] = time.time()
+                self._entries.move_to_end(key)
+        self._enforce(keep=key)
+
+    def forget(self, key):
+        """Stop tracking an item (its owner removed it)"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total -= entry['bytes']
+            self._released.pop(key, None)
+
+    def _enforce(self, keep=None):
+        if self.budget_bytes <= 0:
+            return
+        while True:
+            with self._lock:
+                if self._total <= self.budget_bytes:
+                    return
+                # Het item dat net is toegevoegd blijft staan, ook als het alleen al te groot is
+                victim = next((key for key in self._entries if key != keep), None)
+                if victim is None:
+                    return
+                entry = self._entries.pop(victim)
+                self._total -= entry['bytes']
+            # Vrijgeven buiten de lock: de eigenaar schrijft eventueel naar schijf
+            try:
+                state = entry['release']()
+            except Exception:
+                state = DROPPED
+            if state is not None:
+                with self._lock:
+                    self.releases += 1
+                    self._released[victim] = {
+                        'kind': entry['kind'],
+                        'label': entry['label'],
+                        'bytes': entry['bytes'],
+                        'released': time.time(),
+                        'state': state,
+                    }
+
+    @property
+    def total_bytes(self):
+        """Estimated bytes of the items in memory"""
+        return self._total
+
+    def usage(self):
+        """Snapshot of the memory use, for the diagnostics panel
+
+        Returns:
+            dict with budget_bytes, total_bytes, releases, reloads and
+            items: list of dicts (kind, label, bytes, last_used, state), most recently used first
+        """
+        with self._lock:
+            items = [
+                {'kind': e['kind'], 'label': e['label'], 'bytes': e['bytes'], 'last_used': e['last_used'], 'state': 'in geheugen'}
+                for e in reversed(self._entries.values())
+            ]
+            items += [
+                {'kind': e['kind'], 'label': e['label'], 'bytes': e['bytes'], 'last_used': e['released'], 'state': e['state']}
+                for e in sorted(self._released.values(), key=lambda e: -e['released'])
+            ]
+            return {
+                'budget_bytes': self.budget_bytes,
+                'total_bytes': self._total,
+                'releases': self.releases,
+                'reloads': self.reloads,
+                'items': items,
+            }
+
+
+_GOVERNOR = None
+_GOVERNOR_LOCK = threading.Lock()
+
+
+def get_memory_governor():
+    """Return the process-wide memory governor"""
+    global _GOVERNOR
+    with _GOVERNOR_LOCK:
+        if _GOVERNOR is None:
+            _GOVERNOR = MemoryGovernor()
+        return _GOVERNOR
@@ -0,0 +1,63 @@
+"""
+Opleidingssleutel voor de filters
+
+De filters op opleiding gebruiken een gecombineerde sleutel "<code> - <naam>".
+In plaats van de code per rij te normaliseren (miljoenen Python-aanroepen bij
+grote bestanden) wordt alleen elk uniek (code, naam) paar één keer opgemaakt;
+het resultaat is een categorische kolom die naar de rijen wordt teruggezet.
+"""
+import pandas as pd
+
+
+def format_opleidingcode(code_value):
+    """Convert opleidingcode to integer string (remove .0)"""
+    if pd.isna(code_value):
+        return ''
+    try:
+        num_val = pd.to_numeric(code_value, errors='coerce')
+        if pd.isna(num_val):
+            return str(code_value)
+        else:
+            return str(int(float(num_val)))
+    except (ValueError, TypeError, OverflowError):
+        code_str = str(code_value)
+        if code_str.endswith('.0'):
+            return code_str[:-2]
+        return code_str
+
+
+def build_opleiding_key(df, code_col=None, naam_col=None):
+    """Build the combined opleiding key as a categorical Series
+
+    Args:
+        df: pandas.DataFrame
+        code_col: Opleidingcode column (or None)
+        naam_col: Opleidingsnaam column (or None)
+
+    Returns:
+        pandas.Series (categorical, same index as df) or None if both columns are absent
+    """
+    cols = [col for col in (code_col, naam_col) if col]
+    if not cols:
+        return None
+
+    # Elk uniek (code, naam) paar krijgt een nummer (NaN telt als eigen waarde)
+    pair_ids = None
+    for col in cols:
+        codes, _ = pd.factorize(df[col], use_na_sentinel=False)
+        pair_ids = codes if pair_ids is None else pair_ids * (codes.max(initial=0) + 1) + codes
+    pair_codes, _ = pd.factorize(pair_ids)
+    first_rows = pd.Series(pair_codes).drop_duplicates().index.to_numpy()
+
+    # Sleutel alleen per uniek paar opmaken
+    pairs = df.iloc[first_rows]
+    if code_col and naam_col:
+        labels = pairs[code_col].apply(format_opleidingcode) + ' - ' + pairs[naam_col].astype(str)
+    elif code_col:
+        labels = pairs[code_col].apply(format_opleidingcode)
+    else:
+        labels = pairs[naam_col].astype(str)
+
+    label_codes, categories = pd.factorize(labels)
+    key = pd.Categorical.from_codes(label_codes[pair_codes], categories=categories)
+    return pd.Series(key, index=df.index)
@@ -0,0 +1,117 @@
+"""
+Polars query backend
+
+Voert de pagina-aggregaties uit als lazy Polars query. Alleen de kolommen die
+een aggregatie nodig heeft worden (via Arrow) aan Polars gegeven; filter,
+groupby, lopende som en pivot worden als één plan geoptimaliseerd en
+multi-threaded uitgevoerd, de telling op de ruwe rijen met de streaming
+engine.
+
+De uitkomst is steeds hetzelfde pandas DataFrame als de pandas implementatie
+in aggregations oplevert (kolomnamen, volgorde en dtypes van de groepkolommen),
+zodat de grafiekcode niet hoeft te weten welke engine gerekend heeft.
+
+Polars is een optionele dependency: installeer met `uv sync --extra polars`.
+"""
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+
+def is_available():
+    """Return True if the polars package can be used"""
+    return pl is not None
+
+
+def scan_dataframe(df, columns):
+    """Lazy frame over only the given columns of a pandas DataFrame
+
+    NaN becomes null, like pandas treats NaN as missing.
+    """
+    if pl is None:
+        raise ImportError("polars is niet geïnstalleerd")
+    return pl.from_pandas(df[list(dict.fromkeys(columns))], nan_to_null=True).lazy()
+
+
+def _without_missing_keys(lf, group_cols):
+    """Drop rows with a missing group key, like groupby(dropna=True)"""
+    return lf.filter(pl.all_horizontal(pl.col(list(group_cols)).is_not_null()))
+
+
+def _restore_dtypes(result, df, columns):
+    """Cast group columns back to the dtypes of the source DataFrame"""
+    for col in columns:
+        try:
+            result[col] = result[col].astype(df[col].dtype)
+        except (ValueError, TypeError):
+            pass
+    return result
+
+
+def count_unique_per_group(df, group_cols, id_col, value_name):
+    """n_unique(id_col) per group, equivalent to groupby().nunique()"""
+    group_cols = list(group_cols)
+    query = (
+        _without_missing_keys(scan_dataframe(df, group_cols + [id_col]), group_cols)
+        .group_by(group_cols)
+        .agg(pl.col(id_col).drop_nulls().n_unique().alias(value_name))
+        .sort(group_cols)
+    )
+    result = query.collect(engine='streaming').to_pandas()
+    result[value_name] = result[value_name].astype('int64')
+    return _restore_dtypes(result, df, group_cols)
+
+
+def sum_per_group(df, group_cols, value_col, value_name):
+    """sum(value_col) per group, equivalent to groupby().sum()"""
+    group_cols = list(group_cols)
+    query = (
+        _without_missing_keys(scan_dataframe(df, group_cols + [value_col]), group_cols)
+        .group_by(group_cols)
+        .agg(pl.col(value_col).sum().alias(value_name))
+        .sort(group_cols)
+    )
+    result = query.collect(engine='streaming').to_pandas()
+    return _restore_dtypes(result, df, group_cols)
+
+
+def sum_column(df, value_col):
+    """sum(value_col) over the whole DataFrame, equivalent to Series.sum()"""
+    return scan_dataframe(df, [value_col]).select(pl.col(value_col).sum()).collect().item()
+
+
+def cumulative_per_group(df, partition_cols, order_col, value_col, value_name):
+    """Running total of value_col in order of order_col within each partition
+
+    Returns:
+        pandas.DataFrame with the columns of df + value_name, sorted by partition_cols and order_col
+    """
+    partition_cols = list(partition_cols)
+    sort_cols = partition_cols + [order_col]
+    query = (
+        scan_dataframe(df, list(df.columns))
+        .sort(sort_cols, maintain_order=True)
+        .with_columns(pl.col(value_col).cum_sum().over(partition_cols).alias(value_name))
+    )
+    result = query.collect().to_pandas()
+    return _restore_dtypes(result, df, df.columns)
+
+
+def pivot_sum(df, index, columns, values):
+    """Sum of values per (index, columns) value pair as wide table, equivalent to pivot_table(aggfunc='sum', fill_value=0)"""
+    wide = (
+        scan_dataframe(df, [index, columns, values])
+        .filter(pl.col(index).is_not_null() & pl.col(columns).is_not_null())
+        .collect()
+        .pivot(on=columns, index=index, values=values, aggregate_function='sum')
+        .fill_null(0)
+        .sort(index)
+    )
+    # Polars noemt de kolommen naar str(waarde): terug naar de waarden zelf, gesorteerd zoals pandas
+    names = {str(value): value for value in df[columns].dropna().unique()}
+    result = wide.to_pandas().set_index(index)
+    result.columns = [names[name] for name in result.columns]
+    result = result[sorted(result.columns)]
+    result.columns.name = columns
+    return result
@@ -0,0 +1,64 @@
+"""
+Voorbeeld van de inhoud van een bestand
+
+Leest alleen een venster van rijen (start, aantal) in plaats van het hele
+bestand: bij CSV met nrows en het gedetecteerde dialect, bij XLSX door de
+eerste sheet in read-only modus te streamen. Zo is een voorbeeld van een
+bestand van gigabytes direct beschikbaar en kunnen volgende vensters
+("meer laden") los worden opgehaald.
+"""
+from itertools import islice
+
+import pandas as pd
+
+from backend.csv_dialect import read_csv_kwargs
+
+PREVIEW_ROWS = 5  # eerste venster
+PREVIEW_PAGE_ROWS = 50  # elk volgend venster ("meer laden")
+
+
+def _read_csv_window(source, dialect, start, nrows):
+    kwargs = read_csv_kwargs(dialect)
+    header_row = dialect['header_row']
+    # Regels vóór de kolomnamen en de eerste `start` datarijen overslaan
+    kwargs['skiprows'] = list(range(header_row)) + list(range(header_row + 1, header_row + 1 + start)) or None
+    return pd.read_csv(source, nrows=nrows, **kwargs)
+
+
+def _read_xlsx_window(source, start, nrows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        data = [row[:len(columns)] for row in islice(rows, start, start + nrows)]
+    finally:
+        workbook.close()
+    return pd.DataFrame(data, columns=columns)
+
+
+def read_preview(source, file_name, start=0, nrows=PREVIEW_ROWS, dialect=None):
+    """Read a window of data rows of a CSV or Excel file
+
+    Args:
+        source: Path or file-like object
+        file_name: File name (determines the format)
+        start: Index of the first data row
+        nrows: Number of rows to read
+        dialect: CSV dialect from detect_csv_dialect (required for CSV)
+
+    Returns:
+        pandas.DataFrame (fewer than nrows rows at the end of the file)
+    """
+    name = file_name.lower()
+    if name.endswith('.csv'):
+        return _read_csv_window(source, dialect, start, nrows)
+    if name.endswith('.xlsx'):
+        return _read_xlsx_window(source, start, nrows)
+    if name.endswith('.xls'):
+        return pd.read_excel(source, skiprows=range(1, 1 + start), nrows=nrows)
+    return None
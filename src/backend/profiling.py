@@ -0,0 +1,73 @@
+"""
+Kolomprofiel van een dataset
+
+Berekent in één doorgang per kolom het datatype, het aantal gevulde en
+ontbrekende waarden, het aantal unieke waarden, minimum/maximum en de meest
+voorkomende waarden. Gevulde/ontbrekende waarden worden voor het hele DataFrame in
+één keer (gevectoriseerd) geteld. Unieke waarden worden exact geteld tot
+EXACT_DISTINCT_LIMIT; kolommen met meer unieke waarden (zoals id's in grote
+bestanden) krijgen een HyperLogLog schatting.
+"""
+import pandas as pd
+
+from backend.hll import DEFAULT_PRECISION, estimate_distinct
+
+EXACT_DISTINCT_LIMIT = 100_000
+TOP_N = 3
+
+
+def _format_value(value):
+    if pd.isna(value):
+        return ''
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat(sep=' ')
+    return str(value)
+
+
+def profile_dataframe(df, exact_distinct_limit=EXACT_DISTINCT_LIMIT, top_n=TOP_N, precision=DEFAULT_PRECISION):
+    """Profile all columns of a DataFrame
+
+    Args:
+        df: pandas.DataFrame
+        exact_distinct_limit: Up to this number of distinct values the count is exact
+        top_n: Number of most frequent values to report
+        precision: HLL precision for the estimated distinct counts
+
+    Returns:
+        pandas.DataFrame with one row per column (display labels)
+    """
+    num_rows = len(df)
+    # Positioneel, zodat dubbele kolomnamen geen probleem zijn
+    non_null = df.notna().sum().to_numpy()
+
+    rows = []
+    for i, col in enumerate(df.columns):
+        series = df.iloc[:, i]
+        ordered = series.dtype.kind in 'iufmM'  # numeriek of datum (geen bool/tekst)
+        approximate = False
+        top_values = ''
+        # Alleen bij grote bestanden eerst goedkoop schatten: een exacte telling van
+        # een kolom met veel unieke waarden (id's) is de duurste stap
+        if num_rows > exact_distinct_limit:
+            estimate = estimate_distinct(series, precision)
+            approximate = estimate > exact_distinct_limit
+        if approximate:
+            distinct = min(estimate, int(non_null[i]))
+        else:
+            counts = series.value_counts(dropna=True, sort=True)
+            distinct = len(counts)
+            top_values = ', '.join(f"{_format_value(v)} ({n})" for v, n in counts.head(top_n).items())
+
+        rows.append({
+            'Kolom': col,
+            'Datatype': str(series.dtype),
+            'Aantal waarden': num_rows,
+            'Gevulde waarden': int(non_null[i]),
+            'Ontbrekende waarden': int(num_rows - non_null[i]),
+            'Unieke waarden': int(distinct),
+            'Unieke waarden benaderd': approximate,
+            'Minimum': _format_value(series.min()) if ordered else '',
+            'Maximum': _format_value(series.max()) if ordered else '',
+            'Meest voorkomend': top_values,
+        })
+    return pd.DataFrame(rows)
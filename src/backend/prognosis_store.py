@@ -0,0 +1,337 @@
+"""
+Append-only opslag van weekaggregaten van de prognose
+
+Elke week komt er een nieuw predictions_mbo_<jaar>_week<##>.xlsx bij. In
+plaats van voor de weekgrafiek alle eerdere werkboeken opnieuw te lezen en op
+te tellen, wordt elk werkboek één keer samengevat tot een partitie met per
+filtercombinatie (instelling, schooljaar, leerweg, opleiding) de som van
+Individual_ratio, Individual_mean en Aantal_studenten.
+
+Partities worden nooit overschreven: een gewijzigd weekbestand levert een
+nieuwe partitie op (andere content hash). Het manifest is een JSON-lines
+bestand waar alleen regels aan worden toegevoegd.
+
+Samen vormen de partities een feitentabel in long-format: (jaar, week,
+instelling, schooljaar, leerweg, opleiding) -> sum_ratio, sum_mean,
+sum_aantal, met getypeerde kolommen en gesorteerd op jaar en week. Grafieken
+en KPI's zijn daarmee een groupby over duizenden rijen in plaats van een scan
+over de ruwe werkboeken.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+from backend.config import PROGNOSIS_STORE_DIR
+from backend.memory import DROPPED, estimate_bytes, get_memory_governor
+
+STORE_DIMENSIONS = ['instelling', 'schooljaar', 'leerweg', 'opleiding']
+STORE_MEASURES = ['sum_ratio', 'sum_mean', 'sum_aantal']
+MAX_CACHED_FACT_TABLES = 16
+# Kolommen van een predictions_mbo werkboek per dimensie en maat (eerste gevonden naam telt)
+PREDICTION_COLUMNS = {
+    'instelling': ['instellingserkenningscode'],
+    'schooljaar': ['schooljaar_berekend', 'schooljaar_afgeleid', 'schooljaar', 'collegejaar', 'school_jaar', 'jaar'],
+    'leerweg': ['leertraject', 'leertrajectmbo', 'leerweg'],
+    'opleiding': ['opleidingscode', 'opleidingcode', 'code'],
+    'sum_ratio': ['individual_ratio', 'individual ratio'],
+    'sum_mean': ['individual_mean', 'individual mean'],
+    'sum_aantal': ['aantal_studenten', 'aantal', 'count'],
+}
+
+_PREDICTION_FILE_NAME = re.compile(r'predictions_mbo_(\d+)_week(\d+)\.', re.IGNORECASE)
+
+
+def find_column(df, possible_names):
+    """Find column name from possible variations (case-insensitive)"""
+    df_cols_lower = {col.lower(): col for col in df.columns}
+    for name in possible_names:
+        if name.lower() in df_cols_lower:
+            return df_cols_lower[name.lower()]
+    return None
+
+
+def parse_prediction_mbo_filename(filename):
+    """
+    Parse predictions_mbo_****_week## filename.
+    **** = jaartal, ## = weeknummer. Returns (jaar, week) or None if no match.
+    """
+    match = _PREDICTION_FILE_NAME.match(filename)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    return None
+
+
+def aggregate_prediction(df, dimension_cols, ratio_col, mean_col, aantal_col):
+    """Collapse one prediction workbook to sums per filter combination
+
+    Args:
+        df: pandas.DataFrame of one predictions_mbo workbook
+        dimension_cols: Dict store dimension -> column in df (or None if absent)
+        ratio_col: Individual_ratio column (or None)
+        mean_col: Individual_mean column (or None)
+        aantal_col: Aantal_studenten column (or None)
+
+    Returns:
+        pandas.DataFrame with STORE_DIMENSIONS + STORE_MEASURES
+    """
+    data = pd.DataFrame(index=df.index)
+    present_dims = []
+    for dim in STORE_DIMENSIONS:
+        col = dimension_cols.get(dim)
+        if col and col in df.columns:
+            # De filters vergelijken op stringwaarde (zie apply_filters); lege waarden
+            # worden 'nan' zodat NA alleen betekent dat de kolom ontbreekt
+            data[dim] = df[col].astype(str).fillna('nan')
+            present_dims.append(dim)
+    present_measures = []
+    for measure, col in zip(STORE_MEASURES, [ratio_col, mean_col, aantal_col]):
+        if col and col in df.columns:
+            data[measure] = pd.to_numeric(df[col], errors='coerce')
+            present_measures.append(measure)
+
+    if not present_measures:
+        result = data[present_dims].drop_duplicates()
+    elif present_dims:
+        result = data.groupby(present_dims, sort=False)[present_measures].sum().reset_index()
+    else:
+        result = data[present_measures].sum().to_frame().T
+    # Afwezige dimensies blijven NA (betekent: geen filter mogelijk op deze dimensie),
+    # afwezige maten blijven NaN (betekent: kolom ontbreekt in dit werkboek)
+    for dim in STORE_DIMENSIONS:
+        if dim not in result.columns:
+            result[dim] = pd.Series(pd.NA, index=result.index, dtype=object)
+    for measure in STORE_MEASURES:
+        if measure not in result.columns:
+            result[measure] = float('nan')
+    return result[STORE_DIMENSIONS + STORE_MEASURES]
+
+
+def summarise_prediction(df):
+    """Collapse one prediction workbook with aggregate_prediction(), finding its columns by name
+
+    Args:
+        df: pandas.DataFrame of one predictions_mbo workbook
+
+    Returns:
+        pandas.DataFrame with STORE_DIMENSIONS + STORE_MEASURES
+    """
+    return aggregate_prediction(
+        df, {dim: find_column(df, PREDICTION_COLUMNS[dim]) for dim in STORE_DIMENSIONS},
+        *(find_column(df, PREDICTION_COLUMNS[measure]) for measure in STORE_MEASURES)
+    )
+
+
+def apply_selection(df, selections):
+    """Filter store rows on the selected dimension values
+
+    Rows of partitions that don't have a dimension (NA) are not filtered on it,
+    like apply_filters skips a column that's missing in a workbook.
+
+    Args:
+        df: Store DataFrame
+        selections: Dict dimension -> list of selected values (empty = no filter)
+    """
+    for dim, selected in selections.items():
+        if selected and dim in df.columns:
+            df = df[df[dim].isna() | df[dim].isin(selected)]
+    return df
+
+
+def weekly_prediction_totals(facts):
+    """Totals per week of a (selected) fact table, as on the weekly chart
+
+    Individual_ratio per week, with Aantal_studenten for partitions without
+    it, and Individual_mean for the second bar.
+
+    Returns:
+        tuple: (dict week -> ratio total, dict week -> mean total)
+    """
+    ratio = facts['sum_ratio'].fillna(facts['sum_aantal'])
+    weekly_ratio = ratio.groupby(facts['week']).sum(min_count=1).dropna().to_dict()
+    weekly_mean = facts.groupby('week')['sum_mean'].sum(min_count=1).dropna().to_dict()
+    return weekly_ratio, weekly_mean
+
+
+def snapshot_total(facts):
+    """Total of one week's (selected) fact table: Individual_ratio, else Aantal_studenten
+
+    Returns:
+        tuple: (measure used or None, total)
+    """
+    measure = next((m for m in ['sum_ratio', 'sum_aantal'] if facts[m].notna().any()), None)
+    return measure, (facts[measure].sum() if measure else 0)
+
+
+class PrognosisStore:
+    """Persistent, append-only store of per-week prediction aggregates
+
+    Args:
+        root: Directory of the store
+    """
+
+    def __init__(self, root=PROGNOSIS_STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.jsonl')
+        self._lock = threading.Lock()
+        self._partitions = {}  # (jaar, week, file_hash) -> manifest entry
+        self._loaded = {}  # partition path -> DataFrame (partitions are immutable)
+        self._fact_tables = {}  # tuple of partition keys -> fact table
+        self._manifest_offset = 0
+        self._read_manifest()
+
+    def _read_manifest(self):
+        """Read the manifest lines added since the last read (also by other server processes)"""
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            f.seek(self._manifest_offset)
+            while True:
+                line = f.readline()
+                if not line.endswith('\n'):
+                    break  # nog niet volledig geschreven: de volgende keer opnieuw
+                self._manifest_offset = f.tell()
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if os.path.exists(entry['path']):
+                    self._partitions[(entry['jaar'], entry['week'], entry['file_hash'])] = entry
+
+    def has_partition(self, jaar, week, file_hash):
+        """Return True if this version of the week file is already in the store"""
+        key = (jaar, week, file_hash)
+        if key not in self._partitions:
+            with self._lock:
+                self._read_manifest()
+        return key in self._partitions
+
+    def entries(self, file_hashes=None):
+        """Return the manifest entries of the store, optionally only those of the given files"""
+        return [
+            entry for (_, _, file_hash), entry in self._partitions.items()
+            if file_hashes is None or file_hash in file_hashes
+        ]
+
+    def read_partition(self, jaar, week, file_hash):
+        """Return the aggregate of one partition as it was appended (shared, read-only)"""
+        entry = self._partitions[(jaar, week, file_hash)]
+        path = entry['path']
+        aggregate = self._loaded.get(path)
+        if aggregate is None:
+            aggregate = pd.read_parquet(path)
+            self._keep_partition(path, entry['file_name'], aggregate)
+        else:
+            get_memory_governor().touch(('partition', path))
+        return aggregate
+
+    def _keep_partition(self, path, file_name, aggregate):
+        """Keep a partition in memory, within the memory budget (it can always be read again)"""
+        self._loaded[path] = aggregate
+        get_memory_governor().track(
+            ('partition', path), 'weekaggregaat', file_name, estimate_bytes(aggregate), lambda: DROPPED if self._loaded.pop(path, None) is not None else None
+        )
+
+    def append(self, jaar, week, file_hash, file_name, aggregate):
+        """Append the aggregate of one week file as a new partition
+
+        Args:
+            jaar: Prognosis year
+            week: Week number
+            file_hash: Content hash of the week file
+            file_name: Name of the week file
+            aggregate: DataFrame from aggregate_prediction()
+        """
+        with self._lock:
+            key = (jaar, week, file_hash)
+            if key in self._partitions:
+                return self._partitions[key]
+            partition_dir = os.path.join(self.root, f"jaar={jaar}", f"week={week:02d}")
+            os.makedirs(partition_dir, exist_ok=True)
+            path = os.path.join(partition_dir, f"{file_hash}.parquet")
+            tmp_path = path + '.tmp'
+            aggregate.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+            entry = {
+                'jaar': jaar,
+                'week': week,
+                'file_hash': file_hash,
+                'file_name': file_name,
+                'path': path,
+                'rows': int(len(aggregate)),
+                'created': time.time(),
+            }
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self._partitions[key] = entry
+        self._keep_partition(path, file_name, aggregate)
+        return entry
+
+    def load(self, partition_keys):
+        """Load the given partitions as one fact table
+        
+        The result is typed (int16 jaar/week, categorical dimensions, float64 measures),
+        sorted on jaar and week, and cached per set of partitions. It is shared:
+        callers must not modify it in place.
+
+        Args:
+            partition_keys: Iterable of (jaar, week, file_hash)
+
+        Returns:
+            pandas.DataFrame with jaar, week, STORE_DIMENSIONS and STORE_MEASURES
+        """
+        keys = tuple(key for key in dict.fromkeys(partition_keys) if key in self._partitions)
+        with self._lock:
+            facts = self._fact_tables.get(keys)
+        if facts is not None:
+            get_memory_governor().touch(('facts', id(self), keys))
+            return facts
+
+        frames = []
+        for key in keys:
+            entry = self._partitions[key]
+            frame = self.read_partition(*key).copy()
+            frame.insert(0, 'week', entry['week'])
+            frame.insert(0, 'jaar', entry['jaar'])
+            frames.append(frame)
+        if frames:
+            facts = pd.concat(frames, ignore_index=True)
+        else:
+            facts = pd.DataFrame(columns=['jaar', 'week'] + STORE_DIMENSIONS + STORE_MEASURES)
+        facts = facts.astype(
+            {'jaar': 'int16', 'week': 'int16'}
+            | {dim: 'category' for dim in STORE_DIMENSIONS}
+            | {measure: 'float64' for measure in STORE_MEASURES}
+        )
+        facts = facts.sort_values(['jaar', 'week'], kind='stable', ignore_index=True)
+
+        governor = get_memory_governor()
+        with self._lock:
+            if len(self._fact_tables) >= MAX_CACHED_FACT_TABLES:
+                oldest = next(iter(self._fact_tables))
+                self._fact_tables.pop(oldest)
+                governor.forget(('facts', id(self), oldest))
+            self._fact_tables[keys] = facts
+        governor.track(
+            ('facts', id(self), keys), 'feitentabel', f"{len(keys)} partitie(s)", estimate_bytes(facts),
+            lambda: DROPPED if self._fact_tables.pop(keys, None) is not None else None
+        )
+        return facts
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_prognosis_store():
+    """Return the process-wide prognosis store"""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            os.makedirs(PROGNOSIS_STORE_DIR, exist_ok=True)
+            _STORE = PrognosisStore(PROGNOSIS_STORE_DIR)
+        return _STORE
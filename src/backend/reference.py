@@ -0,0 +1,253 @@
+"""
+Referentie-implementaties van de pagina-aggregaties
+
+De oorspronkelijke pandas logica uit de paginascripts, zonder caches,
+indexen, sketches of andere engines:
+
+- aanmeldingen (unieke caketenid) per schooljaar/week/status en de
+  cumulatieve, gepivoteerde grafiekdata, zoals op Beschrijving aanmeldingen;
+- unieke ingeschreven studenten (bsn_hash) per week, `get_weekly_ingeschreven`
+  op Instroomprognose;
+- de sommen van Individual_ratio en Individual_mean per week, de prognose op
+  1 oktober en de historische totalen per schooljaar op Instroomprognose;
+- de cumulatieve voorspellingen per jaar (week 1-52) op Prognose
+  inschrijvingen.
+
+Elke snellere route moet exact dezelfde getallen opleveren (sommen van
+kommagetallen op afronding na); de differentiële controle (zie differential)
+vergelijkt ze op gegenereerde data. Deze functies zijn bewust eenvoudig en
+traag: de pagina's gebruiken ze niet.
+"""
+import pandas as pd
+
+from backend.prognosis_store import PREDICTION_COLUMNS, find_column
+
+
+def schooljaar_matches_target(val, target_jaar):
+    """Check of schooljaar overeenkomt met target (2024, '2024-2025', '2023-2024' etc)."""
+    if pd.isna(val):
+        return False
+    s = str(val).strip()
+    if '-' in s:
+        try:
+            start_jaar = int(s.split('-')[0])
+            end_jaar = int(s.split('-')[-1])
+            return start_jaar == target_jaar or end_jaar == target_jaar
+        except (ValueError, IndexError):
+            pass
+    try:
+        return int(float(val)) == target_jaar
+    except (ValueError, TypeError):
+        return False
+
+
+def filter_on_string_values(df, filters):
+    """The filters of Instroomprognose: compare the string value of each column
+
+    Args:
+        df: pandas.DataFrame
+        filters: Dict column -> selected values (empty or missing column = no filter)
+    """
+    out = df.copy()
+    for col, selected in filters.items():
+        if col and col in out.columns and selected:
+            out = out[out[col].astype(str).isin(selected)]
+    return out
+
+
+def filter_on_values(df, filters):
+    """The filters of Beschrijving aanmeldingen: compare the values themselves"""
+    out = df
+    for col, selected in filters.items():
+        if col and col in out.columns and selected:
+            out = out[out[col].isin(selected)]
+    return out
+
+
+def union_files(frames, id_col):
+    """Concatenate the files of a selection, dropping rows whose id occurs in an earlier file
+
+    Args:
+        frames: List of pandas.DataFrame (one per file, in selection order)
+        id_col: Identifier column (e.g. caketenid)
+    """
+    seen = set()
+    parts = []
+    for df in frames:
+        ids = df[id_col]
+        keep = ~ids.isin(seen) | ids.isna()
+        parts.append(df[keep])
+        seen.update(ids[keep].dropna().tolist())
+    return pd.concat(parts, ignore_index=True)
+
+
+def count_aanmeldingen(df, grouping_cols, caketenid_col):
+    """Unique caketenid per group (schooljaar, week, status)
+
+    Returns:
+        pandas.DataFrame with grouping_cols + 'aantal_aanmeldingen'
+    """
+    chart_data = df.groupby(grouping_cols)[caketenid_col].nunique().reset_index()
+    chart_data.columns = list(chart_data.columns[:-1]) + ['aantal_aanmeldingen']
+    return chart_data
+
+
+
+def cumulative_aanmeldingen(chart_data, schooljaar_col, status_col):
+    """Cumulative aantal_aanmeldingen per schooljaar and status, in week order
+
+    Args:
+        chart_data: Result of count_aanmeldingen (with _academic_week or _week)
+        schooljaar_col: Schooljaar column (or None)
+        status_col: Status column
+
+    Returns:
+        pandas.DataFrame with the columns of chart_data + 'cumulatief'
+    """
+    week_col = '_academic_week' if '_academic_week' in chart_data.columns else '_week'
+    chart_data = chart_data.sort_values([c for c in [schooljaar_col, week_col] if c and c in chart_data.columns])
+    cumulative_data = []
+    if schooljaar_col and schooljaar_col in chart_data.columns:
+        for schooljaar in chart_data[schooljaar_col].unique():
+            jaar_data = chart_data[chart_data[schooljaar_col] == schooljaar].copy()
+            jaar_data = jaar_data.sort_values(week_col)
+            for status in jaar_data[status_col].unique():
+                status_data = jaar_data[jaar_data[status_col] == status].copy()
+                status_data = status_data.sort_values(week_col)
+                status_data['cumulatief'] = status_data['aantal_aanmeldingen'].cumsum()
+                cumulative_data.append(status_data)
+    else:
+        for status in chart_data[status_col].unique():
+            status_data = chart_data[chart_data[status_col] == status].copy()
+            status_data = status_data.sort_values(week_col)
+            status_data['cumulatief'] = status_data['aantal_aanmeldingen'].cumsum()
+            cumulative_data.append(status_data)
+    if cumulative_data:
+        return pd.concat(cumulative_data, ignore_index=True)
+    chart_data = chart_data.copy()
+    chart_data['cumulatief'] = chart_data['aantal_aanmeldingen']
+    return chart_data
+
+
+def pivot_cumulative(data, status_col):
+    """Week x status table of the cumulative counts, as the stacked area chart uses it"""
+    return data.pivot_table(index='week_label', columns=status_col, values='cumulatief', aggfunc='sum', fill_value=0)
+
+def weekly_ingeschreven(df_app, target_jaar, bsn_col, week_col, jaar_col, status_col, filters):
+    """
+    Build dict week -> aantal unieke studenten (bsn_hash) uit application_enriched.
+    Alleen rijen met status = ENROLLED. Kolommen: bsn_hash, week_of_year, schooljaar_afgeleid.
+    """
+    if df_app is None or df_app.empty or not bsn_col or not week_col or not jaar_col or not status_col:
+        return {}
+    df = df_app.copy()
+    # Alleen status = ENROLLED
+    df = df[df[status_col].astype(str).str.upper().str.strip() == 'ENROLLED']
+    # Filter op jaar (schooljaar_afgeleid: 2024, 2024-2025 of 2023-2024)
+    df = df[df[jaar_col].apply(lambda v: schooljaar_matches_target(v, target_jaar))]
+    # Filters toepassen
+    df = filter_on_string_values(df, filters)
+    if df.empty:
+        return {}
+    # Week als integer
+    df['_week'] = pd.to_numeric(df[week_col], errors='coerce')
+    df = df[df['_week'].notna() & (df['_week'] >= 1) & (df['_week'] <= 53)]
+    df['_week'] = df['_week'].astype(int)
+    # Tel unieke bsn_hash per week
+    return df.groupby('_week')[bsn_col].nunique().to_dict()
+
+
+def _prediction_filters(df, selection):
+    """Map a selection per dimension (instelling, schooljaar, ...) to the columns of a workbook"""
+    return {find_column(df, PREDICTION_COLUMNS[dim]): selected for dim, selected in selection.items()}
+
+
+def prediction_total(df_pred, selection):
+    """Total of one prediction workbook under the filters: Individual_ratio (fallback: Aantal_studenten)
+
+    Returns:
+        tuple: (column used or None, total)
+    """
+    df_filtered = filter_on_string_values(df_pred, _prediction_filters(df_pred, selection))
+    if df_filtered.empty:
+        return None, 0
+    r_col = find_column(df_filtered, PREDICTION_COLUMNS['sum_ratio'])
+    if r_col is None:
+        r_col = find_column(df_filtered, PREDICTION_COLUMNS['sum_aantal'])
+    return r_col, (df_filtered[r_col].sum() if r_col else 0)
+
+
+def weekly_prediction_totals(week_frames, selection):
+    """Totals per week for the weekly chart, from the raw prediction workbooks
+
+    Args:
+        week_frames: List of (week, pandas.DataFrame)
+        selection: Dict dimension -> selected values
+
+    Returns:
+        tuple: (dict week -> Individual_ratio total (fallback: Aantal_studenten),
+                dict week -> Individual_mean total)
+    """
+    weekly_totals_ratio = {}
+    weekly_totals_mean = {}
+    for week, df_w in week_frames:
+        df_filt = filter_on_string_values(df_w, _prediction_filters(df_w, selection))
+        if df_filt.empty:
+            continue
+        # Individual_ratio voor verwacht totaal
+        r_col = find_column(df_filt, PREDICTION_COLUMNS['sum_ratio'])
+        if r_col is None:
+            r_col = find_column(df_filt, PREDICTION_COLUMNS['sum_aantal'])
+        if r_col:
+            weekly_totals_ratio[week] = weekly_totals_ratio.get(week, 0) + df_filt[r_col].sum()
+        # Individual_mean voor tweede kolom
+        m_col = find_column(df_filt, PREDICTION_COLUMNS['sum_mean'])
+        if m_col:
+            weekly_totals_mean[week] = weekly_totals_mean.get(week, 0) + df_filt[m_col].sum()
+    return weekly_totals_ratio, weekly_totals_mean
+
+
+def history_per_schooljaar(df_hist, filters, schooljaar_col, aantal_col):
+    """Sum of aantal per schooljaar from inschrijvingen_summary under the filters
+
+    Returns:
+        dict schooljaar -> total
+    """
+    df_filtered = filter_on_string_values(df_hist, filters)
+    if df_filtered.empty:
+        return {}
+    return df_filtered.groupby(schooljaar_col)[aantal_col].sum().to_dict()
+
+
+def cumulative_per_year(df, jaar_col, academic_week_col, week_col, aantal_col):
+    """Cumulative aantal per jaar over schooljaar week 1-52, as the line chart of Prognose inschrijvingen
+
+    Returns:
+        pandas.DataFrame with index 1-52 and one column per jaar (None if there is no data)
+    """
+    df_cumulative = df[(df[academic_week_col] >= 1) & (df[academic_week_col] <= 52)].copy()
+    if len(df_cumulative) == 0:
+        return None
+    if week_col:
+        weekly_by_year = df_cumulative.groupby([jaar_col, academic_week_col, week_col])[aantal_col].sum().reset_index()
+        weekly_by_year = weekly_by_year.groupby([jaar_col, academic_week_col]).agg({
+            aantal_col: 'sum',
+            week_col: 'first'
+        }).reset_index()
+    else:
+        weekly_by_year = df_cumulative.groupby([jaar_col, academic_week_col])[aantal_col].sum().reset_index()
+    weekly_by_year = weekly_by_year.sort_values([jaar_col, academic_week_col])
+    cumulative_data = []
+    for jaar in weekly_by_year[jaar_col].unique():
+        jaar_data = weekly_by_year[weekly_by_year[jaar_col] == jaar].copy()
+        jaar_data = jaar_data.sort_values(academic_week_col)
+        jaar_data['cumulatief'] = jaar_data[aantal_col].cumsum()
+        cumulative_data.append(jaar_data[[academic_week_col, 'cumulatief', jaar_col]])
+    if not cumulative_data:
+        return None
+    df_cumulative_combined = pd.concat(cumulative_data, ignore_index=True)
+    df_cumulative_pivot = df_cumulative_combined.pivot_table(
+        index=academic_week_col, columns=jaar_col, values='cumulatief', aggfunc='sum'
+    )
+    df_cumulative_pivot = df_cumulative_pivot.reindex(pd.RangeIndex(start=1, stop=53, step=1))
+    return df_cumulative_pivot.ffill().fillna(0)
@@ -0,0 +1,314 @@
+"""
+Rapportage per instelling
+
+Maakt voor elke instelling (instellingserkenningscode) een statisch
+HTML-rapport met de KPI's en grafieken van de pagina's Instroomprognose en
+Beschrijving aanmeldingen. De data wordt één keer als Arrow-bestanden
+weggeschreven; elke worker in de process pool opent die via memory mapping
+(gedeelde pagina's, geen kopie per proces) en rekent alleen de rijen van zijn
+instelling door. Het aantal rapporten per seconde schaalt zo met het aantal
+cores.
+
+Verwachte kolommen (de pagina levert ze onder deze namen aan):
+- prognose: jaar, week, instelling, sum_ratio, sum_mean, sum_aantal
+  (feitentabel van de prognose store);
+- historie: instelling, schooljaar, aantal (inschrijvingen_summary);
+- aanmeldingen: instelling, caketenid, status, schooljaar, week.
+"""
+import html
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pyarrow as pa
+
+from backend.aggregations import count_unique_per_group, cumulative_per_group, pivot_sum
+from backend.config import REPORT_WORKERS
+from backend.prognosis_store import snapshot_total, weekly_prediction_totals
+from backend.weeks import get_best_week_for_oct1, sort_weeks_with_oct1_first
+
+# Volgorde in de gestapelde statusgrafiek (van onder naar boven), zoals op Beschrijving aanmeldingen
+STATUS_ORDER = ['Offered', 'Received', 'Submitted', 'Created', 'Rejected', 'Withdrawn', 'Enrolled']
+
+_SHARED = {}  # in elke worker: naam -> pyarrow.Table (memory mapped), 'weeks' -> {jaar: [weken]}
+
+
+def _schooljaar_eindjaar(value):
+    """2023 / 2023.0 / '2023' -> 2023, '2022-2023' -> 2023 (eindjaar), anders None"""
+    if pd.isna(value):
+        return None
+    s = str(value).strip()
+    if '-' in s:
+        try:
+            return int(s.split('-')[-1])
+        except (ValueError, IndexError):
+            pass
+    try:
+        return int(float(s))
+    except (ValueError, TypeError):
+        return None
+
+
+def _init_worker(paths, prediction_weeks):
+    _SHARED.clear()
+    for name, path in paths.items():
+        _SHARED[name] = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    _SHARED['weeks'] = prediction_weeks
+
+
+def _rows(name, positions):
+    """The rows of one instelling of a shared table as a (small) DataFrame"""
+    table = _SHARED.get(name)
+    if table is None or positions is None or len(positions) == 0:
+        return pd.DataFrame()
+    return table.take(pa.array(positions)).to_pandas()
+
+
+def _prognosis_section(facts, history):
+    """KPI's en grafieken van de Instroomprognose voor één instelling"""
+    kpis, figures = [], []
+    history_per_year = {}
+    if not history.empty:
+        years = history['schooljaar'].map(_schooljaar_eindjaar)
+        totals = pd.to_numeric(history['aantal'], errors='coerce').groupby(years).sum()
+        history_per_year = {int(year): int(total) for year, total in totals.items()}
+
+    yearly_totals = dict(history_per_year)
+    year_types = dict.fromkeys(history_per_year, 'historisch')
+    weekly_charts = []
+    for jaar, weeks in sorted(_SHARED['weeks'].items()):
+        facts_jaar = facts[facts['jaar'] == jaar] if not facts.empty else facts
+        best_week = get_best_week_for_oct1(weeks, jaar)
+        totaal_prognose = 0
+        if best_week is not None and not facts_jaar.empty:
+            snapshot = facts_jaar[facts_jaar['week'] == best_week]
+            totaal_prognose = int(snapshot_total(snapshot)[1])
+        if totaal_prognose > 0:
+            yearly_totals[jaar] = totaal_prognose
+            year_types[jaar] = 'prognose'
+
+        totaal_vorig_jaar = history_per_year.get(jaar - 1, 0)
+        delta = None
+        if totaal_vorig_jaar > 0:
+            pct = ((totaal_prognose - totaal_vorig_jaar) / totaal_vorig_jaar) * 100
+            if pct > 0:
+                delta = f"{pct:,.1f}% meer t.o.v. {jaar - 1}"
+            elif pct < 0:
+                delta = f"{abs(pct):,.1f}% minder t.o.v. {jaar - 1}"
+            else:
+                delta = f"0% t.o.v. {jaar - 1}"
+        kpis.append((f"Studentprognose voor {jaar}", f"{totaal_prognose:,}", delta))
+
+        if facts_jaar.empty:
+            continue
+        weekly_totals = weekly_prediction_totals(facts_jaar)[0]
+        if not weekly_totals:
+            continue
+        weeks_sorted = sort_weeks_with_oct1_first(list(weekly_totals.keys()), jaar)
+        values_sorted = [weekly_totals[w] for w in weeks_sorted]
+        fig_week = go.Figure(go.Bar(x=[f"Week {w}" for w in weeks_sorted], y=values_sorted, marker_color='#EF553B'))
+        fig_week.update_layout(
+            title=f"Verwacht totaal aantal studenten {jaar} - per week",
+            xaxis_title='Week', yaxis_title='Aantal studenten', xaxis=dict(tickangle=-45), height=450
+        )
+        week_meeste = weeks_sorted[values_sorted.index(max(values_sorted))]
+        weekly_charts.append((fig_week, [
+            ("Totaal aantal voorspeld tot nu toe", f"{totaal_prognose:,}", None),
+            ("Gemiddeld aantal voorspeld per week", f"{int(sum(values_sorted) / len(values_sorted)):,}", None),
+            ("Week met de meeste aanmeldingen", f"Week {week_meeste}", None),
+        ]))
+
+    if yearly_totals:
+        years = sorted(yearly_totals)
+        totals = [yearly_totals[y] for y in years]
+        fig = go.Figure(go.Bar(
+            x=[str(y) for y in years], y=totals,
+            marker_color=['#636EFA' if year_types.get(y) == 'historisch' else '#EF553B' for y in years],
+            text=[f"{t:,}" for t in totals], textposition='outside'
+        ))
+        fig.update_layout(
+            title="Ontwikkeling studentaantallen en prognose: Totaal",
+            xaxis_title='Schooljaar', yaxis_title='Aantal studenten', xaxis=dict(type='category'), height=450
+        )
+        figures.append((fig, [("Jaar met meeste studenten", str(years[totals.index(max(totals))]), None)]))
+    figures.extend(weekly_charts)
+    return kpis, figures
+
+
+def _applications_chart_data(applications):
+    """Unique aanmeldingen per schooljaar, week and status, with the running total per schooljaar and status
+
+    Returns:
+        pandas.DataFrame with schooljaar, week, status, aantal and cumulatief (None without rows)
+    """
+    df = applications.assign(week=pd.to_numeric(applications['week'], errors='coerce'))
+    df = df[df['week'].notna() & df['caketenid'].notna()]
+    if df.empty:
+        return None
+    chart_data = count_unique_per_group(df, ['schooljaar', 'week', 'status'], 'caketenid', 'aantal')
+    return cumulative_per_group(chart_data, ['schooljaar', 'status'], 'week', 'aantal', 'cumulatief')
+
+
+def _applications_section(applications):
+    """Cumulatieve statusgrafiek per schooljaar (Beschrijving aanmeldingen) voor één instelling"""
+    chart_data = _applications_chart_data(applications)
+    if chart_data is None:
+        return [], []
+
+    order = {status.lower(): i for i, status in enumerate(STATUS_ORDER)}
+    figures = []
+    for schooljaar, jaar_data in chart_data.groupby('schooljaar', sort=True):
+        pivot = pivot_sum(jaar_data, 'week', 'status', 'cumulatief')
+        statuses = sorted(pivot.columns, key=lambda s: (0, order[str(s).lower()]) if str(s).lower() in order else (1, str(s)))
+        fig = go.Figure()
+        for status in statuses:
+            fig.add_trace(go.Scatter(
+                x=[f"Week {int(w)}" for w in pivot.index], y=pivot[status], mode='lines', name=str(status),
+                stackgroup='one', line=dict(width=0.5)
+            ))
+        fig.update_layout(
+            title=f'Status per aanmelding over tijd - schooljaar {schooljaar}',
+            xaxis_title='Week', yaxis_title='Cumulatief aantal aanmeldingen', height=450, hovermode='x unified'
+        )
+        figures.append((fig, [("Totaal aanmeldingen", f"{int(jaar_data['aantal'].sum()):,}", None)]))
+    kpis = [
+        ("Totaal aanmeldingen", f"{int(chart_data['aantal'].sum()):,}", None),
+        ("Aantal statussen", f"{chart_data['status'].nunique()}", None),
+        ("Aantal weken", f"{chart_data['week'].nunique()}", None),
+    ]
+    return kpis, figures
+
+
+def _kpi_html(kpis):
+    cards = "".join(
+        f"<div class='kpi'><div class='label'>{html.escape(label)}</div><div class='value'>{html.escape(value)}</div>"
+        + (f"<div class='delta'>{html.escape(delta)}</div>" if delta else "") + "</div>"
+        for label, value, delta in kpis
+    )
+    return f"<div class='kpis'>{cards}</div>" if cards else ""
+
+
+def _render_html(instelling, sections):
+    parts = []
+    include_plotlyjs = True  # plotly.js één keer in het bestand: het rapport werkt offline
+    for title, (kpis, figures) in sections:
+        if not kpis and not figures:
+            continue
+        parts.append(f"<h2>{html.escape(title)}</h2>{_kpi_html(kpis)}")
+        for fig, fig_kpis in figures:
+            parts.append(fig.to_html(full_html=False, include_plotlyjs=include_plotlyjs))
+            parts.append(_kpi_html(fig_kpis))
+            include_plotlyjs = False
+    body = "".join(parts) or "<p>Geen gegevens voor deze instelling.</p>"
+    return (
+        "<!DOCTYPE html><html lang='nl'><head><meta charset='utf-8'>"
+        f"<title>Rapportage {html.escape(instelling)}</title><style>"
+        "body{font-family:sans-serif;margin:2em;} .kpis{display:flex;gap:1em;flex-wrap:wrap;margin:1em 0;}"
+        ".kpi{border:1px solid #ddd;border-radius:6px;padding:.6em 1em;} .label{color:#666;font-size:.9em;}"
+        ".value{font-size:1.6em;} .delta{color:#444;font-size:.85em;}</style></head><body>"
+        f"<h1>Rapportage instelling {html.escape(instelling)}</h1>"
+        f"<p>Gemaakt op {time.strftime('%d-%m-%Y %H:%M')}</p>{body}</body></html>"
+    )
+
+
+def report_file_name(instelling):
+    """File name of the report of an instelling"""
+    return re.sub(r'[^\w.-]', '_', instelling) + '.html'
+
+
+def _write_report(instelling, positions, output_dir):
+    facts = _rows('facts', positions.get('facts'))
+    history = _rows('history', positions.get('history'))
+    applications = _rows('applications', positions.get('applications'))
+    sections = [('Instroomprognose', _prognosis_section(facts, history))]
+    if not applications.empty:
+        sections.append(('Beschrijving aanmeldingen', _applications_section(applications)))
+    path = os.path.join(output_dir, report_file_name(instelling))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(_render_html(instelling, sections))
+    return path
+
+
+def generate_reports(output_dir, facts=None, history=None, applications=None, instellingen=None,
+                     max_workers=REPORT_WORKERS, progress=None):
+    """Write a self-contained HTML report per instelling, in parallel
+
+    Args:
+        output_dir: Directory for the reports (created if needed)
+        facts: Prognosis fact table (jaar, week, instelling, sum_ratio, sum_mean, sum_aantal) or None
+        history: Historical totals (instelling, schooljaar, aantal) or None
+        applications: Applications (instelling, caketenid, status, schooljaar, week) or None
+        instellingen: Instellingen to report on (default: all that occur in the data)
+        max_workers: Number of worker processes (1: in this process)
+        progress: Optional callable(done, total), called as reports are finished
+
+    Returns:
+        list of paths of the written reports
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    frames = {
+        name: df[df['instelling'].notna()].assign(instelling=lambda d: d['instelling'].astype(str)).reset_index(drop=True)
+        for name, df in (('facts', facts), ('history', history), ('applications', applications))
+        if df is not None and not df.empty
+    }
+    prediction_weeks = {}
+    if 'facts' in frames:
+        weeks = frames['facts'].groupby('jaar')['week'].unique()
+        prediction_weeks = {int(jaar): sorted(int(w) for w in w_list) for jaar, w_list in weeks.items()}
+    if instellingen is None:
+        instellingen = sorted(set().union(*(df['instelling'].unique() for df in frames.values()))) if frames else []
+    instellingen = [str(i) for i in instellingen]
+    # Rijnummers per instelling: een taak krijgt alleen deze (kleine) arrays mee
+    group_positions = {
+        name: {key: np.asarray(rows) for key, rows in df.groupby('instelling', observed=True).indices.items()}
+        for name, df in frames.items()
+    }
+
+    work_dir = tempfile.mkdtemp(prefix='reports-', dir=output_dir)
+    try:
+        paths = {}
+        for name, df in frames.items():
+            paths[name] = os.path.join(work_dir, f"{name}.arrow")
+            with pa.OSFile(paths[name], 'wb') as sink:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+        tasks = [
+            (instelling, {name: positions.get(instelling) for name, positions in group_positions.items()})
+            for instelling in instellingen
+        ]
+        written = []
+        if max_workers <= 1:
+            _init_worker(paths, prediction_weeks)
+            try:
+                for instelling, positions in tasks:
+                    written.append(_write_report(instelling, positions, output_dir))
+                    if progress:
+                        progress(len(written), len(tasks))
+            finally:
+                _SHARED.clear()
+            return written
+
+        # spawn: veilig vanuit een proces met threads (de Streamlit server)
+        with ProcessPoolExecutor(
+            max_workers=min(max_workers, max(len(tasks), 1)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(paths, prediction_weeks),
+        ) as executor:
+            futures = [executor.submit(_write_report, instelling, positions, output_dir) for instelling, positions in tasks]
+            for future in as_completed(futures):
+                written.append(future.result())
+                if progress:
+                    progress(len(written), len(tasks))
+        return sorted(written)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,212 @@
+"""
+Resultaatcache op schijf
+
+Aggregaten van de analysepagina's (grafiekdata, KPI-snapshots) worden op
+schijf bewaard, zodat ze een herstart van de server overleven. De sleutel
+bestaat uit:
+
+- een naamruimte per aggregaat (bijv. 'beschrijving.chart_data');
+- de content hashes van de gebruikte bestanden en de genormaliseerde
+  filterstand (volgorde van selecties en lege filters maken niet uit);
+- de codeversie: een hash over de broncode van de app, zodat een deploy met
+  andere rekenregels nooit oude resultaten teruggeeft.
+
+DataFrames worden als Parquet opgeslagen, overige resultaten met pickle (de
+map is alleen van de server). Als de cache groter wordt dan het maximum,
+worden de minst recent gebruikte resultaten verwijderd; het gebruik wordt
+bijgehouden via de mtime van de bestanden, zodat ook dat een herstart
+overleeft.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+import pandas as pd
+
+from backend.config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def compute_code_version(root=SRC_DIR):
+    """Hash over the Python sources of the app (backend and pages)"""
+    digest = hashlib.blake2b(digest_size=8)
+    for directory, dirnames, filenames in sorted(os.walk(root)):
+        dirnames.sort()
+        for file_name in sorted(filenames):
+            if file_name.endswith('.py'):
+                path = os.path.join(directory, file_name)
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def normalise_selection(selections):
+    """Normalise a filter state: empty filters dropped, selected values sorted (as strings)
+
+    Args:
+        selections: Dict filter name -> selected values
+
+    Returns:
+        tuple of (filter name, tuple of values), sorted on filter name
+    """
+    return tuple(sorted(
+        (str(name), tuple(sorted(str(value) for value in selected)))
+        for name, selected in selections.items() if selected
+    ))
+
+
+class ResultCache:
+    """Disk-backed cache of aggregation results with size-based (LRU) eviction
+
+    Args:
+        root: Directory of the cache
+        max_bytes: Maximum total size of the cached results
+        code_version: Version that is part of every key (default: hash of the sources)
+    """
+
+    def __init__(self, root=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES, code_version=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.code_version = code_version or compute_code_version()
+        self._lock = threading.Lock()
+        self._entries = {}  # file name -> size
+        os.makedirs(root, exist_ok=True)
+        for entry in os.scandir(root):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                self._entries[entry.name] = entry.stat().st_size
+        self._size = sum(self._entries.values())
+
+    def _key(self, namespace, key):
+        payload = json.dumps([namespace, self.code_version, key], default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def _read(self, file_name):
+        path = os.path.join(self.root, file_name)
+        if file_name.endswith('.parquet'):
+            value = pd.read_parquet(path)
+        else:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        os.utime(path)  # laatst gebruikt
+        return value
+
+    def get(self, namespace, key):
+        """Return (True, result) on a hit, (False, None) on a miss"""
+        digest = self._key(namespace, key)
+        for file_name in (digest + '.parquet', digest + '.pkl'):
+            with self._lock:
+                known = file_name in self._entries
+            if not known:
+                # Mogelijk door een ander serverproces op dezelfde map weggeschreven
+                try:
+                    size = os.path.getsize(os.path.join(self.root, file_name))
+                except OSError:
+                    continue
+                with self._lock:
+                    if file_name not in self._entries:
+                        self._entries[file_name] = size
+                        self._size += size
+            try:
+                return True, self._read(file_name)
+            except Exception:
+                self._remove(file_name)  # onleesbaar: opnieuw berekenen
+        return False, None
+
+    def put(self, namespace, key, value):
+        """Store a result (DataFrame or picklable value)"""
+        digest = self._key(namespace, key)
+        if isinstance(value, pd.DataFrame):
+            file_name = digest + '.parquet'
+        else:
+            file_name = digest + '.pkl'
+        path = os.path.join(self.root, file_name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            if isinstance(value, pd.DataFrame):
+                value.to_parquet(tmp_path)
+            else:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            # Niet op te slaan (bijv. gemengde types voor Parquet): alleen niet cachen
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        size = os.path.getsize(path)
+        with self._lock:
+            self._size += size - self._entries.get(file_name, 0)
+            self._entries[file_name] = size
+        self._evict()
+
+    def get_or_compute(self, namespace, key, compute):
+        """Return the cached result, or compute() it and store it
+
+        Args:
+            namespace: Name of the aggregate (e.g. 'beschrijving.chart_data')
+            key: JSON-able key: file hashes, normalised filter state, parameters
+            compute: Callable returning the result
+
+        Returns:
+            The result of compute() (from disk when cached)
+        """
+        hit, value = self.get(namespace, key)
+        if hit:
+            return value
+        value = compute()
+        if value is not None:
+            self.put(namespace, key, value)
+        return value
+
+    def _remove(self, file_name):
+        with self._lock:
+            self._size -= self._entries.pop(file_name, 0)
+        try:
+            os.remove(os.path.join(self.root, file_name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return
+            names = list(self._entries)
+        # Minst recent gebruikt eerst, tot 90% van het maximum
+        def last_used(file_name):
+            try:
+                return os.path.getmtime(os.path.join(self.root, file_name))
+            except OSError:
+                return 0
+        for file_name in sorted(names, key=last_used):
+            if self._size <= self.max_bytes * 0.9:
+                break
+            self._remove(file_name)
+
+    @property
+    def size(self):
+        """Total size of the cached results in bytes"""
+        return self._size
+
+    def clear(self):
+        """Remove all cached results"""
+        with self._lock:
+            names = list(self._entries)
+        for file_name in names:
+            self._remove(file_name)
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_result_cache():
+    """Return the process-wide result cache"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResultCache()
+        return _CACHE
@@ -0,0 +1,143 @@
+"""
+Opslaglaag voor bestanden op de server
+
+Bestanden die al op schijf staan (data directory, tijdelijke kopie van een
+upload) worden via een LocalFileHandle aangeboden. De handle gedraagt zich als
+een file-object, maar leest pas van schijf als er daadwerkelijk gelezen wordt,
+zodat de inhoud niet in het sessiegeheugen hoeft te staan.
+"""
+import hashlib
+import os
+import pickle
+import threading
+
+from backend.config import UPLOAD_DIR
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Tijdelijke kopieën van uploads, per bestandstype met een files_metadata.pkl (volgt INSTROOM_STORAGE_DIR)
+TEMP_UPLOAD_DIR = UPLOAD_DIR
+
+_FILE_HASHES = {}  # file_path -> ((mtime_ns, size), hash)
+_FILE_HASHES_LOCK = threading.Lock()
+
+
+def compute_file_hash(file_path):
+    """Compute the content hash of a file on disk
+
+    The hash is remembered per path until the file's mtime or size changes, so
+    new handles on the same file don't read it again.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        str: Hex digest of the file content
+    """
+    stat = os.stat(file_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _FILE_HASHES_LOCK:
+        known = _FILE_HASHES.get(file_path)
+    if known is not None and known[0] == version:
+        return known[1]
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    file_hash = digest.hexdigest()
+    with _FILE_HASHES_LOCK:
+        _FILE_HASHES[file_path] = (version, file_hash)
+    return file_hash
+
+
+def compute_buffer_hash(buffer):
+    """Compute the content hash of an in-memory buffer (bytes or memoryview)"""
+    return hashlib.blake2b(buffer, digest_size=16).hexdigest()
+
+
+class LocalFileHandle:
+    """File-like handle on a file on the server's disk, read on demand
+
+    Args:
+        file_path: Path to the file
+        file_name: Display name (default: basename of file_path)
+        file_size: Size in bytes (default: size on disk)
+        file_hash: Content hash, if already known
+        source: Where the file comes from ('data_directory' or 'temp')
+    """
+
+    def __init__(self, file_path, file_name=None, file_size=None, file_hash=None, source='temp'):
+        self.file_path = file_path
+        self.name = file_name or os.path.basename(file_path)
+        self.size = file_size if file_size is not None else os.path.getsize(file_path)
+        self.file_hash = file_hash
+        self.source = source
+        self._file = None
+
+    def _handle(self):
+        if self._file is None or self._file.closed:
+            self._file = open(self.file_path, 'rb')
+        return self._file
+
+    def read(self, size=-1):
+        return self._handle().read(size)
+
+    def readline(self):
+        return self._handle().readline()
+
+    def seek(self, offset, whence=0):
+        """Seek to a position in the file
+
+        Args:
+            offset: Offset to seek to
+            whence: 0 = from start, 1 = from current position, 2 = from end
+        """
+        return self._handle().seek(offset, whence)
+
+    def tell(self):
+        return self._handle().tell()
+
+    def seekable(self):
+        """Return True if the file is seekable"""
+        return True
+
+    def getbuffer(self):
+        """Return the full content (reads the whole file from disk)"""
+        with open(self.file_path, 'rb') as f:
+            return f.read()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self):
+        # Open file objects can't be pickled (st.session_state, caches)
+        state = self.__dict__.copy()
+        state['_file'] = None
+        return state
+
+
+def list_temp_files(file_type=None):
+    """List the persisted uploads (temp copies) that still exist
+
+    Args:
+        file_type: 'beschrijving', 'prognose', or None (all types)
+
+    Returns:
+        list: List of (temp_file_path, metadata) tuples
+    """
+    valid_files = []
+    for ftype in [file_type] if file_type else ['beschrijving', 'prognose']:
+        metadata_path = os.path.join(TEMP_UPLOAD_DIR, ftype, 'files_metadata.pkl')
+        if not os.path.exists(metadata_path):
+            continue
+        try:
+            with open(metadata_path, 'rb') as f:
+                all_metadata = pickle.load(f)
+        except Exception:
+            continue
+        for metadata in all_metadata:
+            temp_file_path = metadata.get('temp_path')
+            if temp_file_path and os.path.exists(temp_file_path):
+                valid_files.append((temp_file_path, metadata))
+    return valid_files
@@ -0,0 +1,97 @@
+"""
+Union van meerdere uploads als één dataset
+
+CAMBO exports komen als één bestand per schooljaar. Een UnionDataset houdt
+per bestand een Arrow tabel vast en koppelt die zonder kopie aan elkaar
+(de chunks van de tabellen worden hergebruikt). Aanmeldingen (caketenid) die
+al in een eerder toegevoegd bestand voorkomen, worden uit latere bestanden
+weggelaten, zodat overlappende exports niet dubbel geteld worden.
+
+Ook het DataFrame voor de pagina's blijft Arrow-backed (pd.ArrowDtype): de
+kolommen wijzen naar dezelfde buffers als de Arrow chunks, zodat de union
+niet nog een keer als numpy kolommen in het geheugen staat.
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def find_column_name(column_names, possible_names):
+    """Find column name from possible variations (case-insensitive)"""
+    cols_lower = {str(col).lower(): col for col in column_names}
+    for name in possible_names:
+        if name.lower() in cols_lower:
+            return cols_lower[name.lower()]
+    return None
+
+
+class UnionDataset:
+    """Chunked, Arrow-backed union of several uploaded files
+
+    Args:
+        id_candidates: Possible names of the identifier column used for
+            deduplication across files (e.g. ['caketenid']). None disables
+            deduplication.
+    """
+
+    def __init__(self, id_candidates=None):
+        self.id_candidates = id_candidates
+        self._tables = []  # list of (file_name, pyarrow.Table)
+        self._seen_ids = None  # pyarrow.Array with ids of earlier files
+        self.duplicate_rows = 0
+
+    def add_table(self, file_name, table):
+        """Add a pyarrow.Table, dropping rows whose id occurs in an earlier file"""
+        id_col = find_column_name(table.column_names, self.id_candidates) if self.id_candidates else None
+        if id_col is not None:
+            ids = table[id_col]
+            if self._seen_ids is not None and len(self._seen_ids) > 0:
+                overlap = self._overlap(ids)
+                n_overlap = pc.sum(overlap).as_py() or 0
+                if n_overlap:
+                    self.duplicate_rows += n_overlap
+                    table = table.filter(pc.invert(overlap))
+                    ids = table[id_col]
+            new_ids = self._distinct(ids)
+            self._seen_ids = new_ids if self._seen_ids is None else pa.concat_arrays([self._seen_ids, new_ids])
+        self._tables.append((file_name, table))
+
+    def _overlap(self, ids):
+        """Bool ChunkedArray: ids that occur in an earlier file (compared on their string value)
+
+        For encoded identifiers (Arrow dictionary, see identifiers) only the
+        dictionary is looked up; the rows take the result by their index.
+        """
+        chunks = []
+        for chunk in ids.chunks:
+            if pa.types.is_dictionary(chunk.type):
+                member = pc.is_in(chunk.dictionary.cast(pa.string()), value_set=self._seen_ids)
+                chunks.append(pc.take(member, chunk.indices))
+            else:
+                chunks.append(pc.is_in(chunk.cast(pa.string()), value_set=self._seen_ids))
+        return pc.fill_null(pa.chunked_array(chunks, pa.bool_()), False)
+
+    @staticmethod
+    def _distinct(ids):
+        """Distinct non-null ids as a string array"""
+        chunks = []
+        for chunk in ids.chunks:
+            if pa.types.is_dictionary(chunk.type):
+                chunk = chunk.dictionary.take(pc.unique(chunk.indices).drop_null())
+            chunks.append(chunk.cast(pa.string()))
+        return pc.unique(pa.chunked_array(chunks, pa.string())).drop_null()
+
+    def add_dataframe(self, file_name, df):
+        """Convert a pandas DataFrame to Arrow and add it"""
+        self.add_table(file_name, pa.Table.from_pandas(df, preserve_index=False))
+
+    def to_table(self):
+        """Return the union as one pyarrow.Table (zero-copy concatenation of the chunks)"""
+        if not self._tables:
+            return pa.table({})
+        return pa.concat_tables([table for _, table in self._tables], promote_options='permissive')
+
+    def to_pandas(self):
+        """Return the union as pandas DataFrame over the Arrow buffers (no copy of the data)"""
+        # Gecodeerde identifiers (Arrow dictionary) worden weer categorisch
+        return self.to_table().to_pandas(types_mapper=lambda t: None if pa.types.is_dictionary(t) else pd.ArrowDtype(t))
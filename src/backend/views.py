@@ -0,0 +1,283 @@
+"""
+Aggregaten achter de analysepagina's
+
+De grafiekdata van Beschrijving aanmeldingen en de KPI's van Instroomprognose
+(1 oktober snapshot, historie per schooljaar) worden hier berekend en in de
+resultaatcache bewaard. De pagina's roepen deze functies aan met de
+filterstand van de sessie; de warm-up (zie warmup) roept ze bij het starten
+van de server aan zonder filters. Beide gebruiken zo dezelfde naamruimte en
+sleutel, zodat de standaardweergave van elke dataset na een deploy al onder
+de nieuwe codeversie in de cache staat.
+
+Sleutels bevatten de content hashes van de bestanden in een vaste volgorde,
+zodat ze niet afhangen van de volgorde waarin een sessie de bestanden ziet.
+"""
+import pandas as pd
+
+from backend.aggregations import count_unique_per_group, sum_column, sum_per_group
+from backend.config import HLL_PRECISION
+from backend.hll import estimate_per_group
+from backend.prognosis_store import PREDICTION_COLUMNS, apply_selection, find_column, snapshot_total
+from backend.result_cache import get_result_cache, normalise_selection
+from backend.weeks import get_best_week_for_oct1
+
+CAKETENID_COLS = ['caketenid', 'caketen_id', 'caketen', 'ketenid', 'keten_id']
+# Kolommen van een aanmeldingenbestand (Beschrijving aanmeldingen), eerste gevonden naam telt
+BESCHRIJVING_COLUMNS = {
+    'caketenid': CAKETENID_COLS,
+    'status': ['status', 'aanmelding_status', 'status_aanmelding'],
+    'week': ['week_of_year', 'week', 'weeknummer', 'weeknr', 'kalenderweek'],
+    'academic_week': ['academic_week', 'academicweek', 'academische_week', 'schooljaarweek'],
+    'schooljaar': ['schooljaar', 'school_jaar', 'jaar'],
+    'school': ['school', 'instelling', 'schoolnaam'],
+    'brin': ['instellingserkenningscode', 'brin', 'erkenningscode'],
+    'leerweg': ['leertrajectmbo', 'leerweg', 'leertraject'],
+    'opleidingcode': ['opleidingcode', 'opleiding_code', 'code'],
+    'opleidingsnaam': ['opleidingsnaam', 'opleiding_naam', 'opleidingnaam', 'naam'],
+}
+# Kolommen van inschrijvingen_summary (Instroomprognose), met dezelfde dimensies als de prognose store
+HISTORY_COLUMNS = {
+    'instelling': PREDICTION_COLUMNS['instelling'],
+    'schooljaar': PREDICTION_COLUMNS['schooljaar'],
+    'leerweg': PREDICTION_COLUMNS['leerweg'],
+    'opleiding': PREDICTION_COLUMNS['opleiding'],
+    'aantal': ['aantal', 'anaal', 'aantal_voorspeld', 'count'],
+}
+
+
+def is_inschrijvingen_summary(filename):
+    """Check if filename matches inschrijvingen_summary_* pattern"""
+    name_lower = filename.lower()
+    return name_lower.startswith('inschrijvingen_summary') and (name_lower.endswith('.csv') or name_lower.endswith('.xlsx') or name_lower.endswith('.xls'))
+
+
+def find_beschrijving_columns(df):
+    """Find the columns of an aanmeldingen file (see BESCHRIJVING_COLUMNS)
+
+    Returns:
+        dict name -> column name (None if not found)
+    """
+    return {name: find_column(df, candidates) for name, candidates in BESCHRIJVING_COLUMNS.items()}
+
+
+def has_chart_columns(columns):
+    """Return True if the status chart can be drawn: caketenid, status and a week column"""
+    return bool(columns['caketenid'] and columns['status'] and (columns['week'] or columns['academic_week']))
+
+
+def add_week_columns(df_chart, columns):
+    """Add _week and _academic_week (None when the file lacks that week column) in place"""
+    week_col, academic_week_col = columns['week'], columns['academic_week']
+    if week_col and academic_week_col:
+        # Both available - use both
+        df_chart['_week'] = df_chart[week_col]
+        df_chart['_academic_week'] = df_chart[academic_week_col]
+    elif week_col:
+        # Only calendar week available
+        df_chart['_week'] = df_chart[week_col]
+        df_chart['_academic_week'] = None
+    elif academic_week_col:
+        # Only academic week available
+        df_chart['_week'] = None
+        df_chart['_academic_week'] = df_chart[academic_week_col]
+    return df_chart
+
+
+def chart_grouping_columns(df_chart, columns):
+    """Columns of the status chart: schooljaar, week (schooljaar week first) and status"""
+    grouping_cols = []
+    if columns['schooljaar']:
+        grouping_cols.append(columns['schooljaar'])
+    if '_academic_week' in df_chart.columns:
+        grouping_cols.append('_academic_week')
+    elif '_week' in df_chart.columns:
+        grouping_cols.append('_week')
+    grouping_cols.append(columns['status'])
+    return grouping_cols
+
+
+def chart_sketch_source(df_chart, columns, selections):
+    """Rows for the HyperLogLog sketch of the status chart
+
+    The sketch is kept at the level of the chart (schooljaar, week, status)
+    plus only the filter columns with a selection: without filters it stays
+    small (at most 2^precision registers per chart group).
+
+    Args:
+        df_chart: Unfiltered rows of the file(s)
+        columns: Result of find_beschrijving_columns()
+        selections: Dict column -> selected values
+
+    Returns:
+        tuple: (DataFrame with the dimensions and caketenid, list of dimension columns)
+    """
+    sketch_week_col = columns['academic_week'] or columns['week']
+    sketch_dims = [columns['schooljaar'], columns['status']] + [
+        col for col, selected in selections.items() if col in df_chart.columns and selected
+    ]
+    sketch_dims = [c for c in dict.fromkeys(sketch_dims) if c]
+    sketch_source = df_chart[sketch_dims + [columns['caketenid']]].copy()
+    if sketch_week_col:
+        sketch_week = '_academic_week' if columns['academic_week'] else '_week'
+        sketch_source[sketch_week] = df_chart[sketch_week_col]
+        sketch_dims.append(sketch_week)
+    return sketch_source, sketch_dims
+
+
+def _apply_selections(frame, selections):
+    for col, selected in selections.items():
+        if selected and col in frame.columns:
+            frame = frame[frame[col].isin(selected)]
+    return frame
+
+
+def get_chart_data(files_key, df_chart, columns, selections, sketch=None, precision=HLL_PRECISION):
+    """Unique aanmeldingen (caketenid) per schooljaar, week and status, via the result cache
+
+    Args:
+        files_key: Content hashes of the selected files
+        df_chart: Filtered rows with the columns of add_week_columns()
+        columns: Result of find_beschrijving_columns()
+        selections: Dict column -> selected values (the filters applied to df_chart)
+        sketch: HyperLogLog sketch of chart_sketch_source() for an approximate count, or None
+        precision: Precision of the sketch
+
+    Returns:
+        pandas.DataFrame with the grouping columns and aantal_aanmeldingen
+    """
+    grouping_cols = chart_grouping_columns(df_chart, columns)
+    caketenid_col = columns['caketenid']
+    use_sketch = sketch is not None and all(c in sketch.columns for c in grouping_cols)
+
+    def compute():
+        if use_sketch:
+            # Benaderend: sketches van de geselecteerde groepen samenvoegen
+            return estimate_per_group(
+                _apply_selections(sketch, selections), grouping_cols, 'aantal_aanmeldingen', precision
+            )
+        elif caketenid_col:
+            return count_unique_per_group(df_chart, grouping_cols, caketenid_col, 'aantal_aanmeldingen')
+        else:
+            # Fallback: count rows if caketenid not available
+            return df_chart.groupby(grouping_cols).size().reset_index(name='aantal_aanmeldingen')
+
+    return get_result_cache().get_or_compute('beschrijving.chart_data', [
+        list(files_key),
+        grouping_cols, caketenid_col,
+        f"approximate-{precision}" if use_sketch else 'exact',
+        normalise_selection(selections),
+    ], compute)
+
+
+def get_oct1_snapshot(jaar, partitions, prediction_files, selections, store, read_week=None, fallback=None):
+    """Prognosis on 1 October for a prognosis year, via the result cache
+
+    Uses the week of 1 October (or the closest week before it) from the fact
+    table of the prognosis store; without week files in the store, fallback()
+    computes it from the file with the highest week.
+
+    Args:
+        jaar: Prognosis year
+        partitions: (jaar, week, file_hash) of the week files of the year in the store
+        prediction_files: (file_hash, week) of all week files of the year
+        selections: Dict dimension -> selected values (see apply_selection)
+        store: PrognosisStore
+        read_week: Callable week -> DataFrame of that week file, only for the columns when no measure is found
+        fallback: Callable returning the snapshot without the store (or None)
+
+    Returns:
+        dict (week, columns, rows, ratio_col, total) or None
+    """
+    partitions = sorted(tuple(partition) for partition in partitions)
+
+    def compute():
+        available_weeks = sorted({week for _, week, _ in partitions})
+        best_week = get_best_week_for_oct1(available_weeks, jaar) if available_weeks else None
+        if best_week is None:
+            return fallback() if fallback is not None else None
+        partition = next(key for key in partitions if key[1] == best_week)
+        facts = apply_selection(store.load([partition]), selections)
+        # Individual_ratio (fallback: Aantal_studenten)
+        r_col, total = snapshot_total(facts)
+        columns = None
+        if r_col is None and not facts.empty:
+            df_week = read_week(best_week) if read_week is not None else None  # alleen voor de melding
+            columns = list(df_week.columns) if df_week is not None else []
+        return {
+            'week': best_week,
+            'columns': columns,
+            'rows': len(facts),
+            'ratio_col': r_col,
+            'total': int(total),
+        }
+
+    return get_result_cache().get_or_compute('instroomprognose.oct1_snapshot', [
+        jaar, partitions, sorted(tuple(f) for f in prediction_files), normalise_selection(selections),
+    ], compute)
+
+
+def file_snapshot(df_pred, dimension_cols, selections):
+    """1 October snapshot from a single predictions_mbo file (no week files in the store)
+
+    Args:
+        df_pred: DataFrame of the file with the highest week
+        dimension_cols: Dict dimension -> column in the file (or None)
+        selections: Dict dimension -> selected values
+
+    Returns:
+        dict (week, columns, rows, ratio_col, total)
+    """
+    df_filtered = df_pred
+    for dim, col in dimension_cols.items():
+        if col and col in df_filtered.columns and selections.get(dim):
+            df_filtered = df_filtered[df_filtered[col].astype(str).isin(selections[dim])]
+    r_col = None
+    total = 0
+    if not df_filtered.empty:
+        r_col = find_column(df_filtered, PREDICTION_COLUMNS['sum_ratio'])
+        if r_col is None:
+            r_col = find_column(df_filtered, PREDICTION_COLUMNS['sum_aantal'])
+        if r_col:
+            total = int(sum_column(df_filtered, r_col))
+    return {
+        'week': None,
+        'columns': list(df_pred.columns),
+        'rows': len(df_filtered),
+        'ratio_col': r_col,
+        'total': total,
+    }
+
+
+def get_history_per_schooljaar(file_hashes, df_inschrijvingen, selections):
+    """Sum of aantal per schooljaar from inschrijvingen_summary, via the result cache
+
+    Args:
+        file_hashes: Content hashes of the inschrijvingen_summary files
+        df_inschrijvingen: The files combined
+        selections: Dict dimension -> selected values (instelling, schooljaar, leerweg, opleiding)
+
+    Returns:
+        DataFrame (schooljaar column, aantal column) or None without a (usable) inschrijvingen_summary
+    """
+    if df_inschrijvingen.empty:
+        return None
+    columns = {name: find_column(df_inschrijvingen, candidates) for name, candidates in HISTORY_COLUMNS.items()}
+    schooljaar_col, aantal_col = columns['schooljaar'], columns['aantal']
+    if not schooljaar_col or not aantal_col:
+        return None
+
+    def compute():
+        df_filtered = df_inschrijvingen
+        for dim in ['instelling', 'schooljaar', 'leerweg', 'opleiding']:
+            col = columns[dim]
+            if col and selections.get(dim):
+                df_filtered = df_filtered[df_filtered[col].astype(str).isin(selections[dim])]
+        if df_filtered.empty:
+            return pd.DataFrame({schooljaar_col: [], aantal_col: []})
+        return sum_per_group(df_filtered, [schooljaar_col], aantal_col)
+
+    return get_result_cache().get_or_compute('instroomprognose.history_per_schooljaar', [
+        sorted(file_hashes),
+        [columns['instelling'], schooljaar_col, columns['leerweg'], columns['opleiding'], aantal_col],
+        normalise_selection(selections),
+    ], compute)
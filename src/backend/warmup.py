@@ -0,0 +1,202 @@
+"""
+Warm-up bij het starten van de server
+
+Na een herstart of deploy zijn de caches koud: de eerste gebruiker wacht op
+het parsen van elk bestand, het bijwerken van de prognose store en het
+berekenen van de grafieken (de resultaatcache hangt aan de codeversie, dus een
+deploy begint altijd leeg). Daarom draait serve.py één keer een warm-up,
+voordat het de app-processen start:
+
+1. alle bewaarde uploads (tijdelijke kopieën) en de bestanden in de data
+   directories gaan naar de worker pool van ingestion (dialect, parsen,
+   kolomprofiel);
+2. elk predictions_mbo weekbestand dat nog niet in de prognose store staat
+   wordt samengevat;
+3. de standaardweergave (zonder filters) van de analysepagina's wordt
+   berekend en in de resultaatcache gezet onder de huidige codeversie (zie
+   views): de grafiekdata van elk aanmeldingenbestand, de 1 oktober snapshot
+   per prognosejaar en de historie per schooljaar.
+
+Daarna gaan de datasets uit het geheugen van serve.py naar de data plane (zie
+datasets.spill_datasets); de app-processen lezen ze daar via een memory map.
+De prognose store en de resultaatcache staan al op schijf.
+"""
+import time
+
+import pandas as pd
+
+from backend.config import DATA_DIRECTORIES, DISTINCT_COUNT_MODE, HLL_PRECISION, WARMUP_ON_START
+from backend.data_directory import get_watcher
+from backend.datasets import spill_datasets
+from backend.hll import build_sketch
+from backend.loading import load_dataset, submit_ingestion
+from backend.prognosis_store import get_prognosis_store, parse_prediction_mbo_filename, summarise_prediction
+from backend.storage import LocalFileHandle, list_temp_files
+from backend.views import (
+    add_week_columns, chart_sketch_source, find_beschrijving_columns, get_chart_data, get_history_per_schooljaar,
+    get_oct1_snapshot, has_chart_columns, is_inschrijvingen_summary
+)
+
+
+def list_persisted_files():
+    """List the files that are available without a session: temp uploads and data directory files
+
+    A data directory file with the same name as an upload is skipped, like in
+    the file overview of a session.
+
+    Returns:
+        list of (LocalFileHandle, file_type)
+    """
+    files = []
+    for temp_file_path, metadata in list_temp_files():
+        handle = LocalFileHandle(
+            temp_file_path, metadata['file_name'], metadata['file_size'], file_hash=metadata.get('file_hash'), source='temp'
+        )
+        files.append((handle, metadata.get('file_type')))
+    if DATA_DIRECTORIES:
+        known_names = {handle.name for handle, _ in files}
+        for meta in get_watcher().scan(force=True):
+            if meta['file_name'] not in known_names:
+                handle = LocalFileHandle(
+                    meta['file_path'], meta['file_name'], meta['file_size'],
+                    file_hash=meta['file_hash'], source='data_directory'
+                )
+                files.append((handle, meta['file_type']))
+    return files
+
+
+class Warmup:
+    """One warm-up run over the persisted files (see module docstring)"""
+
+    def __init__(self):
+        self.started = None
+        self.finished = None
+        self.files = 0
+        self.partitions = 0
+        self.views = 0
+        self.errors = []  # (file name, message)
+
+    def run(self):
+        self.started = time.time()
+        try:
+            files = list_persisted_files()
+            self.files = len(files)
+            jobs = [(handle, file_type, submit_ingestion(handle.file_path, handle.name, handle.file_hash, handle.source))
+                    for handle, file_type in files]
+
+            store = get_prognosis_store()
+            partitions = {}  # jaar -> list of (jaar, week, file_hash), van de prognosebestanden
+            for handle, file_type, job in jobs:
+                parsed = parse_prediction_mbo_filename(handle.name)
+                if parsed is None:
+                    continue
+                jaar, week = parsed
+                try:
+                    if store.has_partition(jaar, week, job.file_hash):
+                        store.read_partition(jaar, week, job.file_hash)
+                    else:
+                        df = load_dataset(handle, handle.name)
+                        if df is None or df.empty:
+                            continue
+                        store.append(jaar, week, job.file_hash, handle.name, summarise_prediction(df))
+                    self.partitions += 1
+                    if file_type == 'prognose':
+                        partitions.setdefault(jaar, []).append((jaar, week, job.file_hash))
+                except Exception as e:
+                    self.errors.append((handle.name, str(e)))
+
+            for handle, _, job in jobs:
+                job.future.result()
+                if job.error:
+                    self.errors.append((handle.name, job.error))
+
+            self._warm_views(jobs, store, partitions)
+        except Exception as e:
+            self.errors.append((None, str(e)))
+        finally:
+            self.finished = time.time()
+
+    def _warm_views(self, jobs, store, partitions):
+        """Put the unfiltered default views of the analysis pages in the result cache"""
+        readable = [(handle, file_type, job) for handle, file_type, job in jobs if not job.error]
+
+        # Beschrijving aanmeldingen: de grafiek van elk bestand afzonderlijk
+        for handle, file_type, job in readable:
+            if file_type != 'beschrijving':
+                continue
+            try:
+                df = load_dataset(handle, handle.name)
+                if df is not None and self._warm_chart_data((job.file_hash,), df):
+                    self.views += 1
+            except Exception as e:
+                self.errors.append((handle.name, str(e)))
+
+        # Instroomprognose: historie per schooljaar over alle inschrijvingen_summary bestanden
+        prognose_jobs = [(handle, job) for handle, file_type, job in jobs if file_type == 'prognose']
+        summaries = [(handle, job) for handle, job in prognose_jobs if is_inschrijvingen_summary(handle.name)]
+        frames = []
+        for handle, job in summaries:
+            if job.error:
+                continue
+            try:
+                df = load_dataset(handle, handle.name)
+            except Exception:
+                continue
+            if df is not None and not df.empty:
+                frames.append(df)
+        if frames:
+            history = get_history_per_schooljaar(
+                [job.file_hash for _, job in summaries], pd.concat(frames, ignore_index=True), {}
+            )
+            if history is not None:
+                self.views += 1
+
+        # Instroomprognose: 1 oktober snapshot per prognosejaar met weekbestanden in de store
+        weeks = {}  # (jaar, week) -> handles
+        prediction_files = {}  # jaar -> list of (file_hash, week)
+        for handle, job in prognose_jobs:
+            parsed = parse_prediction_mbo_filename(handle.name)
+            if parsed is not None:
+                weeks.setdefault(parsed, []).append(handle)
+                prediction_files.setdefault(parsed[0], []).append((job.file_hash, parsed[1]))
+        for jaar, jaar_partitions in partitions.items():
+            def read_week(week, jaar=jaar):
+                handles = weeks.get((jaar, week), [])
+                return load_dataset(handles[0], handles[0].name) if handles else None
+            try:
+                get_oct1_snapshot(jaar, jaar_partitions, prediction_files[jaar], {}, store, read_week=read_week)
+                self.views += 1
+            except Exception as e:
+                self.errors.append((None, str(e)))
+
+    @staticmethod
+    def _warm_chart_data(files_key, df):
+        """Status chart of one file without filters, with the default count method"""
+        columns = find_beschrijving_columns(df)
+        if not has_chart_columns(columns):
+            return False
+        needed = [columns[name] for name in ['schooljaar', 'status', 'caketenid', 'week', 'academic_week']]
+        df_chart = add_week_columns(df[[c for c in dict.fromkeys(needed) if c]].copy(), columns)
+        sketch = None
+        if DISTINCT_COUNT_MODE == 'approximate':
+            sketch_source, sketch_dims = chart_sketch_source(df_chart, columns, {})
+            sketch = build_sketch(sketch_source, columns['caketenid'], sketch_dims, HLL_PRECISION)
+        get_chart_data(files_key, df_chart, columns, {}, sketch)
+        return True
+
+
+def warm_up():
+    """Run the warm-up and move the parsed datasets to the data plane (see module docstring)
+
+    Called by serve.py before it starts the app processes; a no-op when
+    INSTROOM_WARMUP is off.
+
+    Returns:
+        Warmup, or None when the warm-up is disabled
+    """
+    if not WARMUP_ON_START:
+        return None
+    warmup = Warmup()
+    warmup.run()
+    spill_datasets()
+    return warmup
@@ -0,0 +1,40 @@
+"""
+Weeknummers rond 1 oktober
+
+De prognose wordt gelezen op de teldatum 1 oktober: de week waarin
+1 oktober valt, of anders de dichtstbijzijnde week ervoor. Grafieken per week
+beginnen bij die week.
+"""
+from datetime import datetime
+
+
+def get_week_of_october_1st(year):
+    """Return ISO week number for October 1st of the given year."""
+    return datetime(year, 10, 1).isocalendar()[1]
+
+
+def sort_weeks_with_oct1_first(weeks, year):
+    """Sort week numbers so the week containing October 1st comes first."""
+    oct1_week = get_week_of_october_1st(year)
+    # Create ordering: weeks >= oct1_week first (ascending), then weeks < oct1_week (ascending)
+    def week_order(w):
+        if w >= oct1_week:
+            return (0, w)
+        return (1, w)
+    return sorted(weeks, key=week_order)
+
+
+def get_best_week_for_oct1(available_weeks, year):
+    """
+    Return the best week for '1 oktober' data: de week waarin 1 oktober valt,
+    of anders de week ervoor die daar het dichtste bij in de buurt komt.
+    """
+    oct1_week = get_week_of_october_1st(year)
+    if oct1_week in available_weeks:
+        return oct1_week
+    # Zoek weken vóór oct1_week (dichtstbijzijnde ervoor)
+    weeks_before = [w for w in available_weeks if w < oct1_week]
+    if weeks_before:
+        return max(weeks_before)
+    # Geen week ervoor: neem de vroegste beschikbare week
+    return min(available_weeks) if available_weeks else None
@@ -0,0 +1,55 @@
+"""
+Differentiële controle van de snelle routes tegen de referentie
+
+Draait alle geregistreerde routes (zie backend.differential) op willekeurig
+gegenereerde datasets en filterstanden en vergelijkt de uitkomsten met de
+oorspronkelijke pandas logica (backend.reference). Stopt met code 1 als een
+route ergens afwijkt; de gemelde iteratie is met --seed en --iteration opnieuw
+te draaien.
+
+Gebruik:
+    uv run python src/differential_check.py --iterations 200
+    uv run python src/differential_check.py --check duckdb --seed 3 --iteration 17
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from backend.differential import run
+
+MAX_REPORTED_DIFFERENCES = 5
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vergelijk de snelle routes met de referentie op gegenereerde data")
+    parser.add_argument('--iterations', type=int, default=100, help="Aantal willekeurige datasets")
+    parser.add_argument('--seed', type=int, default=0, help="Seed van de generator")
+    parser.add_argument('--rows', type=int, default=2000, help="Maximaal aantal aanmeldingen per dataset")
+    parser.add_argument('--check', nargs='+', help="Alleen routes waarvan de naam dit bevat")
+    parser.add_argument('--iteration', type=int, help="Alleen deze ene iteratie (om een afwijking na te spelen)")
+    args = parser.parse_args()
+
+    if args.iteration is not None:
+        results = run(1, args.seed, args.rows, args.check, first_iteration=args.iteration)
+    else:
+        results = run(args.iterations, args.seed, args.rows, args.check)
+
+    width = max((len(name) for name in results), default=5)
+    print(f"{'route':<{width}} {'runs':>5} {'overgeslagen':>12} {'afwijkend':>9}")
+    failed = False
+    for name, result in results.items():
+        print(f"{name:<{width}} {result['runs']:>5} {result['skipped']:>12} {len(result['failures']):>9}")
+    for name, result in results.items():
+        for iteration, differences in result['failures']:
+            failed = True
+            print(f"\n{name}, iteratie {iteration} (--seed {args.seed} --iteration {iteration}):")
+            for difference in differences[:MAX_REPORTED_DIFFERENCES]:
+                print(f"  {difference}")
+            if len(differences) > MAX_REPORTED_DIFFERENCES:
+                print(f"  ... en nog {len(differences) - MAX_REPORTED_DIFFERENCES}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
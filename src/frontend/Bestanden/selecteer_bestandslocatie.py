@@ -1,9 +1,22 @@
 import streamlit as st
 import pandas as pd
 import pickle
-import os
-import tempfile
 from io import BytesIO
+import os
+import sys
+
+# Import backend modules (src/ staat op het pad bij starten via main.py)
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+from backend import loading
+from backend.bundle import BUNDLE_EXTENSION, export_bundle, import_bundle
+from backend.config import DATA_DIRECTORIES
+from backend.data_directory import get_watcher
+from backend.ingestion import FAILED, PARSING, QUEUED, READY, get_ingestion_manager
+from backend.memory import get_memory_governor
+from backend.preview import PREVIEW_PAGE_ROWS, PREVIEW_ROWS, read_preview
+from backend.storage import TEMP_UPLOAD_DIR, LocalFileHandle, list_temp_files
 
 # ---------------------------------------
 # PAGE CONFIGURATION
@@ -76,13 +89,8 @@ def save_file_to_temp(uploaded_file, file_type):
         file_type: 'beschrijving' or 'prognose'
     """
     if uploaded_file is not None:
-        # Create temp directory if it doesn't exist
-        temp_dir = tempfile.gettempdir()
-        app_temp_dir = os.path.join(temp_dir, 'streamlit_app_files')
-        os.makedirs(app_temp_dir, exist_ok=True)
-        
-        # Create subdirectory for file type
-        type_dir = os.path.join(app_temp_dir, file_type)
+        # Create subdirectory for file type (in the app's storage dir, see INSTROOM_STORAGE_DIR)
+        type_dir = os.path.join(TEMP_UPLOAD_DIR, file_type)
         os.makedirs(type_dir, exist_ok=True)
         
         # Save file to temp location (use unique name if file exists)
@@ -97,10 +105,18 @@ def save_file_to_temp(uploaded_file, file_type):
         with open(temp_file_path, 'wb') as f:
             f.write(uploaded_file.getbuffer())
         
-        # Save metadata with file type
+        # Detect the CSV dialect once at ingest; later reads reuse it
+        if base_name.lower().endswith('.csv'):
+            try:
+                get_csv_dialect(uploaded_file)
+            except Exception:
+                pass
+        
+        # Save metadata with file type; the content hash is kept so later handles don't re-read the file
         metadata = {
             'file_name': uploaded_file.name,
             'file_size': uploaded_file.size,
+            'file_hash': get_file_hash(uploaded_file),
             'temp_path': temp_file_path,
             'file_type': file_type
         }
@@ -132,30 +148,7 @@ def load_files_from_temp(file_type=None):
     Returns:
         list: List of (temp_file_path, metadata) tuples
     """
-    temp_dir = tempfile.gettempdir()
-    app_temp_dir = os.path.join(temp_dir, 'streamlit_app_files')
-    
-    valid_files = []
-    types_to_load = [file_type] if file_type else ['beschrijving', 'prognose']
-    
-    for ftype in types_to_load:
-        type_dir = os.path.join(app_temp_dir, ftype)
-        metadata_path = os.path.join(type_dir, 'files_metadata.pkl')
-        
-        if os.path.exists(metadata_path):
-            try:
-                with open(metadata_path, 'rb') as f:
-                    all_metadata = pickle.load(f)
-                
-                # Return only files that still exist
-                for metadata in all_metadata:
-                    temp_file_path = metadata.get('temp_path')
-                    if temp_file_path and os.path.exists(temp_file_path):
-                        valid_files.append((temp_file_path, metadata))
-            except:
-                pass
-    
-    return valid_files
+    return list_temp_files(file_type)
 
 def clear_temp_file(file_name=None, file_type=None):
     """Clear temporary file(s) and metadata
@@ -164,14 +157,11 @@ def clear_temp_file(file_name=None, file_type=None):
         file_name: If provided, only remove this specific file. Otherwise remove all.
         file_type: 'beschrijving', 'prognose', or None (all types)
     """
-    temp_dir = tempfile.gettempdir()
-    app_temp_dir = os.path.join(temp_dir, 'streamlit_app_files')
-    
     types_to_clear = [file_type] if file_type else ['beschrijving', 'prognose']
     
     try:
         for ftype in types_to_clear:
-            type_dir = os.path.join(app_temp_dir, ftype)
+            type_dir = os.path.join(TEMP_UPLOAD_DIR, ftype)
             metadata_path = os.path.join(type_dir, 'files_metadata.pkl')
             
             if not os.path.exists(metadata_path):
@@ -260,81 +250,33 @@ def get_uploaded_files(file_type=None):
                         break
         
         if not file_exists:
-            # Create a file-like object from temp file
-            class TempFileWrapper:
-                def __init__(self, file_path, file_name, file_size):
-                    self.file_path = file_path
-                    self.name = file_name
-                    self.size = file_size
-                    self._position = 0
-                    # Pre-load file content into memory for proper file-like behavior
-                    with open(self.file_path, 'rb') as f:
-                        self._content = f.read()
-                
-                def read(self, size=-1):
-                    if size == -1:
-                        # Read all remaining content from current position
-                        data = self._content[self._position:]
-                        self._position = len(self._content)
-                        return data
-                    else:
-                        # Read specified number of bytes
-                        end_pos = min(self._position + size, len(self._content))
-                        data = self._content[self._position:end_pos]
-                        self._position = end_pos
-                        return data
-                
-                def readline(self):
-                    # Find the next newline from current position
-                    remaining = self._content[self._position:]
-                    if not remaining:
-                        return b''
-                    
-                    # Find first newline
-                    newline_pos = remaining.find(b'\n')
-                    if newline_pos == -1:
-                        # No newline found, return remaining content
-                        line = remaining
-                        self._position = len(self._content)
-                        return line
-                    else:
-                        # Include the newline character
-                        line = remaining[:newline_pos + 1]
-                        self._position += len(line)
-                        return line
-                
-                def seek(self, offset, whence=0):
-                    """Seek to a position in the file
-                    
-                    Args:
-                        offset: Offset to seek to
-                        whence: 0 = from start, 1 = from current position, 2 = from end
-                    """
-                    if whence == 0:  # From start
-                        self._position = max(0, min(offset, len(self._content)))
-                    elif whence == 1:  # From current position
-                        self._position = max(0, min(self._position + offset, len(self._content)))
-                    elif whence == 2:  # From end
-                        self._position = max(0, min(len(self._content) + offset, len(self._content)))
-                    else:
-                        raise ValueError("whence must be 0, 1, or 2")
-                    return self._position
-                
-                def tell(self):
-                    return self._position
-                
-                def seekable(self):
-                    """Return True if the file is seekable"""
-                    return True
-                
-                def getbuffer(self):
-                    return self._content
-            
-            temp_file_obj = TempFileWrapper(temp_file_path, metadata['file_name'], metadata['file_size'])
+            # Handle on the temp copy: the content is read from disk when needed
+            temp_file_obj = LocalFileHandle(
+                temp_file_path, metadata['file_name'], metadata['file_size'],
+                file_hash=metadata.get('file_hash'), source='temp'
+            )
             files.append((temp_file_obj, metadata['file_name'], metadata['file_size']))
     
+    # Files from the configured data directories on the server (read in place, no copy)
+    if DATA_DIRECTORIES:
+        known_names = {name for _, name, _ in files}
+        for handle, name, size in get_watcher().get_files(file_type):
+            if name not in known_names:
+                files.append((handle, name, size))
+    
     return files
 
+def get_file_hash(file_obj):
+    """Get the content hash of a file, computed once per file object
+    
+    Args:
+        file_obj: File-like object (UploadedFile, LocalFileHandle or BundleFileHandle)
+    
+    Returns:
+        str: Hex digest of the file content
+    """
+    return loading.get_file_hash(file_obj)
+
 def get_uploaded_file():
     """Get the first uploaded file (backward compatibility)
     
@@ -346,34 +288,29 @@ def get_uploaded_file():
         return files[0]  # Return first file for backward compatibility
     return None, None, None
 
-def detect_encoding(file):
-    """Detect the encoding of a file by trying common encodings
+def get_csv_dialect(file_obj):
+    """Get the CSV dialect (encoding, separator, quote char, header row, decimal) of a file
+    
+    The dialect is detected once per file content and kept with the file metadata.
     
     Args:
-        file: File-like object with bytes content
+        file_obj: File-like object with bytes content
         
     Returns:
-        str: Detected encoding or 'utf-8' as fallback
+        dict: See backend.csv_dialect.sniff_csv_dialect
     """
-    # Common encodings to try (most common first)
-    encodings = ['utf-8', 'iso-8859-1', 'windows-1252', 'cp1252', 'latin-1']
-    
-    # Reset to beginning
-    file.seek(0)
-    
-    # Try to read a sample (first 10000 bytes or entire file if smaller)
-    sample = file.read(10000)
-    file.seek(0)
+    return loading.get_csv_dialect(file_obj)
+
+def get_read_source(file_obj):
+    """Return the path of a file that lives on the server, otherwise the file object itself
     
-    for encoding in encodings:
-        try:
-            sample.decode(encoding)
-            return encoding
-        except (UnicodeDecodeError, UnicodeError):
-            continue
+    Args:
+        file_obj: File-like object
     
-    # If all fail, return a safe default
-    return 'iso-8859-1'
+    Returns:
+        str or file-like object to pass to pandas
+    """
+    return loading.get_read_source(file_obj)
 
 def read_excel_file(file_obj, file_name=None):
     """Read Excel file (XLSX or XLS) using pandas
@@ -386,18 +323,13 @@ def read_excel_file(file_obj, file_name=None):
         pandas.DataFrame or None
     """
     try:
-        # Reset file position
-        file_obj.seek(0)
-        
-        # Read Excel file
-        df = pd.read_excel(file_obj, engine='openpyxl')
-        return df
+        return loading.read_excel(file_obj)
     except Exception as e:
         st.error(f"Fout bij het lezen van Excel bestand: {str(e)}")
         return None
 
 def read_csv_file(file_obj, file_name=None):
-    """Read CSV file using pandas with automatic encoding detection
+    """Read CSV file using pandas with the detected dialect of the file
     
     Args:
         file_obj: File-like object
@@ -407,63 +339,16 @@ def read_csv_file(file_obj, file_name=None):
         pandas.DataFrame or None
     """
     try:
-        # Detect encoding
-        file_obj.seek(0)
-        encoding = detect_encoding(file_obj)
-        
-        # Reset and read first line to detect separator
-        file_obj.seek(0)
-        try:
-            first_line_bytes = file_obj.read(1000)
-            first_line = first_line_bytes.decode(encoding)
-        except (UnicodeDecodeError, UnicodeError):
-            file_obj.seek(0)
-            first_line_bytes = file_obj.read(1000)
-            first_line = first_line_bytes.decode('iso-8859-1')
-            encoding = 'iso-8859-1'
-        
-        # Detect separator
-        if ';' in first_line and first_line.count(';') > first_line.count(','):
-            separator = ';'
-        elif ',' in first_line:
-            separator = ','
-        else:
-            separator = None
-        
-        # Reset and read CSV
-        file_obj.seek(0)
-        if separator:
-            df = pd.read_csv(file_obj, sep=separator, encoding=encoding)
-        else:
-            df = pd.read_csv(file_obj, encoding=encoding)
-        
-        return df
+        return loading.read_csv(file_obj, get_csv_dialect(file_obj))
     except Exception as e:
-        # Fallback: manual parsing
-        file_obj.seek(0)
-        try:
-            content = file_obj.read().decode(encoding)
-        except (UnicodeDecodeError, UnicodeError):
-            file_obj.seek(0)
-            content = file_obj.read().decode('iso-8859-1')
-        
-        lines = content.strip().split('\n')
-        if lines:
-            headers = lines[0].split(';') if ';' in lines[0] else lines[0].split(',')
-            data = []
-            for line in lines[1:]:
-                if line.strip():
-                    row = line.split(';') if ';' in line else line.split(',')
-                    data.append(row)
-            return pd.DataFrame(data, columns=headers)
-    else:
+        st.error(f"Fout bij het lezen van CSV bestand: {str(e)}")
         return None
-    
-    return None
 
 def read_data_file(file_obj=None, file_name=None):
     """Read data file (CSV or XLSX) - generic reader
     
+    Files with a known content hash are parsed once and shared (see backend.loading).
+    
     Args:
         file_obj: Optional file object to read
         file_name: Optional file name
@@ -483,17 +368,41 @@ def read_data_file(file_obj=None, file_name=None):
         else:
             file_name = 'unknown'
     
-    # Determine file type and read accordingly
-    if file_name.endswith('.xlsx') or file_name.endswith('.xls'):
-        return read_excel_file(file_obj, file_name)
-    elif file_name.endswith('.csv'):
-        return read_csv_file(file_obj, file_name)
-    else:
+    try:
+        return loading.load_dataset(file_obj, file_name)
+    except Exception as e:
+        file_kind = 'CSV' if file_name.endswith('.csv') else 'Excel'
+        st.error(f"Fout bij het lezen van {file_kind} bestand: {str(e)}")
+        return None
+
+def get_preview(file_obj, file_name, start=0, nrows=PREVIEW_ROWS):
+    """Read a window of rows of a file without parsing the whole file
+    
+    Args:
+        file_obj: File-like object
+        file_name: File name
+        start: Index of the first data row
+        nrows: Number of rows
+    
+    Returns:
+        pandas.DataFrame or None
+    """
+    try:
+        if getattr(file_obj, 'source', None) == 'bundle':
+            # No raw file: show the window of the parsed dataset
+            return read_data_file(file_obj, file_name).iloc[start:start + nrows]
+        dialect = get_csv_dialect(file_obj) if file_name.lower().endswith('.csv') else None
+        file_obj.seek(0)
+        return read_preview(get_read_source(file_obj), file_name, start, nrows, dialect)
+    except Exception as e:
+        st.error(f"Fout bij het lezen van voorbeeld: {str(e)}")
         return None
 
 def get_column_overview(file_obj=None, file_name=None):
     """Get column overview for uploaded file (CSV or XLSX)
     
+    The profile is computed once per file content and kept with the file metadata.
+    
     Args:
         file_obj: Optional file object to read
         file_name: Optional file name
@@ -501,31 +410,48 @@ def get_column_overview(file_obj=None, file_name=None):
     Returns:
         pandas.DataFrame with column information or None if no file
     """
-    df = read_data_file(file_obj, file_name)
-    if df is not None:
-        # Create overview DataFrame
-        overview_data = []
-        for col in df.columns:
-            overview_data.append({
-                'Kolom': col,
-                'Datatype': str(df[col].dtype),
-                'Aantal waarden': len(df[col]),
-                'Ontbrekende waarden': df[col].isnull().sum(),
-                'Unieke waarden': df[col].nunique()
-            })
-        return pd.DataFrame(overview_data)
-    return None
+    if file_obj is None:
+        file_obj, file_name, _ = get_uploaded_file()
+        if file_obj is None:
+            return None
+    
+    try:
+        return loading.get_column_profile(file_obj, file_name)
+    except Exception as e:
+        st.error(f"Fout bij het lezen van bestand: {str(e)}")
+        return None
+
+def start_ingestion(file_obj, file_name):
+    """Queue the background ingestion (dialect, parsing, column profile) of a file on the server's disk
+    
+    Args:
+        file_obj: File-like object with a file_path (temp copy or data directory file)
+        file_name: File name
+    
+    Returns:
+        IngestionJob, or None if the file isn't on disk
+    """
+    file_path = getattr(file_obj, 'file_path', None)
+    if not file_path or not os.path.exists(file_path):
+        return None
+    return loading.submit_ingestion(file_path, file_name, get_file_hash(file_obj), getattr(file_obj, 'source', 'temp'))
 
+INGESTION_STATUS_LABELS = {
+    QUEUED: '⏳ In wachtrij',
+    PARSING: '🔄 Inlezen',
+    READY: '✅ Gereed',
+    FAILED: '❌ Mislukt',
+}
 
-# ---------------------------------------
-# PAGE ELEMENTS
-# ---------------------------------------
 def save_file_location(uploaded_files, file_type):
     """Save uploaded file(s) to session state and temp storage for persistence
     
     Args:
         uploaded_files: Streamlit UploadedFile object or list of UploadedFile objects
         file_type: 'beschrijving' or 'prognose'
+    
+    Returns:
+        int: Number of files added (files with the same name are skipped)
     """
     # Ensure it's a list
     if not isinstance(uploaded_files, list):
@@ -540,6 +466,7 @@ def save_file_location(uploaded_files, file_type):
     if metadata_key not in st.session_state:
         st.session_state[metadata_key] = []
     
+    added = 0
     for uploaded_file in uploaded_files:
         if uploaded_file is not None:
             # Check if file already exists
@@ -550,16 +477,90 @@ def save_file_location(uploaded_files, file_type):
                     break
             
             if not file_exists:
-                # Save to session state for immediate use
-                st.session_state[uploaded_key].append(uploaded_file)
+                # Save to temp storage for persistence across refreshes; once that succeeded
+                # the session keeps only a handle on the temp copy, not the uploaded bytes
+                file_obj = uploaded_file
+                try:
+                    temp_file_path, temp_metadata = save_file_to_temp(uploaded_file, file_type)
+                    file_obj = LocalFileHandle(
+                        temp_file_path, uploaded_file.name, uploaded_file.size,
+                        file_hash=temp_metadata['file_hash'], source='temp'
+                    )
+                except OSError as e:
+                    st.warning(f"Kon {uploaded_file.name} niet tijdelijk opslaan; het bestand blijft alleen in deze sessie beschikbaar ({e})")
+                
+                st.session_state[uploaded_key].append(file_obj)
                 st.session_state[metadata_key].append({
                     'file_name': uploaded_file.name,
                     'file_size': uploaded_file.size,
                     'file_type': file_type
                 })
                 
-                # Also save to temp storage for persistence across refreshes
-                save_file_to_temp(uploaded_file, file_type)
+                # Ingest the temp copy in the background
+                start_ingestion(file_obj, uploaded_file.name)
+                added += 1
+    return added
+
+def uploader_key(name):
+    """Return the current key of a file uploader
+    
+    The key changes after every upload (see reset_uploader); the first key is the name itself.
+    
+    Args:
+        name: Base key of the uploader (e.g. 'uploader_beschrijving')
+    """
+    generation = st.session_state.get(f'{name}_generation', 0)
+    return name if generation == 0 else f"{name}_{generation}"
+
+def reset_uploader(name):
+    """Empty a file uploader once its files are persisted
+    
+    Streamlit keeps the uploaded bytes in memory for as long as the widget holds
+    them. With a new key the next run shows an empty uploader, and Streamlit drops
+    the files of the old one.
+    """
+    st.session_state[f'{name}_generation'] = st.session_state.get(f'{name}_generation', 0) + 1
+
+def add_bundle_files(handles):
+    """Add the files of an imported bundle to the session (files with the same name are skipped)
+    
+    Args:
+        handles: List of BundleFileHandle
+    
+    Returns:
+        int: Number of files added
+    """
+    added = 0
+    for handle in handles:
+        uploaded_key = f'uploaded_files_{handle.file_type}'
+        metadata_key = f'file_metadata_{handle.file_type}'
+        if any(meta['file_name'] == handle.name for meta in st.session_state[metadata_key]):
+            continue
+        st.session_state[uploaded_key].append(handle)
+        st.session_state[metadata_key].append({
+            'file_name': handle.name,
+            'file_size': handle.size,
+            'file_type': handle.file_type,
+            'source': 'bundle'
+        })
+        added += 1
+    return added
+
+def build_bundle():
+    """Export all current files (parsed datasets, prognosis aggregates, metadata) as a bundle
+    
+    Returns:
+        bytes: Content of the bundle file
+    """
+    files = []
+    for file_type in ['beschrijving', 'prognose']:
+        for file_obj, file_name, file_size in get_uploaded_files(file_type):
+            df = read_data_file(file_obj, file_name)
+            if df is not None:
+                files.append((file_type, file_name, file_size, get_file_hash(file_obj), df))
+    buffer = BytesIO()
+    export_bundle(files, buffer)
+    return buffer.getvalue()
 
 # Export functions for other modules
 def get_beschrijving_files():
@@ -592,69 +593,11 @@ for file_type in ['beschrijving', 'prognose']:
     if not st.session_state[uploaded_key]:
         temp_files = load_files_from_temp(file_type)
         for temp_file_path, metadata in temp_files:
-            # Create TempFileWrapper objects (similar to get_uploaded_files)
-            class TempFileWrapper:
-                def __init__(self, file_path, file_name, file_size):
-                    self.file_path = file_path
-                    self.name = file_name
-                    self.size = file_size
-                    self._position = 0
-                    with open(self.file_path, 'rb') as f:
-                        self._content = f.read()
-                
-                def read(self, size=-1):
-                    if size == -1:
-                        data = self._content[self._position:]
-                        self._position = len(self._content)
-                        return data
-                    else:
-                        end_pos = min(self._position + size, len(self._content))
-                        data = self._content[self._position:end_pos]
-                        self._position = end_pos
-                        return data
-                
-                def readline(self):
-                    remaining = self._content[self._position:]
-                    if not remaining:
-                        return b''
-                    newline_pos = remaining.find(b'\n')
-                    if newline_pos == -1:
-                        line = remaining
-                        self._position = len(self._content)
-                        return line
-                    else:
-                        line = remaining[:newline_pos + 1]
-                        self._position += len(line)
-                        return line
-                
-                def seek(self, offset, whence=0):
-                    """Seek to a position in the file
-                    
-                    Args:
-                        offset: Offset to seek to
-                        whence: 0 = from start, 1 = from current position, 2 = from end
-                    """
-                    if whence == 0:  # From start
-                        self._position = max(0, min(offset, len(self._content)))
-                    elif whence == 1:  # From current position
-                        self._position = max(0, min(self._position + offset, len(self._content)))
-                    elif whence == 2:  # From end
-                        self._position = max(0, min(len(self._content) + offset, len(self._content)))
-                    else:
-                        raise ValueError("whence must be 0, 1, or 2")
-                    return self._position
-                
-                def tell(self):
-                    return self._position
-                
-                def seekable(self):
-                    """Return True if the file is seekable"""
-                    return True
-                
-                def getbuffer(self):
-                    return self._content
-            
-            temp_file_obj = TempFileWrapper(temp_file_path, metadata['file_name'], metadata['file_size'])
+            # Only a handle on the temp copy in the session (similar to get_uploaded_files)
+            temp_file_obj = LocalFileHandle(
+                temp_file_path, metadata['file_name'], metadata['file_size'],
+                file_hash=metadata.get('file_hash'), source='temp'
+            )
             st.session_state[uploaded_key].append(temp_file_obj)
             st.session_state[metadata_key].append(metadata)
 
@@ -683,14 +626,14 @@ if '_imported_via_importlib' not in globals():
             "Sleep bestanden hierheen of klik om te selecteren",
             type=['csv', 'xlsx', 'xls'],
             accept_multiple_files=True,
-            key="uploader_beschrijving",
+            key=uploader_key("uploader_beschrijving"),
             help="Upload bestanden voor beschrijving aanmeldingen"
         )
         
+        # Na het bewaren de uploader leegmaken: de sessie houdt alleen de handles op de tijdelijke kopieën
         if uploaded_files_beschrijving:
             save_file_location(uploaded_files_beschrijving, 'beschrijving')
-            file_names = [f.name for f in uploaded_files_beschrijving]
-            st.success(f"✅ {len(uploaded_files_beschrijving)} bestand(en) toegevoegd voor Beschrijving aanmeldingen!")
+            reset_uploader("uploader_beschrijving")
             st.rerun()
         
         # Show count of uploaded files
@@ -717,16 +660,14 @@ if '_imported_via_importlib' not in globals():
             "Selecteer bestanden",
             type=['csv', 'xlsx', 'xls'],
             accept_multiple_files=True,
-            key="uploader_prognose",
+            key=uploader_key("uploader_prognose"),
          #   help="Upload bestanden voor prognose inschrijvingen"
          help="Upload bestanden voor Instroomprognose"
         )
         
         if uploaded_files_prognose:
             save_file_location(uploaded_files_prognose, 'prognose')
-            file_names = [f.name for f in uploaded_files_prognose]
-         #   st.success(f"✅ {len(uploaded_files_prognose)} bestand(en) toegevoegd voor Prognose inschrijvingen!")
-            st.success(f"✅ {len(uploaded_files_prognose)} bestand(en) toegevoegd voor Instroomprognose!")
+            reset_uploader("uploader_prognose")
             st.rerun()
         
         # Show count of uploaded files
@@ -735,6 +676,63 @@ if '_imported_via_importlib' not in globals():
          #   st.info(f"📁 {len(prognose_files)} bestand(en) geüpload voor Prognose inschrijvingen")
          st.info(f"📁 {len(prognose_files)} bestand(en) geüpload voor Instroomprognose")
 
+    # Data directory section (only when directories are configured on the server)
+    if DATA_DIRECTORIES:
+        st.header("🗄️ Data directory (server)")
+        st.markdown(
+            "Bestanden in de onderstaande map(pen) op de server worden automatisch ingelezen, zonder upload. "
+            "Alleen nieuwe of gewijzigde bestanden worden opnieuw verwerkt."
+        )
+        st.code("\n".join(DATA_DIRECTORIES))
+        if st.button("🔄 Opnieuw scannen", key="rescan_data_directories"):
+            get_watcher().scan(force=True)
+        data_dir_files = get_watcher().scan()
+        if data_dir_files:
+            type_labels_dir = {'beschrijving': 'Beschrijving aanmeldingen', 'prognose': 'Instroomprognose'}
+            st.dataframe(pd.DataFrame([{
+                'Type upload': type_labels_dir[meta['file_type']],
+                'Status': meta['status'],
+                'Bestandsgrootte': f"{meta['file_size'] / 1024:.2f} KB",
+                'Bestandsnaam': meta['file_name'],
+            } for meta in data_dir_files]), use_container_width=True, hide_index=True)
+        else:
+            st.info("Geen herkende bestanden gevonden in de data directory.")
+
+    # Bundle section: share parsed data, aggregates and metadata as one file
+    st.header("📦 Bundel")
+    st.markdown(
+        "Een bundel bevat de al ingelezen en samengevatte data van de huidige bestanden. "
+        "Collega's die de bundel laden hebben direct een werkend dashboard, zonder de ruwe bestanden opnieuw te uploaden."
+    )
+    col_export, col_import = st.columns(2)
+    with col_export:
+        if st.button("📦 Bundel maken", key="build_bundle", disabled=not get_uploaded_files()):
+            with st.spinner("Bundel maken..."):
+                st.session_state['bundle_export'] = build_bundle()
+        if st.session_state.get('bundle_export'):
+            st.download_button(
+                "⬇️ Download bundel",
+                data=st.session_state['bundle_export'],
+                file_name=f"instroom_bundel{BUNDLE_EXTENSION}",
+                mime="application/zip",
+                key="download_bundle"
+            )
+    with col_import:
+        uploaded_bundle = st.file_uploader(
+            "Bundel laden",
+            type=[BUNDLE_EXTENSION.lstrip('.')],
+            key=uploader_key("uploader_bundle"),
+            help="Laad een bundel die met 'Bundel maken' is gemaakt"
+        )
+        if uploaded_bundle is not None:
+            try:
+                added = add_bundle_files(import_bundle(uploaded_bundle, uploaded_bundle.name))
+                st.success(f"✅ {added} bestand(en) geladen uit {uploaded_bundle.name}")
+            except ValueError as e:
+                st.error(str(e))
+            # De bundel staat op de server; de volgende run toont een lege uploader
+            reset_uploader("uploader_bundle")
+
     # Overview section
     st.header("📊 Overzicht geüploade bestanden")
     
@@ -753,6 +751,7 @@ if '_imported_via_importlib' not in globals():
             for file_obj, file_name, file_size in files:
                 file_info_map[file_name] = (file_obj, file_name, file_size, file_type)
         
+        manager = get_ingestion_manager()
         for file_obj, file_name, file_size, file_type in file_info_map.values():
             # Determine file format
             if file_name.endswith('.xlsx') or file_name.endswith('.xls'):
@@ -762,159 +761,45 @@ if '_imported_via_importlib' not in globals():
             else:
                 file_format = 'Onbekend'
             
-            # Try to read file to get columns and rows
-            # Get a fresh copy of the file content to avoid position issues
-            num_columns = None
-            num_rows = None
-            
+            # Files are parsed by the background workers; rows/columns are shown once ready
+            cols_display = 'N/A'
+            rows_display = 'N/A'
             try:
-                # Get fresh copy of file content using getbuffer if available, otherwise read
-                if hasattr(file_obj, 'getbuffer'):
-                    file_content = file_obj.getbuffer()
-                elif hasattr(file_obj, '_content'):
-                    # TempFileWrapper has _content attribute
-                    file_content = file_obj._content
-                elif hasattr(file_obj, 'read'):
-                    file_obj.seek(0)
-                    file_content = file_obj.read()
-                else:
-                    file_content = None
-                
-                if file_content is None:
-                    num_columns = None
-                    num_rows = None
-                else:
-                    # Create a fresh BytesIO buffer from the content (make a copy)
-                    if isinstance(file_content, bytes):
-                        file_buffer = BytesIO(file_content)
-                    else:
-                        # If it's already a buffer-like object, create a copy
-                        file_obj.seek(0)
-                        if hasattr(file_obj, 'getbuffer'):
-                            file_content = file_obj.getbuffer()
-                        else:
-                            file_content = file_obj.read()
-                        file_buffer = BytesIO(file_content)
-                    
-                    # Determine file type and read accordingly
-                    if file_name.endswith('.xlsx') or file_name.endswith('.xls'):
-                        # Read Excel file - ensure we have bytes content
-                        if isinstance(file_content, bytes):
-                            file_buffer = BytesIO(file_content)
+                # Alleen indienen als er nog geen job is: een mislukt bestand niet bij elke rerun opnieuw inlezen
+                job = manager.get_job(get_file_hash(file_obj))
+                if job is None:
+                    job = start_ingestion(file_obj, file_name)
+                if job is None or job.status == READY:
+                    df = read_data_file(file_obj, file_name)
+                    if df is not None:
+                        cols_display = int(df.shape[1])
+                        if file_format == 'Excel':
+                            # Empty rows at the end of a sheet don't count
+                            rows_display = int(df.notna().any(axis=1).sum())
                         else:
-                            # Fallback: try to get bytes again
-                            file_obj.seek(0)
-                            if hasattr(file_obj, 'getbuffer'):
-                                file_content = file_obj.getbuffer()
-                            elif hasattr(file_obj, '_content'):
-                                file_content = file_obj._content
-                            else:
-                                file_content = file_obj.read()
-                            file_buffer = BytesIO(file_content)
-                        
-                        file_buffer.seek(0)
-                        try:
-                            df = pd.read_excel(file_buffer, engine='openpyxl', sheet_name=0)  # Read first sheet
-                            # Verify we got a valid DataFrame
-                            if df is not None and isinstance(df, pd.DataFrame):
-                                # Remove empty rows that might be at the end
-                                df = df.dropna(how='all')
-                                num_columns = int(df.shape[1])
-                                num_rows = int(df.shape[0])
-                            else:
-                                num_columns = None
-                                num_rows = None
-                        except Exception as excel_error:
-                            # Try again without sheet_name parameter
-                            try:
-                                file_buffer.seek(0)
-                                df = pd.read_excel(file_buffer, engine='openpyxl')
-                                if df is not None and isinstance(df, pd.DataFrame):
-                                    df = df.dropna(how='all')
-                                    num_columns = int(df.shape[1])
-                                    num_rows = int(df.shape[0])
-                                else:
-                                    num_columns = None
-                                    num_rows = None
-                            except:
-                                num_columns = None
-                                num_rows = None
-                            
-                    elif file_name.endswith('.csv'):
-                        # Detect encoding from a fresh buffer
-                        encoding_buffer = BytesIO(file_content if isinstance(file_content, bytes) else file_content)
-                        encoding = detect_encoding(encoding_buffer)
-                        
-                        # Read first line to detect separator
-                        encoding_buffer.seek(0)
-                        try:
-                            first_line_bytes = encoding_buffer.read(1000)
-                            first_line = first_line_bytes.decode(encoding)
-                        except (UnicodeDecodeError, UnicodeError):
-                            encoding_buffer.seek(0)
-                            first_line_bytes = encoding_buffer.read(1000)
-                            first_line = first_line_bytes.decode('iso-8859-1')
-                            encoding = 'iso-8859-1'
-                        
-                        # Detect separator
-                        if ';' in first_line and first_line.count(';') > first_line.count(','):
-                            separator = ';'
-                        elif ',' in first_line:
-                            separator = ','
-                        else:
-                            separator = None
-                        
-                        # Read CSV from buffer
-                        file_buffer.seek(0)
-                        try:
-                            if separator:
-                                df = pd.read_csv(file_buffer, sep=separator, encoding=encoding)
-                            else:
-                                df = pd.read_csv(file_buffer, encoding=encoding)
-                            
-                            if df is not None and isinstance(df, pd.DataFrame):
-                                num_columns = int(df.shape[1])
-                                num_rows = int(df.shape[0])
-                            else:
-                                num_columns = None
-                                num_rows = None
-                        except Exception as csv_error:
-                            num_columns = None
-                            num_rows = None
-                    else:
-                        num_columns = None
-                        num_rows = None
-                    
-            except Exception as e:
-                # If reading fails, set to None
-                num_columns = None
-                num_rows = None
+                            rows_display = int(df.shape[0])
+            except Exception:
+                job = None
             
-            # Format values for display - ensure they are integers
-            # Explicitly convert to Python int to avoid any numpy/pandas type issues
-            if num_columns is not None:
-                try:
-                    cols_display = int(num_columns)
-                except (ValueError, TypeError):
-                    cols_display = 'N/A'
-            else:
-                cols_display = 'N/A'
-                
-            if num_rows is not None:
-                try:
-                    rows_display = int(num_rows)
-                except (ValueError, TypeError):
-                    rows_display = 'N/A'
+            if job is None:
+                status_display = INGESTION_STATUS_LABELS[READY] if rows_display != 'N/A' else INGESTION_STATUS_LABELS[FAILED]
+                progress = 1.0 if rows_display != 'N/A' else 0.0
             else:
-                rows_display = 'N/A'
+                status_display = INGESTION_STATUS_LABELS[job.status]
+                if job.status == PARSING and job.step_label:
+                    status_display += f" ({job.step_label.lower()})"
+                if job.status == FAILED and job.error:
+                    status_display += f": {job.error}"
+                progress = job.progress
             
-            # Verify the values before adding to overview
          #   type_label = 'Beschrijving aanmeldingen' if file_type == 'beschrijving' else 'Prognose inschrijvingen'
             type_label = 'Beschrijving aanmeldingen' if file_type == 'beschrijving' else 'Instroomprognose'
             overview_data.append({
                 'Type upload': type_label,
                 'Formaat': str(file_format),  # Kortere naam
                 'Bestandsgrootte': f"{file_size / 1024:.2f} KB",  # Kortere naam
+                'Status': status_display,
+                'Voortgang': progress,
                 '# Kolommen': cols_display,  # Kortere naam
                 '# Rijen': rows_display,  # Kortere naam    
                 'Bestandsnaam': str(file_name)
@@ -924,7 +809,7 @@ if '_imported_via_importlib' not in globals():
         if overview_data:
             overview_df = pd.DataFrame(overview_data)
             # Reorder columns for better visibility: most important first
-            column_order = ['Type upload', 'Formaat', 'Bestandsgrootte', '# Kolommen', '# Rijen', 'Bestandsnaam']   
+            column_order = ['Type upload', 'Formaat', 'Bestandsgrootte', 'Status', 'Voortgang', '# Kolommen', '# Rijen', 'Bestandsnaam']
             overview_df = overview_df[column_order]
             
             # Use CSS to make table more compact and fit better
@@ -944,7 +829,14 @@ if '_imported_via_importlib' not in globals():
             </style>
             """, unsafe_allow_html=True)
             
-            st.dataframe(overview_df, use_container_width=True, hide_index=True)
+            st.dataframe(
+                overview_df, use_container_width=True, hide_index=True,
+                column_config={'Voortgang': st.column_config.ProgressColumn('Voortgang', min_value=0.0, max_value=1.0)}
+            )
+            if manager.pending():
+                st.caption("⏳ Bestanden worden op de achtergrond ingelezen; de analysepagina's zijn beschikbaar zodra hun bestanden gereed zijn.")
+                if st.button("🔄 Status vernieuwen", key="refresh_ingestion_status"):
+                    st.rerun()
         else:
             st.info("Geen bestanden geüpload. Upload bestanden via de secties hierboven.")
     else:
@@ -995,20 +887,66 @@ if '_imported_via_importlib' not in globals():
                 with col1:
                     st.subheader(f"📄 {selected_file_name} ({type_label})")
                 with col2:
-                    if st.button("🗑️", key=f"delete_detail_{selected_type}_{selected_file_name}", help=f"Verwijder {selected_file_name}"):
+                    # Files in the data directory are managed on the server and can't be removed here
+                    is_data_directory_file = getattr(file_obj, 'source', None) == 'data_directory'
+                    if not is_data_directory_file and st.button("🗑️", key=f"delete_detail_{selected_type}_{selected_file_name}", help=f"Verwijder {selected_file_name}"):
                         remove_file_from_session(selected_file_name, selected_type)
                         clear_temp_file(selected_file_name, selected_type)
                         st.success(f"✅ Bestand '{selected_file_name}' verwijderd!")
                         st.rerun()
                 
-                df = read_data_file(file_obj, selected_file_name)
-                if df is not None:
+                # Voorbeeld: alleen de eerste rijen lezen, verdere vensters op verzoek ("meer laden")
+                preview_key = f"preview_{get_file_hash(file_obj)}"
+                if preview_key not in st.session_state:
+                    first_window = get_preview(file_obj, selected_file_name)
+                    st.session_state[preview_key] = {
+                        'windows': [first_window] if first_window is not None else [],
+                        'at_end': first_window is None or len(first_window) < PREVIEW_ROWS,
+                    }
+                preview = st.session_state[preview_key]
+                
+                if preview['windows']:
                     st.markdown("##### 📊 Kolom overzicht")
-                    overview_df = get_column_overview(file_obj, selected_file_name)
+                    # Het kolomprofiel leest het hele bestand (één keer per bestand, daarna uit cache)
+                    with st.spinner("Kolomprofiel berekenen..."):
+                        overview_df = get_column_overview(file_obj, selected_file_name)
                     if overview_df is not None:
                         st.dataframe(overview_df, use_container_width=True)
                     
                     st.markdown("##### 👀 Voorbeeld van inhoud")
-                    st.dataframe(df.head(5), use_container_width=True)
+                    preview_container = st.container()
+                    if not preview['at_end'] and st.button("Meer laden", key=f"load_more_{preview_key}"):
+                        shown_rows = sum(len(window) for window in preview['windows'])
+                        next_window = get_preview(file_obj, selected_file_name, start=shown_rows, nrows=PREVIEW_PAGE_ROWS)
+                        if next_window is not None:
+                            preview['windows'].append(next_window)
+                        preview['at_end'] = next_window is None or len(next_window) < PREVIEW_PAGE_ROWS
+                    with preview_container:
+                        st.dataframe(pd.concat(preview['windows'], ignore_index=True), use_container_width=True)
                 else:
                     st.error(f"Kon bestand '{selected_file_name}' niet lezen")
+
+    # Diagnostics: memory use of the process-wide caches (all sessions together)
+    with st.expander("🧠 Geheugengebruik"):
+        usage = get_memory_governor().usage()
+        budget_mb = usage['budget_bytes'] / 1024 ** 2
+        col_usage, col_releases, col_reloads = st.columns(3)
+        col_usage.metric(
+            "In geheugen",
+            f"{usage['total_bytes'] / 1024 ** 2:.1f} MB",
+            help=f"Budget: {budget_mb:.0f} MB" if usage['budget_bytes'] > 0 else "Geen budget ingesteld"
+        )
+        col_releases.metric("Vrijgegeven", usage['releases'], help="Datasets en aggregaten die uit het geheugen zijn gehaald om binnen het budget te blijven")
+        col_reloads.metric("Opnieuw geladen", usage['reloads'], help="Vrijgegeven items die daarna weer nodig waren")
+        if usage['budget_bytes'] > 0:
+            st.progress(min(usage['total_bytes'] / usage['budget_bytes'], 1.0))
+        if usage['items']:
+            st.dataframe(pd.DataFrame([{
+                'Soort': item['kind'],
+                'Naam': item['label'],
+                'Grootte (MB)': round(item['bytes'] / 1024 ** 2, 2),
+                'Status': item['state'],
+                'Laatst gebruikt': pd.Timestamp(item['last_used'], unit='s', tz='UTC').tz_convert('Europe/Amsterdam').strftime('%H:%M:%S'),
+            } for item in usage['items']]), use_container_width=True, hide_index=True)
+        else:
+            st.info("Nog geen datasets of aggregaten in het geheugen.")
@@ -36,6 +36,7 @@ try:
     # Access functions directly from the module
     get_beschrijving_files = getattr(file_module, 'get_beschrijving_files', None)
     read_data_file = getattr(file_module, 'read_data_file', None)
+    get_file_hash = getattr(file_module, 'get_file_hash', None)
     get_column_overview = getattr(file_module, 'get_column_overview', None)
     
     # Fallback: if get_prognose_files doesn't exist, use get_uploaded_files with 'prognose'
@@ -57,6 +58,54 @@ except Exception as e:
     st.info(f"Bestand bestaat: {os.path.exists(file_module_path)}")
     st.stop()
 
+# Import backend aggregations (src/ staat op het pad bij starten via main.py)
+src_path = os.path.abspath(os.path.join(current_dir, '..', '..'))
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+from backend.aggregations import cumulative_per_group, pivot_sum
+from backend.config import DISTINCT_COUNT_MODE, HLL_PRECISION
+from backend.hll import build_sketch, relative_error
+from backend.opleiding import build_opleiding_key
+from backend.union_dataset import UnionDataset
+from backend.views import (
+    CAKETENID_COLS, add_week_columns, chart_sketch_source, find_beschrijving_columns, get_chart_data
+)
+
+
+@st.cache_resource(show_spinner="Bestanden samenvoegen...")
+def load_union_dataset(files_key, _files):
+    """Read several files into one Arrow-backed union, deduplicating caketenid across files
+
+    files_key (content hashes of the files) is the cache key, shared by all sessions.
+
+    Returns:
+        tuple: (pandas.DataFrame over the Arrow buffers, number of duplicate rows removed)
+    """
+    union = UnionDataset(id_candidates=CAKETENID_COLS)
+    for file_obj, name, _ in _files:
+        df_file = read_data_file(file_obj, name)
+        if df_file is not None:
+            union.add_dataframe(name, df_file)
+        del df_file
+    return union.to_pandas(), union.duplicate_rows
+
+
+@st.cache_resource(show_spinner="Sketch voor benaderende telling opbouwen...")
+def build_caketenid_sketch(files_key, id_col, dim_cols, precision, _df):
+    """Build (once per file set and set of dimensions) the HyperLogLog sketch of caketenid
+
+    files_key (content hashes of the files) is the cache key, shared by all sessions.
+    """
+    return build_sketch(_df, id_col, list(dim_cols), precision)
+
+@st.cache_resource(show_spinner=False)
+def build_opleiding_column(files_key, code_col, naam_col, _df):
+    """Build (once per file set) the categorical opleiding key "<code> - <naam>"
+
+    files_key (content hashes of the files) is the cache key, shared by all sessions.
+    """
+    return build_opleiding_key(_df, code_col, naam_col)
+
 # Page title
 st.title("📈 Beschrijving aanmeldingen")
 
@@ -64,25 +113,39 @@ st.title("📈 Beschrijving aanmeldingen")
 beschrijving_files = get_beschrijving_files()
 
 if beschrijving_files:
-    # Use the first beschrijving file (or allow selection if multiple)
+    # Use the first beschrijving file (or allow selection of several files, e.g. one per schooljaar)
     if len(beschrijving_files) > 1:
-        # Multiple files - let user select
+        # Multiple files - let user select one or more
         file_names = [file_name for _, file_name, _ in beschrijving_files]
-        selected_file_name = st.selectbox(
-            "Selecteer een bestand voor analyse:",
+        selected_file_names = st.multiselect(
+            "Selecteer een of meerdere bestanden voor analyse:",
             file_names,
+            default=file_names[:1],
             key="beschrijving_file_selector"
         )
-        # Find the selected file
-        file, file_name, file_size = next((f, n, s) for f, n, s in beschrijving_files if n == selected_file_name)
+        selected_files = [(f, n, s) for f, n, s in beschrijving_files if n in selected_file_names]
     else:
         # Single file - use it directly
-        file, file_name, file_size = beschrijving_files[0]
+        selected_files = beschrijving_files[:1]
+    
+    if not selected_files:
+        st.info("Selecteer ten minste één bestand om de analyse te tonen.")
+        st.stop()
+    
+    file = selected_files[0][0]
+    file_name = ' + '.join(n for _, n, _ in selected_files)
+    # Cache sleutel van de proces-brede caches: de inhoud van de bestanden, niet naam en grootte
+    files_key = tuple(get_file_hash(f) for f, _, _ in selected_files)
     
     if file:
-        # Read file directly (CSV or XLSX)
+        # Read file directly (CSV or XLSX); several files are combined as union
         try:
-            df = read_data_file(file, file_name)
+            if len(selected_files) == 1:
+                df = read_data_file(file, file_name)
+            else:
+                df, duplicate_rows = load_union_dataset(files_key, selected_files)
+                if duplicate_rows:
+                    st.caption(f"ℹ️ {duplicate_rows:,} rijen met een caketenid uit een eerder geselecteerd bestand zijn niet dubbel meegeteld.")
         except UnicodeDecodeError as e:
             st.error(f"❌ Encoding fout bij het lezen van het bestand: {str(e)}")
             st.info("💡 Het bestand gebruikt mogelijk een andere tekst encoding (bijv. ISO-8859-1 of Windows-1252). "
@@ -93,28 +156,20 @@ if beschrijving_files:
             st.stop()
         
         if df is not None:
-            # Helper function to find column name (case-insensitive, with fallbacks)
-            def find_column(df, possible_names):
-                """Find column name from possible variations"""
-                df_cols_lower = {col.lower(): col for col in df.columns}
-                for name in possible_names:
-                    if name.lower() in df_cols_lower:
-                        return df_cols_lower[name.lower()]
-                return None
-            
-            # Find relevant columns
-            caketenid_col = find_column(df, ['caketenid', 'caketen_id', 'caketen', 'ketenid', 'keten_id'])
-            status_col = find_column(df, ['status', 'aanmelding_status', 'status_aanmelding'])
-            week_col = find_column(df, ['week_of_year', 'week', 'weeknummer', 'weeknr', 'kalenderweek'])
-            academic_week_col = find_column(df, ['academic_week', 'academicweek', 'academische_week', 'schooljaarweek'])
-            schooljaar_col = find_column(df, ['schooljaar', 'school_jaar', 'jaar'])
+            # Find relevant columns (case-insensitive, with fallbacks)
+            columns = find_beschrijving_columns(df)
+            caketenid_col = columns['caketenid']
+            status_col = columns['status']
+            week_col = columns['week']
+            academic_week_col = columns['academic_week']
+            schooljaar_col = columns['schooljaar']
             
             # Find filter columns
-            school_col = find_column(df, ['school', 'instelling', 'schoolnaam'])
-            brin_col = find_column(df, ['instellingserkenningscode', 'brin', 'erkenningscode'])
-            leerweg_col = find_column(df, ['leertrajectmbo', 'leerweg', 'leertraject'])
-            opleidingcode_col = find_column(df, ['opleidingcode', 'opleiding_code', 'code'])
-            opleidingsnaam_col = find_column(df, ['opleidingsnaam', 'opleiding_naam', 'opleidingnaam', 'naam'])
+            school_col = columns['school']
+            brin_col = columns['brin']
+            leerweg_col = columns['leerweg']
+            opleidingcode_col = columns['opleidingcode']
+            opleidingsnaam_col = columns['opleidingsnaam']
             
             # Check if required columns are available
             if not caketenid_col:
@@ -133,32 +188,10 @@ if beschrijving_files:
                 # Create a copy for processing
                 df_chart = df.copy()
                 
-                # Create combined opleiding column if both code and name exist
-                def format_opleidingcode(code_value):
-                    """Convert opleidingcode to integer string (remove .0)"""
-                    if pd.isna(code_value):
-                        return ''
-                    try:
-                        num_val = pd.to_numeric(code_value, errors='coerce')
-                        if pd.isna(num_val):
-                            return str(code_value)
-                        else:
-                            return str(int(float(num_val)))
-                    except (ValueError, TypeError, OverflowError):
-                        code_str = str(code_value)
-                        if code_str.endswith('.0'):
-                            return code_str[:-2]
-                        return code_str
-                
-                if opleidingcode_col and opleidingsnaam_col:
-                    df_chart['_opleiding_combined'] = (
-                        df_chart[opleidingcode_col].apply(format_opleidingcode) + ' - ' + 
-                        df_chart[opleidingsnaam_col].astype(str)
-                    )
-                elif opleidingcode_col:
-                    df_chart['_opleiding_combined'] = df_chart[opleidingcode_col].apply(format_opleidingcode)
-                elif opleidingsnaam_col:
-                    df_chart['_opleiding_combined'] = df_chart[opleidingsnaam_col].astype(str)
+                # Combined opleiding column (built once per file over unique code/naam pairs)
+                opleiding_key = build_opleiding_column(files_key, opleidingcode_col, opleidingsnaam_col, df)
+                if opleiding_key is not None:
+                    df_chart['_opleiding_combined'] = opleiding_key
                 
                 # Filter section
                 st.markdown("### 🔽 Filters")
@@ -260,17 +293,49 @@ if beschrijving_files:
                         )
                         st.session_state.filter_schooljaar_selected = selected_schooljaar
                 
+                # Telmethode: exact (standaard) of benaderend met HyperLogLog sketches
+                use_approximate = st.checkbox(
+                    "Benaderende telling (sneller bij grote bestanden)",
+                    value=DISTINCT_COUNT_MODE == 'approximate',
+                    key='beschrijving_approximate_count',
+                    help="Telt unieke aanmeldingen met HyperLogLog sketches in plaats van exact."
+                )
+                
+                def apply_selected_filters(frame):
+                    """Apply the selected filters to a DataFrame (raw rows or sketch)"""
+                    if st.session_state.filter_school_selected and school_col:
+                        frame = frame[frame[school_col].isin(st.session_state.filter_school_selected)]
+                    if st.session_state.filter_brin_selected and brin_col:
+                        frame = frame[frame[brin_col].isin(st.session_state.filter_brin_selected)]
+                    if st.session_state.filter_leerweg_selected and leerweg_col:
+                        frame = frame[frame[leerweg_col].isin(st.session_state.filter_leerweg_selected)]
+                    if st.session_state.filter_opleiding_selected and '_opleiding_combined' in frame.columns:
+                        frame = frame[frame['_opleiding_combined'].isin(st.session_state.filter_opleiding_selected)]
+                    if st.session_state.filter_schooljaar_selected and schooljaar_col:
+                        frame = frame[frame[schooljaar_col].isin(st.session_state.filter_schooljaar_selected)]
+                    return frame
+                
+                # Filterstand van de sessie: kolom -> geselecteerde waarden
+                selections = {
+                    school_col: st.session_state.filter_school_selected,
+                    brin_col: st.session_state.filter_brin_selected,
+                    leerweg_col: st.session_state.filter_leerweg_selected,
+                    '_opleiding_combined': st.session_state.filter_opleiding_selected,
+                    schooljaar_col: st.session_state.filter_schooljaar_selected,
+                }
+                
+                # Sketch op het niveau van de grafiek plus de filterdimensies met een selectie;
+                # elke set actieve filters wordt één keer opgebouwd
+                sketch = None
+                if use_approximate and caketenid_col:
+                    sketch_source, sketch_dims = chart_sketch_source(df_chart, columns, selections)
+                    sketch = build_caketenid_sketch(
+                        files_key, caketenid_col, tuple(sketch_dims), HLL_PRECISION, _df=sketch_source
+                    )
+                    st.caption(f"≈ Benaderende aantallen (HyperLogLog), standaardfout ±{relative_error(HLL_PRECISION):.1%}")
+                
                 # Apply all filters to get final filtered dataframe
-                if st.session_state.filter_school_selected and school_col:
-                    df_chart = df_chart[df_chart[school_col].isin(st.session_state.filter_school_selected)]
-                if st.session_state.filter_brin_selected and brin_col:
-                    df_chart = df_chart[df_chart[brin_col].isin(st.session_state.filter_brin_selected)]
-                if st.session_state.filter_leerweg_selected and leerweg_col:
-                    df_chart = df_chart[df_chart[leerweg_col].isin(st.session_state.filter_leerweg_selected)]
-                if st.session_state.filter_opleiding_selected and '_opleiding_combined' in df_chart.columns:
-                    df_chart = df_chart[df_chart['_opleiding_combined'].isin(st.session_state.filter_opleiding_selected)]
-                if st.session_state.filter_schooljaar_selected and schooljaar_col:
-                    df_chart = df_chart[df_chart[schooljaar_col].isin(st.session_state.filter_schooljaar_selected)]
+                df_chart = apply_selected_filters(df_chart)
                 
                 # Show active filter count
                 if len(df_chart) < len(df):
@@ -281,18 +346,7 @@ if beschrijving_files:
                     st.stop()
                 
                 # Ensure we have both week columns or create mapping
-                if week_col and academic_week_col:
-                    # Both available - use both
-                    df_chart['_week'] = df_chart[week_col]
-                    df_chart['_academic_week'] = df_chart[academic_week_col]
-                elif week_col:
-                    # Only calendar week available
-                    df_chart['_week'] = df_chart[week_col]
-                    df_chart['_academic_week'] = None
-                elif academic_week_col:
-                    # Only academic week available
-                    df_chart['_week'] = None
-                    df_chart['_academic_week'] = df_chart[academic_week_col]
+                add_week_columns(df_chart, columns)
                 
                 # Create week labels first (combining both week types)
                 if '_academic_week' in df_chart.columns and '_week' in df_chart.columns:
@@ -349,82 +403,14 @@ if beschrijving_files:
                     
                     return sorted(status_list, key=get_sort_key)
                 
-                # Group by schooljaar, week, and status to count unique caketenid per combination
-                # This gives us the number of aanmeldingen (caketenid) per status per week per schooljaar
-                grouping_cols = []
-                if schooljaar_col:
-                    grouping_cols.append(schooljaar_col)
-                if '_academic_week' in df_chart.columns:
-                    grouping_cols.append('_academic_week')
-                elif '_week' in df_chart.columns:
-                    grouping_cols.append('_week')
-                grouping_cols.append(status_col)
-                
-                # Also preserve week columns for later use
-                week_cols_to_preserve = []
-                if '_academic_week' in df_chart.columns:
-                    week_cols_to_preserve.append('_academic_week')
-                if '_week' in df_chart.columns:
-                    week_cols_to_preserve.append('_week')
-                
-                # Count unique caketenid per week/status/schooljaar combination
-                if caketenid_col:
-                    chart_data = df_chart.groupby(grouping_cols)[caketenid_col].nunique().reset_index()
-                    chart_data.columns = list(chart_data.columns[:-1]) + ['aantal_aanmeldingen']
-                else:
-                    # Fallback: count rows if caketenid not available
-                    chart_data = df_chart.groupby(grouping_cols).size().reset_index(name='aantal_aanmeldingen')
-                
-                # Calculate cumulative sum per schooljaar and status
-                # Sort first by schooljaar and week
-                sort_cols = []
-                if schooljaar_col and schooljaar_col in chart_data.columns:
-                    sort_cols.append(schooljaar_col)
-                if '_academic_week' in chart_data.columns:
-                    sort_cols.append('_academic_week')
-                elif '_week' in chart_data.columns:
-                    sort_cols.append('_week')
-                
-                if sort_cols:
-                    chart_data = chart_data.sort_values(sort_cols)
+                # Count unique caketenid per schooljaar, week and status; the result is also kept
+                # on disk per (files, filter state, count method) and survives a restart
+                chart_data = get_chart_data(files_key, df_chart, columns, selections, sketch)
                 
-                # Calculate cumulative sum per schooljaar and status
-                cumulative_data = []
-                if schooljaar_col and schooljaar_col in chart_data.columns:
-                    for schooljaar in chart_data[schooljaar_col].unique():
-                        jaar_data = chart_data[chart_data[schooljaar_col] == schooljaar].copy()
-                        # Sort by week within this schooljaar
-                        if '_academic_week' in jaar_data.columns:
-                            jaar_data = jaar_data.sort_values('_academic_week')
-                        elif '_week' in jaar_data.columns:
-                            jaar_data = jaar_data.sort_values('_week')
-                        
-                        for status in jaar_data[status_col].unique():
-                            status_data = jaar_data[jaar_data[status_col] == status].copy()
-                            # Sort by week again within status
-                            if '_academic_week' in status_data.columns:
-                                status_data = status_data.sort_values('_academic_week')
-                            elif '_week' in status_data.columns:
-                                status_data = status_data.sort_values('_week')
-                            status_data['cumulatief'] = status_data['aantal_aanmeldingen'].cumsum()
-                            cumulative_data.append(status_data)
-                else:
-                    # No schooljaar column - just calculate cumulative per status
-                    for status in chart_data[status_col].unique():
-                        status_data = chart_data[chart_data[status_col] == status].copy()
-                        # Sort by week within status
-                        if '_academic_week' in status_data.columns:
-                            status_data = status_data.sort_values('_academic_week')
-                        elif '_week' in status_data.columns:
-                            status_data = status_data.sort_values('_week')
-                        status_data['cumulatief'] = status_data['aantal_aanmeldingen'].cumsum()
-                        cumulative_data.append(status_data)
-                
-                if cumulative_data:
-                    chart_data = pd.concat(cumulative_data, ignore_index=True)
-                else:
-                    # Fallback if no data
-                    chart_data['cumulatief'] = chart_data['aantal_aanmeldingen']
+                # Calculate cumulative sum per schooljaar and status (sorted by week)
+                order_col = '_academic_week' if '_academic_week' in chart_data.columns else '_week'
+                partition_cols = [schooljaar_col, status_col] if schooljaar_col and schooljaar_col in chart_data.columns else [status_col]
+                chart_data = cumulative_per_group(chart_data, partition_cols, order_col, 'aantal_aanmeldingen', 'cumulatief')
                 
                 # Create week labels without schooljaar prefix (we'll show per schooljaar separately)
                 # If we have both week types in original data but only one in chart_data, try to map back
@@ -476,13 +462,7 @@ if beschrijving_files:
                             
                             if len(jaar_data) > 0:
                                 # Pivot data for this schooljaar
-                                pivot_data = jaar_data.pivot_table(
-                                    index='week_label',
-                                    columns=status_col,
-                                    values='cumulatief',
-                                    aggfunc='sum',
-                                    fill_value=0
-                                )
+                                pivot_data = pivot_sum(jaar_data, 'week_label', status_col, 'cumulatief')
                                 
                                 # Sort by schooljaar week (prioritize academic_week if available in data)
                                 if '_academic_week' in jaar_data.columns:
@@ -553,13 +533,7 @@ if beschrijving_files:
                 else:
                     # No schooljaar column - show single chart
                     # Pivot data for stacked area chart: status as columns, week_label as index
-                    pivot_data = chart_data.pivot_table(
-                        index='week_label',
-                        columns=status_col,
-                        values='cumulatief',
-                        aggfunc='sum',
-                        fill_value=0
-                    )
+                    pivot_data = pivot_sum(chart_data, 'week_label', status_col, 'cumulatief')
                     
                     # Sort by schooljaar week (prioritize academic week)
                     # Try to use academic_week from chart_data if available
@@ -3,8 +3,9 @@
 # Or if using pip:
 # $ pip install plotly
 
-import re
-from datetime import datetime
+import io
+import time
+import zipfile
 import streamlit as st
 import pandas as pd
 
@@ -16,6 +17,7 @@ except ImportError:
 
 # Import utility functions from the Files module
 import os
+import sys
 import importlib.util
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -31,6 +33,7 @@ try:
     get_prognose_files = getattr(file_module, 'get_prognose_files', None)
     get_beschrijving_files = getattr(file_module, 'get_beschrijving_files', None)
     read_data_file = getattr(file_module, 'read_data_file', None)
+    get_file_hash = getattr(file_module, 'get_file_hash', None)
     read_excel_file = getattr(file_module, 'read_excel_file', None)
     
     if get_beschrijving_files is None:
@@ -51,31 +54,23 @@ except Exception as e:
     st.error(f"Kon bestandsfuncties niet laden: {str(e)}")
     st.stop()
 
-
-def find_column(df, possible_names):
-    """Find column name from possible variations (case-insensitive)"""
-    df_cols_lower = {col.lower(): col for col in df.columns}
-    for name in possible_names:
-        if name.lower() in df_cols_lower:
-            return df_cols_lower[name.lower()]
-    return None
-
-
-def is_inschrijvingen_summary(filename):
-    """Check if filename matches inschrijvingen_summary_* pattern"""
-    name_lower = filename.lower()
-    return name_lower.startswith('inschrijvingen_summary') and (name_lower.endswith('.csv') or name_lower.endswith('.xlsx') or name_lower.endswith('.xls'))
-
-
-def parse_prediction_mbo_filename(filename):
-    """
-    Parse predictions_mbo_****_week## filename.
-    **** = jaartal, ## = weeknummer. Returns (jaar, week) or None if no match.
-    """
-    match = re.match(r'predictions_mbo_(\d+)_week(\d+)\.', filename, re.IGNORECASE)
-    if match:
-        return int(match.group(1)), int(match.group(2))
-    return None
+# Import backend aggregations (src/ staat op het pad bij starten via main.py)
+src_path = os.path.abspath(os.path.join(current_dir, '..', '..'))
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+from backend.config import DISTINCT_COUNT_MODE, HLL_PRECISION, REPORT_DIR
+from backend.enrolled_index import EnrolledIndex, build_enrolled_sketch, sketch_weekly_unique
+from backend.hll import relative_error
+from backend.identifiers import concat_encoded
+from backend.prognosis_store import (
+    PREDICTION_COLUMNS, apply_selection, find_column, get_prognosis_store, parse_prediction_mbo_filename,
+    summarise_prediction, weekly_prediction_totals
+)
+from backend.reports import generate_reports
+from backend.views import (
+    HISTORY_COLUMNS, file_snapshot, get_history_per_schooljaar, get_oct1_snapshot, is_inschrijvingen_summary
+)
+from backend.weeks import sort_weeks_with_oct1_first
 
 
 def is_prediction_mbo(filename):
@@ -92,54 +87,41 @@ def is_application_enriched(filename):
     )
 
 
-def get_week_of_october_1st(year):
-    """Return ISO week number for October 1st of the given year."""
-    return datetime(year, 10, 1).isocalendar()[1]
+@st.cache_resource(show_spinner=False)
+def get_enrolled_sketch(files_key, bsn_col, week_col, jaar_col, status_col, dim_cols, precision, _df_app):
+    """
+    HyperLogLog sketch van bsn_hash (alleen ENROLLED) per schooljaar, week en filterdimensie.
+    Wordt één keer per set application-bestanden opgebouwd (files_key: content hashes,
+    gedeeld door alle sessies).
+    """
+    return build_enrolled_sketch(_df_app, bsn_col, week_col, jaar_col, status_col, dim_cols, precision)
 
 
-def sort_weeks_with_oct1_first(weeks, year):
-    """Sort week numbers so the week containing October 1st comes first."""
-    oct1_week = get_week_of_october_1st(year)
-    # Create ordering: weeks >= oct1_week first (ascending), then weeks < oct1_week (ascending)
-    def week_order(w):
-        if w >= oct1_week:
-            return (0, w)
-        return (1, w)
-    return sorted(weeks, key=week_order)
+def get_weekly_ingeschreven_approx(df_app, target_jaar, bsn_col, week_col, jaar_col, status_col, inst_col, lw_col, opl_col):
+    """
+    Benaderende variant van get_weekly_ingeschreven: voegt de HyperLogLog sketches
+    van de geselecteerde filtercombinatie samen in plaats van nunique() op de ruwe rijen.
+    """
+    dim_cols = tuple(c for c in (inst_col, lw_col, opl_col) if c and c in df_app.columns)
+    files_key = tuple(get_file_hash(f) for f, _, _ in application_files)
+    sketch = get_enrolled_sketch(
+        files_key, bsn_col, week_col, jaar_col, status_col, dim_cols, HLL_PRECISION, _df_app=df_app
+    )
+    return sketch_weekly_unique(sketch, target_jaar, jaar_col, HLL_PRECISION, {
+        inst_col: selected_instelling,
+        lw_col: selected_leerweg,
+        opl_col: selected_opleiding,
+    })
 
 
-def get_best_week_for_oct1(available_weeks, year):
+@st.cache_resource(show_spinner=False)
+def build_enrolled_index(files_key, bsn_col, week_col, jaar_col, status_col, dim_cols, _df_app):
     """
-    Return the best week for '1 oktober' data: de week waarin 1 oktober valt,
-    of anders de week ervoor die daar het dichtste bij in de buurt komt.
+    Index van ENROLLED rijen (integer bsn_hash, week en schooljaar, gesorteerd op jaar en week).
+    Wordt één keer per set application-bestanden opgebouwd (files_key: content hashes,
+    gedeeld door alle sessies).
     """
-    oct1_week = get_week_of_october_1st(year)
-    if oct1_week in available_weeks:
-        return oct1_week
-    # Zoek weken vóór oct1_week (dichtstbijzijnde ervoor)
-    weeks_before = [w for w in available_weeks if w < oct1_week]
-    if weeks_before:
-        return max(weeks_before)
-    # Geen week ervoor: neem de vroegste beschikbare week
-    return min(available_weeks) if available_weeks else None
-
-
-def _schooljaar_matches_target(val, target_jaar):
-    """Check of schooljaar overeenkomt met target (2024, '2024-2025', '2023-2024' etc)."""
-    if pd.isna(val):
-        return False
-    s = str(val).strip()
-    if '-' in s:
-        try:
-            start_jaar = int(s.split('-')[0])
-            end_jaar = int(s.split('-')[-1])
-            return start_jaar == target_jaar or end_jaar == target_jaar
-        except (ValueError, IndexError):
-            pass
-    try:
-        return int(float(val)) == target_jaar
-    except (ValueError, TypeError):
-        return False
+    return EnrolledIndex(_df_app, bsn_col, week_col, jaar_col, status_col, dim_cols)
 
 
 def get_weekly_ingeschreven(df_app, target_jaar, bsn_col, week_col, jaar_col, status_col, inst_col, lw_col, opl_col):
@@ -149,26 +131,18 @@ def get_weekly_ingeschreven(df_app, target_jaar, bsn_col, week_col, jaar_col, st
     """
     if df_app is None or df_app.empty or not bsn_col or not week_col or not jaar_col or not status_col:
         return {}
-    df = df_app.copy()
-    # Alleen status = ENROLLED
-    df = df[df[status_col].astype(str).str.upper().str.strip() == 'ENROLLED']
-    # Filter op jaar (schooljaar_afgeleid: 2024, 2024-2025 of 2023-2024)
-    df = df[df[jaar_col].apply(lambda v: _schooljaar_matches_target(v, target_jaar))]
-    # Filters toepassen
-    if inst_col and inst_col in df.columns and selected_instelling:
-        df = df[df[inst_col].astype(str).isin(selected_instelling)]
-    if lw_col and lw_col in df.columns and selected_leerweg:
-        df = df[df[lw_col].astype(str).isin(selected_leerweg)]
-    if opl_col and opl_col in df.columns and selected_opleiding:
-        df = df[df[opl_col].astype(str).isin(selected_opleiding)]
-    if df.empty:
-        return {}
-    # Week als integer
-    df['_week'] = pd.to_numeric(df[week_col], errors='coerce')
-    df = df[df['_week'].notna() & (df['_week'] >= 1) & (df['_week'] <= 53)]
-    df['_week'] = df['_week'].astype(int)
-    # Tel unieke bsn_hash per week
-    return df.groupby('_week')[bsn_col].nunique().to_dict()
+    if DISTINCT_COUNT_MODE == 'approximate':
+        return get_weekly_ingeschreven_approx(
+            df_app, target_jaar, bsn_col, week_col, jaar_col, status_col, inst_col, lw_col, opl_col
+        )
+    dim_cols = tuple(c for c in (inst_col, lw_col, opl_col) if c and c in df_app.columns)
+    files_key = tuple(get_file_hash(f) for f, _, _ in application_files)
+    index = build_enrolled_index(files_key, bsn_col, week_col, jaar_col, status_col, dim_cols, _df_app=df_app)
+    return index.weekly_unique(target_jaar, {
+        inst_col: selected_instelling,
+        lw_col: selected_leerweg,
+        opl_col: selected_opleiding,
+    })
 
 
 # Ingeschreven jaar voor prognose jaar: zet op True om te activeren
@@ -220,56 +194,85 @@ for file_obj, file_name, _ in prediction_files:
         prediction_by_year[jaar].append((file_obj, file_name, week))
 
 df_predictions_by_year = {}  # jaar -> DataFrame (alleen van bestand met hoogste weeknr)
-df_predictions_all_weeks = {}  # jaar -> list of (week, DataFrame) voor per-week grafiek
+prediction_weeks_by_year = {}  # jaar -> {week: [(file_obj, file_name)]}, gelezen via de prognose store
 for jaar, files_list in prediction_by_year.items():
     # Kies bestand met hoogste weeknummer voor totaal-grafiek
     best_file = max(files_list, key=lambda x: x[2])
     file_obj, file_name, week = best_file
     try:
-        df = read_excel_file(file_obj, file_name)
+        df = read_data_file(file_obj, file_name)
         if df is not None and not df.empty:
             df_predictions_by_year[jaar] = df
     except Exception:
         pass
-    # Laad alle weekbestanden voor per-week grafiek
-    df_predictions_all_weeks[jaar] = []
+    # Weekbestanden per week; worden alleen gelezen als ze nog niet in de prognose store staan
+    prediction_weeks_by_year[jaar] = {}
     for f_obj, f_name, w in files_list:
-        try:
-            df_w = read_excel_file(f_obj, f_name)
-            if df_w is not None and not df_w.empty:
-                df_predictions_all_weeks[jaar].append((w, df_w))
-        except Exception:
-            pass
+        prediction_weeks_by_year[jaar].setdefault(w, []).append((f_obj, f_name))
 
 # Load application_enriched_with_context voor ingeschreven studenten per week
 df_application_list = []
 for file_obj, file_name, _ in application_files:
     try:
-        df = read_data_file(file_obj, file_name) if file_name.lower().endswith('.csv') else read_excel_file(file_obj, file_name)
+        df = read_data_file(file_obj, file_name)
         if df is not None and not df.empty:
             df_application_list.append(df)
     except Exception:
         pass
-df_application = pd.concat(df_application_list, ignore_index=True) if df_application_list else pd.DataFrame()
+df_application = concat_encoded(df_application_list) if df_application_list else pd.DataFrame()
 
-# Column mappings for filters and aggregatie
-INSTELLING_COLS = ['instellingserkenningscode']
+# Column mappings for filters and aggregatie (dezelfde als in de prognose store)
+INSTELLING_COLS = PREDICTION_COLUMNS['instelling']
 # Historische jaren: schooljaar_berekend (inschrijvingen_summary)
-SCHOOLJAAR_COLS = ['schooljaar_berekend', 'schooljaar_afgeleid', 'schooljaar', 'collegejaar', 'school_jaar', 'jaar']
-LEERWEG_COLS = ['leertraject', 'leertrajectmbo', 'leerweg']
-OPLEIDING_COLS = ['opleidingscode', 'opleidingcode', 'code']
+SCHOOLJAAR_COLS = PREDICTION_COLUMNS['schooljaar']
+LEERWEG_COLS = PREDICTION_COLUMNS['leerweg']
+OPLEIDING_COLS = PREDICTION_COLUMNS['opleiding']
 # Prognose: Aantal_studenten uit predictions_mbo bestanden
-AANTAL_STUDENTEN_COLS = ['aantal_studenten', 'aantal', 'count']
+AANTAL_STUDENTEN_COLS = PREDICTION_COLUMNS['sum_aantal']
 # Prognose: Individual_ratio voor verwacht totaal, Individual_mean voor tweede kolom in grafiek
-INDIVIDUAL_RATIO_COLS = ['individual_ratio', 'individual ratio']
-INDIVIDUAL_MEAN_COLS = ['individual_mean', 'individual mean']
+INDIVIDUAL_RATIO_COLS = PREDICTION_COLUMNS['sum_ratio']
+INDIVIDUAL_MEAN_COLS = PREDICTION_COLUMNS['sum_mean']
 # Historisch: aantal uit inschrijvingen_summary
-AANTAL_HIST_COLS = ['aantal', 'anaal', 'aantal_voorspeld', 'count']
+AANTAL_HIST_COLS = HISTORY_COLUMNS['aantal']
 # Application: bsn_hash (unieke studenten), status=ENROLLED, week_of_year, schooljaar_afgeleid
 APP_BSN_COLS = ['bsnhash', 'bsn_hash', 'bsn hash']
 APP_WEEK_COLS = ['week_of_year', 'weekofyear', 'week']
 APP_JAAR_COLS = ['schooljaar_afgeleid', 'schooljaarafgeleid', 'schooljaar']
 APP_STATUS_COLS = ['status', 'aanmelding_status']
+# Rapportage: aanmeldingen (caketenid) per status, zoals op Beschrijving aanmeldingen
+APP_CAKETENID_COLS = ['caketenid', 'caketen_id', 'caketen', 'ketenid', 'keten_id']
+APP_SCHOOLJAAR_COLS = ['schooljaar', 'school_jaar', 'jaar']
+
+# Weekbestanden samenvatten in de append-only prognose store: alleen nieuwe of gewijzigde
+# weekbestanden worden gelezen, de weekgrafiek komt daarna uit de (kleine) store
+prognosis_store = get_prognosis_store()
+store_partitions = {}  # jaar -> list of (jaar, week, file_hash)
+for jaar, weeks in prediction_weeks_by_year.items():
+    store_partitions[jaar] = []
+    for week, week_files in weeks.items():
+        for f_obj, f_name in week_files:
+            try:
+                file_hash = get_file_hash(f_obj)
+                if not prognosis_store.has_partition(jaar, week, file_hash):
+                    df_w = read_data_file(f_obj, f_name)
+                    if df_w is None or df_w.empty:
+                        continue
+                    prognosis_store.append(jaar, week, file_hash, f_name, summarise_prediction(df_w))
+                store_partitions[jaar].append((jaar, week, file_hash))
+            except Exception:
+                pass
+
+
+def read_prediction_week(jaar, week):
+    """Lees het weekbestand van een prognosejaar (eerste leesbare bij meerdere bestanden)"""
+    for f_obj, f_name in prediction_weeks_by_year.get(jaar, {}).get(week, []):
+        try:
+            df_w = read_data_file(f_obj, f_name)
+        except Exception:
+            continue
+        if df_w is not None and not df_w.empty:
+            return df_w
+    return None
 
 # Find filter columns in inschrijvingen data
 instelling_col = find_column(df_inschrijvingen, INSTELLING_COLS) if not df_inschrijvingen.empty else None
@@ -352,46 +355,69 @@ with filter_col2:
         key="instroomprognose_filter_opleiding"
     )
 
-def apply_filters(df, inst_col, sj_col, lw_col, opl_col):
-    if df is None or df.empty:
-        return df
-    out = df.copy()
-    if inst_col and inst_col in out.columns and selected_instelling:
-        out = out[out[inst_col].astype(str).isin(selected_instelling)]
-    if sj_col and sj_col in out.columns and selected_schooljaar:
-        out = out[out[sj_col].astype(str).isin(selected_schooljaar)]
-    if lw_col and lw_col in out.columns and selected_leerweg:
-        out = out[out[lw_col].astype(str).isin(selected_leerweg)]
-    if opl_col and opl_col in out.columns and selected_opleiding:
-        out = out[out[opl_col].astype(str).isin(selected_opleiding)]
-    return out
+filter_state = (tuple(selected_instelling), tuple(selected_schooljaar), tuple(selected_leerweg), tuple(selected_opleiding))
+# Dezelfde filters op de feitentabel van de prognose store
+prediction_selection = {
+    'instelling': selected_instelling,
+    'schooljaar': selected_schooljaar,
+    'leerweg': selected_leerweg,
+    'opleiding': selected_opleiding,
+}
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def memoised_oct1_snapshot(jaar, files_key, filter_state):
+    """Prognose op 1 oktober voor een prognosejaar, één keer per (bestanden, filterstand)
+    
+    Gebruikt de week van 1 oktober (of de dichtstbijzijnde week ervoor) uit de feitentabel
+    van de prognose store, met als fallback het bestand met de hoogste week. KPI, jaartotalen
+    en weekgrafiek lezen hetzelfde resultaat; het staat ook op schijf (zie backend.views).
+    files_key (weekbestanden met content hash) en filter_state bepalen de cache sleutel.
+    
+    Returns:
+        dict (week, columns, rows, ratio_col, total) of None als er geen bestand is
+    """
+    def fallback():
+        df_pred = df_predictions_by_year.get(jaar)  # fallback naar hoogste week
+        if df_pred is None:
+            return None
+        return file_snapshot(df_pred, {
+            'instelling': pred_instelling_col,
+            'schooljaar': pred_schooljaar_col,
+            'leerweg': pred_leerweg_col,
+            'opleiding': pred_opleiding_col,
+        }, prediction_selection)
+
+    partitions, prediction_files = files_key
+    return get_oct1_snapshot(
+        jaar, partitions, prediction_files, prediction_selection, prognosis_store,
+        read_week=lambda week: read_prediction_week(jaar, week), fallback=fallback
+    )
+
+# Som van aantal per schooljaar onder de huidige filters; KPI en jaartotalen lezen hetzelfde resultaat
+history_per_schooljaar = get_history_per_schooljaar(
+    [get_file_hash(f_obj) for f_obj, _, _ in inschrijvingen_files], df_inschrijvingen, prediction_selection
+)
+
+def oct1_snapshot(jaar):
+    """Memoised 1 oktober snapshot for the current files and filters"""
+    files_key = (
+        tuple(store_partitions.get(jaar, [])),
+        tuple((get_file_hash(f_obj), w) for f_obj, _, w in prediction_by_year.get(jaar, [])),
+    )
+    return memoised_oct1_snapshot(jaar, files_key, filter_state)
 
 # KPI: Studentprognose voor XXXX (bovenaan)
 # Toon voor elk prognosejaar: prognose vs voorgaand jaar (op basis van Individual_ratio)
 # Gebruik week van 1 oktober, of dichtstbijzijnde week ervoor
 for prognose_jaar in sorted(df_predictions_by_year.keys()):
-    totaal_prognose = 0
-    df_pred = None
-    if prognose_jaar in df_predictions_all_weeks and df_predictions_all_weeks[prognose_jaar]:
-        available_weeks = [w for w, _ in df_predictions_all_weeks[prognose_jaar]]
-        best_week = get_best_week_for_oct1(available_weeks, prognose_jaar)
-        if best_week is not None:
-            df_pred = next((df for w, df in df_predictions_all_weeks[prognose_jaar] if w == best_week), None)
-    if df_pred is None and prognose_jaar in df_predictions_by_year:
-        df_pred = df_predictions_by_year[prognose_jaar]  # fallback
-    if df_pred is not None:
-        df_pred_filt = apply_filters(df_pred, pred_instelling_col, pred_schooljaar_col, pred_leerweg_col, pred_opleiding_col)
-        r_col = find_column(df_pred_filt, INDIVIDUAL_RATIO_COLS) if not df_pred_filt.empty else None
-        if r_col is None:
-            r_col = find_column(df_pred_filt, AANTAL_STUDENTEN_COLS)
-        if not df_pred_filt.empty and r_col:
-            totaal_prognose = int(df_pred_filt[r_col].sum())
+    snapshot = oct1_snapshot(prognose_jaar)
+    totaal_prognose = snapshot['total'] if snapshot else 0
     
     # Voorgaand jaar: som uit inschrijvingen_summary voor jaar-1
     vorig_jaar = prognose_jaar - 1
     totaal_vorig_jaar = 0
-    if not df_inschrijvingen.empty and schooljaar_col and aantal_col_hist:
-        df_hist_filt = apply_filters(df_inschrijvingen, instelling_col, schooljaar_col, leerweg_col, opleiding_col)
+    if history_per_schooljaar is not None and not history_per_schooljaar.empty:
+        df_hist_filt = history_per_schooljaar
         if not df_hist_filt.empty:
             # Robuuste jaarvergelijking: 2023, 2023.0, "2023", "2022-2023" moeten matchen
             def jaar_equals(val, target):
@@ -445,37 +471,22 @@ if not df_inschrijvingen.empty:
     if not schooljaar_col or not aantal_col_hist:
         st.warning(f"inschrijvingen_summary: kolommen 'schooljaar_berekend' en 'aantal' niet gevonden. Beschikbaar: {', '.join(df_inschrijvingen.columns)}")
     else:
-        df_filtered = apply_filters(df_inschrijvingen, instelling_col, schooljaar_col, leerweg_col, opleiding_col)
-        if not df_filtered.empty:
-            per_jaar = df_filtered.groupby(schooljaar_col)[aantal_col_hist].sum()
-            for jaar in per_jaar.index:
+        per_jaar = history_per_schooljaar
+        if not per_jaar.empty:
+            for jaar, aantal in zip(per_jaar[schooljaar_col], per_jaar[aantal_col_hist]):
                 jaar_val = int(jaar) if pd.notna(jaar) else jaar
-                yearly_totals[jaar_val] = yearly_totals.get(jaar_val, 0) + int(per_jaar[jaar])
+                yearly_totals[jaar_val] = yearly_totals.get(jaar_val, 0) + int(aantal)
                 year_types[jaar_val] = 'historisch'
 
 # 2. Prognosis from predictions_mbo: optelsom Individual_ratio uit week van 1 oktober (of dichtstbijzijnde week ervoor)
 for jaar in df_predictions_by_year.keys():
-    df_pred = None
-    if jaar in df_predictions_all_weeks and df_predictions_all_weeks[jaar]:
-        available_weeks = [w for w, _ in df_predictions_all_weeks[jaar]]
-        best_week = get_best_week_for_oct1(available_weeks, jaar)
-        if best_week is not None:
-            df_pred = next((df for w, df in df_predictions_all_weeks[jaar] if w == best_week), None)
-    if df_pred is None:
-        df_pred = df_predictions_by_year.get(jaar)  # fallback naar hoogste week
-    if df_pred is None:
+    snapshot = oct1_snapshot(jaar)
+    if snapshot is None or snapshot['rows'] == 0:
         continue
-    df_filtered = apply_filters(df_pred, pred_instelling_col, pred_schooljaar_col, pred_leerweg_col, pred_opleiding_col)
-    if df_filtered.empty:
+    if snapshot['ratio_col'] is None:
+        st.warning(f"Prognose {jaar}: kolom 'Individual_ratio' of 'Aantal_studenten' niet gevonden. Beschikbare kolommen: {', '.join(snapshot['columns'])}")
         continue
-    r_col = find_column(df_filtered, INDIVIDUAL_RATIO_COLS)
-    if r_col is None:
-        r_col = find_column(df_filtered, AANTAL_STUDENTEN_COLS)
-    if r_col is None:
-        if not df_pred.empty:
-            st.warning(f"Prognose {jaar}: kolom 'Individual_ratio' of 'Aantal_studenten' niet gevonden. Beschikbare kolommen: {', '.join(df_pred.columns)}")
-        continue
-    jaar_total = int(df_filtered[r_col].sum())
+    jaar_total = snapshot['total']
     if jaar_total > 0:
         yearly_totals[jaar] = jaar_total
         year_types[jaar] = 'prognose'
@@ -544,29 +555,13 @@ if years:
 
 # Grafiek "Verwacht totaal aantal studenten xxx - per week" voor elk prognosejaar
 for prognose_jaar in prognose_jaren:
-    if prognose_jaar not in df_predictions_all_weeks or not df_predictions_all_weeks[prognose_jaar]:
+    if not store_partitions.get(prognose_jaar):
         continue
-    week_data_list = df_predictions_all_weeks[prognose_jaar]
-    # Verzamel (week, totaal) per bestand op basis van Individual_ratio (fallback: Aantal_studenten)
+    # Weekaggregaten uit de prognose store, gefilterd op de geselecteerde filters
+    facts = apply_selection(prognosis_store.load(store_partitions[prognose_jaar]), prediction_selection)
+    # Totaal per week op basis van Individual_ratio (fallback: Aantal_studenten)
     # en Individual_mean voor de tweede kolom
-    weekly_totals_ratio = {}
-    weekly_totals_mean = {}
-    for week, df_w in week_data_list:
-        df_filt = apply_filters(df_w, pred_instelling_col, pred_schooljaar_col, pred_leerweg_col, pred_opleiding_col)
-        if df_filt.empty:
-            continue
-        # Individual_ratio voor verwacht totaal
-        r_col = find_column(df_filt, INDIVIDUAL_RATIO_COLS) if not df_filt.empty else None
-        if r_col is None:
-            r_col = find_column(df_filt, AANTAL_STUDENTEN_COLS)
-        if r_col:
-            total_ratio = df_filt[r_col].sum()
-            weekly_totals_ratio[week] = weekly_totals_ratio.get(week, 0) + total_ratio
-        # Individual_mean voor tweede kolom
-        m_col = find_column(df_filt, INDIVIDUAL_MEAN_COLS) if not df_filt.empty else None
-        if m_col:
-            total_mean = df_filt[m_col].sum()
-            weekly_totals_mean[week] = weekly_totals_mean.get(week, 0) + total_mean
+    weekly_totals_ratio, weekly_totals_mean = weekly_prediction_totals(facts)
     # Gebruik ratio-totalen; als geen Individual_ratio, dan weekly_totals_ratio leeg en we skippen
     weekly_totals = weekly_totals_ratio if weekly_totals_ratio else {}
     if not weekly_totals:
@@ -628,6 +623,8 @@ for prognose_jaar in prognose_jaren:
             name=f'Ingeschreven {vorig_jaar}',
             marker_color='#636EFA'
         ))
+        if DISTINCT_COUNT_MODE == 'approximate':
+            st.caption(f"≈ Ingeschreven {vorig_jaar} is benaderd (HyperLogLog), standaardfout ±{relative_error(HLL_PRECISION):.1%}")
     elif SHOW_INGESCHREVEN_JAAR_VOOR and application_files and not has_ingeschreven:
         st.caption(f"ℹ️ Geen ENROLLED data voor {vorig_jaar}. Vereist: bsn_hash, status, week_of_year, schooljaar_afgeleid.")
     show_legend = show_individual_mean and bool(values_mean_sorted) or has_ingeschreven
@@ -644,22 +641,8 @@ for prognose_jaar in prognose_jaren:
     
     # Metrics onder de grafiek (op basis van Individual_ratio)
     # Totaal aantal voorspeld: week 40 of dichtstbijzijnde week ervoor
-    totaal_hogste_week = 0
-    df_hoogste = None
-    if prognose_jaar in df_predictions_all_weeks and df_predictions_all_weeks[prognose_jaar]:
-        available_weeks = [w for w, _ in df_predictions_all_weeks[prognose_jaar]]
-        best_week = get_best_week_for_oct1(available_weeks, prognose_jaar)  # week 40 of dichtstbij
-        if best_week is not None:
-            df_hoogste = next((df for w, df in df_predictions_all_weeks[prognose_jaar] if w == best_week), None)
-    if df_hoogste is None and prognose_jaar in df_predictions_by_year:
-        df_hoogste = df_predictions_by_year[prognose_jaar]  # fallback
-    if df_hoogste is not None:
-        df_hoogste = apply_filters(df_hoogste, pred_instelling_col, pred_schooljaar_col, pred_leerweg_col, pred_opleiding_col)
-        r_col = find_column(df_hoogste, INDIVIDUAL_RATIO_COLS) if not df_hoogste.empty else None
-        if r_col is None:
-            r_col = find_column(df_hoogste, AANTAL_STUDENTEN_COLS)
-        if not df_hoogste.empty and r_col:
-            totaal_hogste_week = int(df_hoogste[r_col].sum())
+    snapshot = oct1_snapshot(prognose_jaar)  # week 40 of dichtstbij
+    totaal_hogste_week = snapshot['total'] if snapshot else 0
     
     totaal_alle_weken = sum(values_sorted)
     n_weken = len(weeks_sorted)
@@ -675,3 +658,70 @@ for prognose_jaar in prognose_jaren:
         st.metric("Gemiddeld aantal voorspeld per week", f"{int(gemiddelde_per_week):,}")
     with m3:
         st.metric("Week met de meeste aanmeldingen", f"Week {week_meeste}" if week_meeste is not None else "-")
+
+
+def build_report_inputs():
+    """Prognose, historie en aanmeldingen in de kolommen die backend.reports verwacht"""
+    # Per week het eerste (leesbare) weekbestand, zoals de 1 oktober snapshot
+    partitions = []
+    for jaar_partitions in store_partitions.values():
+        seen_weeks = set()
+        for key in jaar_partitions:
+            if key[1] not in seen_weeks:
+                seen_weeks.add(key[1])
+                partitions.append(key)
+    facts = prognosis_store.load(partitions)[['jaar', 'week', 'instelling', 'sum_ratio', 'sum_mean', 'sum_aantal']] if partitions else None
+
+    history = None
+    if not df_inschrijvingen.empty and instelling_col and schooljaar_col and aantal_col_hist:
+        history = df_inschrijvingen[[instelling_col, schooljaar_col, aantal_col_hist]].set_axis(
+            ['instelling', 'schooljaar', 'aantal'], axis=1
+        )
+
+    application_frames = []
+    for f_obj, f_name, _ in beschrijving_files:
+        try:
+            df_app = read_data_file(f_obj, f_name)
+        except Exception:
+            continue
+        if df_app is None or df_app.empty:
+            continue
+        cols = [find_column(df_app, names) for names in (
+            INSTELLING_COLS, APP_CAKETENID_COLS, APP_STATUS_COLS, APP_SCHOOLJAAR_COLS, APP_WEEK_COLS
+        )]
+        if all(cols):
+            application_frames.append(df_app[cols].set_axis(['instelling', 'caketenid', 'status', 'schooljaar', 'week'], axis=1))
+    applications = concat_encoded(application_frames) if application_frames else None
+    return facts, history, applications
+
+
+# Rapportage per instelling: statische HTML-rapporten, parallel gemaakt in een process pool
+st.markdown("---")
+st.subheader("📄 Rapportage per instelling")
+st.caption(
+    "Maakt voor elke instelling een HTML-rapport met de KPI's en grafieken van deze pagina en de "
+    "statusgrafiek van Beschrijving aanmeldingen (zonder filters). De rapporten werken offline."
+)
+if st.button("📄 Rapporten maken", key="instroomprognose_build_reports"):
+    facts_report, history_report, applications_report = build_report_inputs()
+    progress_bar = st.progress(0.0, text="Rapporten maken...")
+    started = time.time()
+    report_paths = generate_reports(
+        os.path.join(REPORT_DIR, time.strftime('%Y%m%d-%H%M%S')),
+        facts=facts_report, history=history_report, applications=applications_report,
+        progress=lambda done, total: progress_bar.progress(done / total, text=f"{done} van {total} rapporten")
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for path in report_paths:
+            archive.write(path, os.path.basename(path))
+    st.session_state['instroomprognose_reports'] = buffer.getvalue()
+    progress_bar.progress(1.0, text=f"{len(report_paths)} rapporten gemaakt in {time.time() - started:.1f} s")
+if st.session_state.get('instroomprognose_reports'):
+    st.download_button(
+        "⬇️ Download rapporten (zip)",
+        data=st.session_state['instroomprognose_reports'],
+        file_name="rapportage_per_instelling.zip",
+        mime="application/zip",
+        key="instroomprognose_download_reports"
+    )
@@ -35,6 +35,7 @@ try:
     # Access functions directly from the module
     get_prognose_files = getattr(file_module, 'get_prognose_files', None)
     read_data_file = getattr(file_module, 'read_data_file', None)
+    get_file_hash = getattr(file_module, 'get_file_hash', None)
     get_column_overview = getattr(file_module, 'get_column_overview', None)
     
     # Fallback: if get_prognose_files doesn't exist, use get_uploaded_files with 'prognose'
@@ -56,6 +57,22 @@ except Exception as e:
     st.info(f"Bestand bestaat: {os.path.exists(file_module_path)}")
     st.stop()
 
+# Import backend modules (src/ staat op het pad bij starten via main.py)
+src_path = os.path.abspath(os.path.join(current_dir, '..', '..'))
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+from backend.aggregations import cumulative_week_table, sum_per_group
+from backend.opleiding import build_opleiding_key
+
+
+@st.cache_resource(show_spinner=False)
+def build_opleiding_column(file_hash, code_col, naam_col, _df):
+    """Build (once per file) the categorical opleiding key "<code> - <naam>"
+
+    file_hash (content hash of the file) is the cache key, shared by all sessions.
+    """
+    return build_opleiding_key(_df, code_col, naam_col)
+
 # Page title
 st.title("📊 Prognose inschrijvingen")
 
@@ -122,39 +139,10 @@ if prognose_files:
                 # Prepare data for filtering
                 df_filtered = df.copy()
                 
-                # Create combined opleiding column if both code and name exist
-                # Convert opleidingcode to integer (remove .0) before combining
-                def format_opleidingcode(code_value):
-                    """Convert opleidingcode to integer string (remove .0)"""
-                    if pd.isna(code_value):
-                        return ''
-                    try:
-                        # Try to convert to numeric first
-                        num_val = pd.to_numeric(code_value, errors='coerce')
-                        if pd.isna(num_val):
-                            # Not numeric, return as string
-                            return str(code_value)
-                        else:
-                            # Is numeric, convert to int and then string (removes .0)
-                            return str(int(float(num_val)))
-                    except (ValueError, TypeError, OverflowError):
-                        # Fallback: remove .0 from string representation
-                        code_str = str(code_value)
-                        # Remove trailing .0 but keep integers with .0 in the middle
-                        if code_str.endswith('.0'):
-                            return code_str[:-2]
-                        return code_str
-                
-                if opleidingcode_col and opleidingsnaam_col:
-                    # Apply formatting function to each value
-                    df_filtered['_opleiding_combined'] = (
-                        df_filtered[opleidingcode_col].apply(format_opleidingcode) + ' - ' + 
-                        df_filtered[opleidingsnaam_col].astype(str)
-                    )
-                elif opleidingcode_col:
-                    df_filtered['_opleiding_combined'] = df_filtered[opleidingcode_col].apply(format_opleidingcode)
-                elif opleidingsnaam_col:
-                    df_filtered['_opleiding_combined'] = df_filtered[opleidingsnaam_col].astype(str)
+                # Combined opleiding column (built once per file over unique code/naam pairs)
+                opleiding_key = build_opleiding_column(get_file_hash(file), opleidingcode_col, opleidingsnaam_col, df)
+                if opleiding_key is not None:
+                    df_filtered['_opleiding_combined'] = opleiding_key
                 
                 # Filter section
                 st.markdown("### 🔽 Filters")
@@ -286,7 +274,7 @@ if prognose_files:
                     # Group by week_col and get both week_of_year and academic_week for labels
                     if academic_week_col:
                         # Group by both columns to get the mapping
-                        weekly_data = df_filtered.groupby([week_col, academic_week_col])[aantal_col].sum().reset_index()
+                        weekly_data = sum_per_group(df_filtered, [week_col, academic_week_col], aantal_col)
                         # Then aggregate by academic_week_col (taking most common week_col value per academic_week)
                         # This ensures we sort by schooljaar week
                         weekly_data = weekly_data.groupby(academic_week_col).agg({
@@ -302,7 +290,7 @@ if prognose_files:
                         )
                     else:
                         # Only week_col available
-                        weekly_data = df_filtered.groupby(week_col)[aantal_col].sum().reset_index()
+                        weekly_data = sum_per_group(df_filtered, [week_col], aantal_col)
                         weekly_data = weekly_data.sort_values(week_col)
                         weekly_data['week_label'] = weekly_data[week_col].apply(lambda x: f"Week {int(x)}")
                     
@@ -354,56 +342,25 @@ if prognose_files:
                     if len(df_cumulative) > 0:
                         # Initialize week_mapping
                         week_mapping = {}
+                        df_cumulative_weeks = df_cumulative
                         
-                        # Group by jaar and academic_week, sum aantal, and get week_of_year mapping
                         if week_col:
-                            # Group by all three to get the mapping between academic_week and week_of_year
-                            weekly_by_year = df_cumulative.groupby([jaar_column, academic_week_col, week_col])[aantal_col].sum().reset_index()
-                            # Aggregate to get one week_of_year per academic_week per year (take first/mode)
-                            weekly_by_year = weekly_by_year.groupby([jaar_column, academic_week_col]).agg({
-                                aantal_col: 'sum',
-                                week_col: 'first'  # Take first week_of_year for this academic_week
-                            }).reset_index()
+                            # Zoals de groupby op (jaar, schooljaar week, weeknummer): rijen zonder weeknummer tellen niet mee
+                            df_cumulative_weeks = df_cumulative[df_cumulative[week_col].notna()]
                             
                             # Create mapping from academic_week to week_of_year (for labels)
                             # Use the most common week_of_year for each academic_week across all years
                             week_mapping = df_cumulative.groupby(academic_week_col)[week_col].agg(
                                 lambda x: x.mode().iloc[0] if len(x.mode()) > 0 else x.iloc[0]
                             ).to_dict()
-                        else:
-                            # Only academic_week available
-                            weekly_by_year = df_cumulative.groupby([jaar_column, academic_week_col])[aantal_col].sum().reset_index()
                         
-                        weekly_by_year = weekly_by_year.sort_values([jaar_column, academic_week_col])
-                        
-                        # Calculate cumulative sums per year
-                        cumulative_data = []
-                        for jaar in weekly_by_year[jaar_column].unique():
-                            jaar_data = weekly_by_year[weekly_by_year[jaar_column] == jaar].copy()
-                            jaar_data = jaar_data.sort_values(academic_week_col)
-                            # Calculate cumulative sum
-                            jaar_data['cumulatief'] = jaar_data[aantal_col].cumsum()
-                            cumulative_data.append(jaar_data[[academic_week_col, 'cumulatief', jaar_column]])
+                        # Cumulatief per jaar: weken als rijen (1-52, ook weken zonder data), jaren als kolommen
+                        all_weeks = pd.RangeIndex(start=1, stop=53, step=1)
+                        df_cumulative_pivot = cumulative_week_table(
+                            df_cumulative_weeks, jaar_column, academic_week_col, aantal_col, all_weeks
+                        )
                         
-                        if cumulative_data:
-                            # Combine all years
-                            df_cumulative_combined = pd.concat(cumulative_data, ignore_index=True)
-                            
-                            # Pivot to have years as columns and weeks as index
-                            df_cumulative_pivot = df_cumulative_combined.pivot_table(
-                                index=academic_week_col,
-                                columns=jaar_column,
-                                values='cumulatief',
-                                aggfunc='sum'
-                            )
-                            
-                            # Reindex to include all weeks 1-52 for complete x-axis
-                            all_weeks = pd.RangeIndex(start=1, stop=53, step=1)
-                            df_cumulative_pivot = df_cumulative_pivot.reindex(all_weeks)
-                            
-                            # Forward fill missing weeks (carry forward last cumulative value)
-                            df_cumulative_pivot = df_cumulative_pivot.ffill().fillna(0)
-                            
+                        if len(df_cumulative_pivot.columns) > 0:
                             # Create combined labels for x-axis using the week numbers from all_weeks
                             if week_col and week_mapping:
                                 week_labels = []
@@ -471,7 +428,7 @@ if prognose_files:
                     
                     if len(df_year_weeks) > 0:
                         # Group by jaar and sum aantal (sum over all weeks 1-52 per year)
-                        yearly_data = df_year_weeks.groupby(jaar_column)[aantal_col].sum().reset_index()
+                        yearly_data = sum_per_group(df_year_weeks, [jaar_column], aantal_col)
                         yearly_data = yearly_data.sort_values(jaar_column)
                         yearly_data.columns = ['jaar', 'aantal']
                         
@@ -0,0 +1,225 @@
+"""
+Meerdere app-processen achter één poort
+
+Eén Streamlit-proces rekent de pagina's van alle sessies op één core uit.
+Dit script start een aantal app-processen (elk een gewone `streamlit run
+src/main.py` op een eigen poort op localhost) met een eenvoudige load balancer
+ervoor:
+
+- een nieuwe browser gaat naar het proces met de minste open verbindingen
+  (bij gelijkstand: dat de minste browsers toegewezen kreeg) en krijgt een
+  cookie met het nummer van dat proces;
+- elke volgende verbinding met die cookie (pagina's, websocket, uploads) gaat
+  naar hetzelfde proces, want de sessie leeft in dat proces.
+
+De processen delen de geparste datasets via de data plane (memory-mapped
+Arrow bestanden, zie backend.data_plane), de prognose store en de
+resultaatcache op schijf. Voordat de processen starten, vult de warm-up (zie
+backend.warmup) die drie lagen met de bewaarde bestanden en de
+standaardweergave van de pagina's.
+
+Gebruik:
+    uv run python src/serve.py --workers 4 --port 8501
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from backend.config import SERVE_WORKERS
+from backend.warmup import warm_up
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+# De app verwijst naar src/assets/... vanaf de projectmap (zoals bij `streamlit run src/main.py`)
+PROJECT_DIR = os.path.dirname(os.path.dirname(MAIN_SCRIPT))
+WORKER_COOKIE = 'instroom_worker'
+HEADER_LIMIT = 64 * 1024
+
+
+def start_workers(workers, base_port, extra_args=()):
+    """Start the app processes on base_port, base_port + 1, ...
+
+    Returns:
+        list of (port, subprocess.Popen)
+    """
+    # Dezelfde cookie secret voor alle processen (XSRF-cookie van Streamlit)
+    env = dict(os.environ)
+    env.setdefault('STREAMLIT_SERVER_COOKIE_SECRET', secrets.token_hex(32))
+    # Alleen met meerdere processen loont het om elke geparste dataset te delen (zie backend.data_plane)
+    env['INSTROOM_SHARED_DATA_PLANE'] = '1' if workers > 1 else '0'
+    processes = []
+    for i in range(workers):
+        port = base_port + i
+        command = [
+            sys.executable, '-m', 'streamlit', 'run', MAIN_SCRIPT,
+            '--server.port', str(port),
+            '--server.address', '127.0.0.1',
+            '--server.headless', 'true',
+            '--browser.gatherUsageStats', 'false',
+            *extra_args,
+        ]
+        processes.append((port, subprocess.Popen(command, env=env, cwd=PROJECT_DIR)))
+    return processes
+
+
+def wait_until_healthy(processes, timeout=120):
+    """Wait until every app process answers its health check
+
+    Args:
+        processes: list of (port, subprocess.Popen), see start_workers
+
+    Raises:
+        TimeoutError: If a process is not healthy within the timeout
+        RuntimeError: If a process stopped
+    """
+    deadline = time.monotonic() + timeout
+    for port, process in processes:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"App-proces op poort {port} is gestopt (code {process.returncode})")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"App-proces op poort {port} start niet")
+            time.sleep(0.25)
+
+
+class LoadBalancer:
+    """Sticky TCP load balancer in front of the app processes
+
+    Routes on the worker cookie of the first request of a connection; a
+    connection without it goes to the process with the fewest open
+    connections (ties: fewest clients assigned so far) and gets the cookie
+    set on its first response.
+
+    Args:
+        ports: Ports of the app processes on localhost
+    """
+
+    def __init__(self, ports):
+        self.ports = list(ports)
+        self.connections = [0] * len(self.ports)
+        self.assigned = [0] * len(self.ports)
+
+    def _worker_from_cookie(self, head):
+        for line in head.split(b'\r\n')[1:]:
+            name, _, value = line.partition(b':')
+            if name.strip().lower() != b'cookie':
+                continue
+            for cookie in value.split(b';'):
+                key, _, worker = cookie.strip().partition(b'=')
+                if key == WORKER_COOKIE.encode() and worker.isdigit() and int(worker) < len(self.ports):
+                    return int(worker)
+        return None
+
+    async def handle(self, client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+
+        worker = self._worker_from_cookie(head)
+        set_cookie = worker is None
+        if set_cookie:
+            worker = min(range(len(self.ports)), key=lambda i: (self.connections[i], self.assigned[i]))
+            self.assigned[worker] += 1
+
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection('127.0.0.1', self.ports[worker], limit=HEADER_LIMIT)
+        except OSError:
+            client_writer.close()
+            return
+        self.connections[worker] += 1
+        try:
+            backend_writer.write(head)
+            if set_cookie:
+                response_head = await backend_reader.readuntil(b'\r\n\r\n')
+                cookie = f"Set-Cookie: {WORKER_COOKIE}={worker}; Path=/; HttpOnly; SameSite=Lax\r\n".encode()
+                client_writer.write(response_head[:-2] + cookie + b'\r\n')
+            await asyncio.gather(
+                self._pipe(client_reader, backend_writer),
+                self._pipe(backend_reader, client_writer),
+            )
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            self.connections[worker] -= 1
+            for writer in (backend_writer, client_writer):
+                writer.close()
+
+    @staticmethod
+    async def _pipe(reader, writer):
+        try:
+            while True:
+                data = await reader.read(HEADER_LIMIT)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            # Halve sluiting doorgeven, zodat de andere richting kan afronden
+            if writer.can_write_eof():
+                try:
+                    writer.write_eof()
+                except OSError:
+                    pass
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=HEADER_LIMIT)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start meerdere app-processen achter één load balancer")
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS, help="Aantal app-processen")
+    parser.add_argument('--host', default='0.0.0.0', help="Adres van de load balancer")
+    parser.add_argument('--port', type=int, default=8501, help="Poort van de load balancer")
+    parser.add_argument('--base-port', type=int, default=8601, help="Eerste poort van de app-processen (op localhost)")
+    args = parser.parse_args()
+
+    # Eerst de caches op schijf vullen, dan pas de app-processen starten
+    warmup = warm_up()
+    if warmup is not None:
+        print(
+            f"Warm-up: {warmup.files} bestanden, {warmup.partitions} weekpartities en {warmup.views} "
+            f"standaardweergaven in {warmup.finished - warmup.started:.1f} s", flush=True
+        )
+        for file_name, message in warmup.errors:
+            print(f"Warm-up: {file_name}: {message}" if file_name else f"Warm-up: {message}", file=sys.stderr, flush=True)
+
+    processes = start_workers(args.workers, args.base_port)
+
+    def stop(*_):
+        for _, process in processes:
+            process.terminate()
+        for _, process in processes:
+            process.wait()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        wait_until_healthy(processes)
+        print(f"{args.workers} app-processen gestart; load balancer op http://{args.host}:{args.port}", flush=True)
+        asyncio.run(LoadBalancer([port for port, _ in processes]).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop()
+
+
+if __name__ == '__main__':
+    main()